@@ -0,0 +1,303 @@
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from models.model_registry import MODEL_FILES
+from runtime_info import PeakRss, git_commit, peak_rss_mb
+
+# Suíte de benchmark: gera tabelas sintéticas de vários tamanhos e mede o
+# pré-processamento, as features, os três treinamentos e os caminhos de
+# predição de compare_models.py. Cada medição roda em um processo novo
+# (spawn), de modo que o pico de RSS é o da própria etapa.
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAINERS = ['nn', 'rf', 'lr']
+MODEL_NAMES = {'nn': 'Neural Network', 'rf': 'Random Forest', 'lr': 'Logistic Regression'}
+# Pontos de entrada medidos por --startup (caminhos relativos a src/)
+CLI_SCRIPTS = [
+    'pipeline.py', 'generate_report.py', 'benchmark.py',
+    'data_collection/collect_data.py', 'data_collection/generate_synthetic_data.py', 'data_collection/preprocess_data.py',
+    'data_collection/clean_data.py', 'data_collection/compare_models.py', 'data_collection/table_lookup.py',
+    'models/train_neural_network.py', 'models/train_random_forest.py', 'models/train_ml_model.py',
+    'models/numpy_inference.py', 'models/prediction_service.py',
+]
+HEAVY_MODULES = ['tensorflow', 'sklearn', 'pandas', 'joblib']
+# Executa "script --help" como "python script.py" e informa as bibliotecas pesadas importadas
+_STARTUP_PROBE = '''
+import json, os, runpy, sys
+script = sys.argv[1]
+sys.path[0] = os.path.dirname(script)
+sys.argv = [script, '--help']
+try:
+    runpy.run_path(script, run_name='__main__')
+except SystemExit:
+    pass
+sys.stderr.write('__startup__' + json.dumps([m for m in %r if m in sys.modules]) + '\\n')
+''' % HEAVY_MODULES
+
+def _measure(func, kwargs):
+    # Executado no processo filho
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = func(**kwargs)
+    return {
+        'wall_seconds': time.perf_counter() - wall_start,
+        'cpu_seconds': time.process_time() - cpu_start,
+        'peak_rss_mb': peak_rss_mb(),
+        'result': result,
+    }
+
+def measure_in_child(func, **kwargs):
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_measure, func, kwargs).result()
+
+# Etapas medidas (nível de módulo para poderem rodar no processo filho)
+
+def bench_preprocess(table, input_path, output_path):
+    from pipeline import run_preprocess
+    run_preprocess(table, input_path, output_path)
+
+def bench_features(data_path, address_bits=False):
+    import shutil
+    from data_collection.features import DEFAULT_CACHE_DIR, build_features, feature_cache_key
+    # Mede a construção a frio: descarta o cache desta tabela antes
+    params = {'test_size': 0.2, 'random_state': 42, 'address_bits': address_bits}
+    shutil.rmtree(os.path.join(DEFAULT_CACHE_DIR, feature_cache_key(data_path, params)), ignore_errors=True)
+    return len(build_features(data_path, address_bits=address_bits).X_train)
+
+def bench_train(trainer, data_path, model_path, address_bits=False):
+    from pipeline import run_train
+    run_train(trainer, data_path, model_path, address_bits)
+
+def bench_predict(data_path, model_paths, address_bits=False, batch_sizes=(1, 256)):
+    # Mesmos caminhos de predição de compare_models.py: lote completo do conjunto de
+    # teste (evaluate_model), latência por linha e por lote, e a consulta à tabela
+    import numpy as np
+    from data_collection.address_encoding import parse_ipv4, parse_mac
+    from data_collection.columnar import load_table
+    from data_collection.compare_models import evaluate_model
+    from data_collection.features import build_features, labeled_rows
+    from data_collection.table_lookup import table_from_frame
+    from models.numpy_inference import benchmark_predictors
+    from models.prediction_service import load_models
+
+    features = build_features(data_path, address_bits=address_bits)
+    X_test = np.ascontiguousarray(features.X_test)
+    results = {}
+    for key, (kind, model) in load_models(model_paths, scaled_input=True).items():
+        if kind == 'keras':
+            predict = lambda X, model=model: model.predict(X, verbose=0)
+        else:
+            predict = model.predict
+        # Pico de RSS das predições de cada modelo (o processo filho é o mesmo para todos)
+        with PeakRss() as rss:
+            accuracy, _, _, _, _, predict_seconds = evaluate_model(model, X_test, features.y_test, kind)
+            latency = benchmark_predictors({key: predict}, X_test, batch_sizes)[key]
+        results[MODEL_NAMES[key]] = {
+            'accuracy': float(accuracy),
+            'test_rows': len(X_test),
+            'predict_seconds': predict_seconds,
+            'latency': latency,
+            'peak_rss_mb': rss.peak_mb,
+        }
+
+    # Consulta exact/LPM (oráculo de compare_models.py) para os endereços de teste
+    df = labeled_rows(load_table(data_path))
+    table = table_from_frame(df)
+    if 'dst_ip' in df.columns:
+        addresses = parse_ipv4(df['dst_ip'].to_numpy()[features.idx_test])[0]
+    else:
+        addresses = parse_mac(df['dst_mac'].to_numpy()[features.idx_test])[0]
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        table.lookup_ports(addresses)
+        lookup_seconds = time.perf_counter() - start
+        latency = benchmark_predictors({'lookup': table.lookup_ports}, addresses, batch_sizes)['lookup']
+    results['Table Lookup'] = {
+        'test_rows': len(addresses),
+        'predict_seconds': lookup_seconds,
+        'latency': latency,
+        'peak_rss_mb': rss.peak_mb,
+    }
+    return results
+
+def run_benchmarks(sizes, tables=('ipv4',), trainers=TRAINERS, work_dir='benchmark_data', address_bits=False, batch_sizes=(1, 256), seed=0):
+    from data_collection.columnar import table_path
+    from data_collection.generate_synthetic_data import generate_table
+
+    runs = []
+
+    def record(size, table, stage, measurement, rows, **extra):
+        run = {'size': size, 'table': table, 'stage': stage, 'rows': rows,
+               'wall_seconds': measurement['wall_seconds'], 'cpu_seconds': measurement['cpu_seconds'],
+               'peak_rss_mb': measurement['peak_rss_mb']}
+        run.update(extra)
+        run['rows_per_second'] = rows / run['wall_seconds'] if run['wall_seconds'] > 0 else 0.0
+        runs.append(run)
+        print(f"[{table} {size}] {stage:32s} {run['wall_seconds']:8.3f}s  pico RSS {run['peak_rss_mb']:8.1f} MB  {run['rows_per_second']:12.0f} linhas/s")
+        for batch_size, metrics in run.get('latency', {}).items():
+            print(f"    lote={batch_size:>5s} p50={metrics['p50_latency_us']:10.1f}us p99={metrics['p99_latency_us']:10.1f}us")
+        return run
+
+    for size in sizes:
+        for t in tables:
+            d = lambda *parts: os.path.join(work_dir, f'size_{size}', *parts)
+            raw = d('collected_data', f'{t}_table_entries.json')
+            processed = table_path(d('processed_data'), f'processed_{t}_data')
+            os.makedirs(os.path.dirname(raw), exist_ok=True)
+            os.makedirs(d('processed_data'), exist_ok=True)
+            os.makedirs(d('models'), exist_ok=True)
+            if not os.path.exists(raw):
+                generate_table(raw, f'{t}_table', size, seed=seed)
+
+            record(size, t, 'preprocess', measure_in_child(bench_preprocess, table=t, input_path=raw, output_path=processed), size)
+            measurement = measure_in_child(bench_features, data_path=processed, address_bits=address_bits)
+            record(size, t, 'features', measurement, size)
+            train_rows = measurement['result']
+
+            model_paths = {}
+            for key in trainers:
+                model_paths[key] = d('models', MODEL_FILES[key].format(table=t))
+                record(size, t, f'train_{key}', measure_in_child(bench_train, trainer=key, data_path=processed,
+                                                                 model_path=model_paths[key], address_bits=address_bits), train_rows)
+
+            measurement = measure_in_child(bench_predict, data_path=processed, model_paths=model_paths,
+                                           address_bits=address_bits, batch_sizes=batch_sizes)
+            for model_name, prediction in measurement['result'].items():
+                # wall_seconds: predição do conjunto de teste inteiro em um lote; o carregamento
+                # dos modelos fica em process_wall_seconds (processo filho compartilhado), e o
+                # pico de RSS do processo em process_peak_rss_mb
+                record(size, t, f"predict {model_name}", measurement, prediction['test_rows'],
+                       wall_seconds=prediction['predict_seconds'], process_wall_seconds=measurement['wall_seconds'],
+                       cpu_seconds=None, accuracy=prediction.get('accuracy'), latency=prediction['latency'],
+                       peak_rss_mb=prediction['peak_rss_mb'] if prediction['peak_rss_mb'] is not None else measurement['peak_rss_mb'],
+                       process_peak_rss_mb=measurement['peak_rss_mb'])
+    return runs
+
+def measure_startup(script_path, repeats=3):
+    # Mediana do tempo de "script --help" e pico de RSS do processo (via wait4)
+    times, rss, modules = [], [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-c', _STARTUP_PROBE, script_path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        stderr = process.stderr.read()
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        times.append(time.perf_counter() - start)
+        rss.append(usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024) / 2 ** 20)
+        modules = next((json.loads(line[len('__startup__'):]) for line in stderr.splitlines() if line.startswith('__startup__')), None)
+    return {'seconds': sorted(times)[len(times) // 2], 'peak_rss_mb': max(rss), 'heavy_modules': modules}
+
+def export_revision(ref, target_dir):
+    # Cópia de src/ em outra revisão (git archive), para comparar a inicialização
+    root = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=SRC_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    prefix = os.path.relpath(SRC_DIR, root)
+    archive = subprocess.run(['git', 'archive', '--format=tar', ref, prefix], cwd=root, capture_output=True, check=True).stdout
+    subprocess.run(['tar', '-x', '-C', target_dir], input=archive, check=True)
+    return os.path.join(target_dir, prefix)
+
+def startup_benchmark(scripts=CLI_SCRIPTS, repeats=3, ref=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ref_dir = export_revision(ref, tmp) if ref else None
+        for script in scripts:
+            entry = {'current': measure_startup(os.path.join(SRC_DIR, script), repeats)}
+            if ref_dir and os.path.exists(os.path.join(ref_dir, script)):
+                entry['reference'] = measure_startup(os.path.join(ref_dir, script), repeats)
+                entry['speedup'] = entry['reference']['seconds'] / entry['current']['seconds']
+            results[script] = entry
+            current = entry['current']
+            line = f"{script:45s} {current['seconds']:6.2f}s {current['peak_rss_mb']:7.1f} MB  [{', '.join(current['heavy_modules'] or []) or '-'}]"
+            if 'reference' in entry:
+                line += f"  (antes: {entry['reference']['seconds']:.2f}s {entry['reference']['peak_rss_mb']:.1f} MB, {entry['speedup']:.1f}x)"
+            print(line)
+    return results
+
+def _run_key(run):
+    return f"{run['table']}/{run['size']}/{run['stage']}"
+
+def _flatten_metrics(run):
+    metrics = {metric: run[metric] for metric in ['wall_seconds', 'peak_rss_mb', 'rows_per_second'] if metric in run}
+    for batch_size, latency in run.get('latency', {}).items():
+        for metric in ['p50_latency_us', 'p99_latency_us']:
+            metrics[f'{metric}@{batch_size}'] = latency[metric]
+    return metrics
+
+def compare_benchmarks(baseline, current, threshold=0.2):
+    # Regressões: métricas piores que a linha de base por mais de `threshold` (fração);
+    # para rows_per_second, menor é pior
+    baseline_runs = {_run_key(run): _flatten_metrics(run) for run in baseline['runs']}
+    regressions = []
+    for run in current['runs']:
+        previous = baseline_runs.get(_run_key(run))
+        if previous is None:
+            continue
+        for metric, value in _flatten_metrics(run).items():
+            old = previous.get(metric)
+            if not old or old <= 0:
+                continue
+            change = value / old - 1
+            worse = -change if metric == 'rows_per_second' else change
+            if worse > threshold:
+                regressions.append({'run': _run_key(run), 'metric': metric, 'baseline': old, 'current': value, 'change': change})
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mede treinamento e inferência em uma série de tamanhos de tabela.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Número de entradas das tabelas sintéticas.')
+    parser.add_argument('--tables', type=str, nargs='+', default=['ipv4'], choices=['ethernet', 'ipv4'], help='Tabelas medidas.')
+    parser.add_argument('--trainers', type=str, nargs='+', default=TRAINERS, choices=TRAINERS, help='Modelos treinados e medidos.')
+    parser.add_argument('--work_dir', type=str, default='benchmark_data', help='Diretório dos dados sintéticos e modelos.')
+    parser.add_argument('--output', type=str, default=None, help='Arquivo JSON de resultados (padrão: benchmarks/benchmark_<commit>_<data>.json).')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON de uma execução anterior para detectar regressões.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Piora relativa considerada regressão (0.2 = 20%%).')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 256], help='Tamanhos de lote da medição de latência.')
+    parser.add_argument('--address_bits', action='store_true', help='Treina e avalia com os bits de dst_mac/dst_ip.')
+    parser.add_argument('--seed', type=int, default=0, help='Semente dos dados sintéticos.')
+    parser.add_argument('--startup', action='store_true', help='Mede apenas o tempo de inicialização ("--help") de cada CLI.')
+    parser.add_argument('--startup_ref', type=str, default=None, help='Revisão git para comparar a inicialização (ex.: HEAD~1).')
+    parser.add_argument('--repeats', type=int, default=3, help='Repetições por CLI na medição de inicialização.')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    started = datetime.datetime.now()
+    report = {
+        'git_commit': commit,
+        'timestamp': started.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'address_bits': args.address_bits,
+        'runs': [],
+    }
+    if args.startup:
+        report['startup'] = startup_benchmark(repeats=args.repeats, ref=args.startup_ref)
+        report['startup_ref'] = args.startup_ref
+    else:
+        report['runs'] = run_benchmarks(args.sizes, args.tables, args.trainers, args.work_dir, args.address_bits, args.batch_sizes, args.seed)
+
+    output_path = args.output or os.path.join('benchmarks', f"benchmark_{commit[:12]}_{started:%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResultados salvos em {output_path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_benchmarks(baseline, report, args.threshold)
+        print(f"\n--- Comparação com {args.baseline} ({baseline.get('git_commit')}) ---")
+        for regression in regressions:
+            print(f"REGRESSÃO {regression['run']} {regression['metric']}: {regression['baseline']:.4g} -> "
+                  f"{regression['current']:.4g} ({regression['change']:+.0%})")
+        if not regressions:
+            print("Nenhuma regressão acima do limite.")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,144 @@
+import numpy as np
+
+# Codificação vetorizada dos endereços usados como chave nas tabelas do
+# basic_forwarding.p4 (hdr.ethernet.dstAddr exact e hdr.ipv4.dstAddr lpm).
+# Todas as funções operam sobre colunas inteiras: os laços percorrem apenas as
+# posições dos caracteres (no máximo 17), nunca as linhas.
+MAC_WIDTH = 17
+IPV4_WIDTH = 15
+
+# Valor de cada caractere hexadecimal (-1 para caracteres inválidos)
+_HEX_LUT = np.full(256, -1, dtype=np.int16)
+_HEX_LUT[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+_HEX_LUT[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+_HEX_LUT[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+
+def _to_char_matrix(values, width):
+    # Converte uma coluna de strings em uma matriz (n, width) de bytes ASCII.
+    # Uma coluna extra detecta strings maiores que o formato esperado.
+    import pandas as pd
+    if isinstance(values, pd.Series):
+        values = values.to_numpy()
+    values = np.asarray(values)
+    if values.dtype.kind == 'S' and values.dtype.itemsize <= width + 1:
+        fixed = values.astype(f'S{width + 1}', copy=False)
+    else:
+        if values.dtype.kind == 'O':
+            values = np.where(pd.isna(values), '', values)
+        try:
+            fixed = values.astype(f'S{width + 1}')
+        except UnicodeEncodeError:
+            # Caracteres não ASCII tornam o endereço inválido
+            fixed = np.char.encode(values.astype(str), 'ascii', 'replace').astype(f'S{width + 1}')
+    chars = np.ascontiguousarray(fixed).view(np.uint8).reshape(len(fixed), width + 1)
+    return chars[:, :width], chars[:, width] == 0
+
+def parse_mac(values):
+    # Retorna (endereços como uint64, máscara de validade) para strings "xx:xx:xx:xx:xx:xx"
+    chars, fits = _to_char_matrix(values, MAC_WIDTH)
+    hex_positions = [i for i in range(MAC_WIDTH) if i % 3 != 2]
+    colon_positions = [i for i in range(MAC_WIDTH) if i % 3 == 2]
+
+    nibbles = _HEX_LUT[chars[:, hex_positions]]
+    valid = fits & (nibbles >= 0).all(axis=1) & (chars[:, colon_positions] == ord(':')).all(axis=1)
+
+    nibbles = np.where(valid[:, None], nibbles, 0).astype(np.uint64)
+    shifts = np.arange(44, -4, -4, dtype=np.uint64)
+    macs = (nibbles << shifts).sum(axis=1, dtype=np.uint64)
+    return macs, valid
+
+def parse_ipv4(values):
+    # Retorna (endereços como uint32, máscara de validade) para strings "a.b.c.d".
+    # Percorre as posições dos caracteres acumulando o octeto corrente de todas
+    # as linhas ao mesmo tempo; a posição extra fecha o último octeto.
+    chars, fits = _to_char_matrix(values, IPV4_WIDTH)
+    n = len(chars)
+    octets = [np.zeros(n, dtype=np.uint16) for _ in range(4)]
+    current = np.zeros(n, dtype=np.uint16)
+    digits = np.zeros(n, dtype=np.uint8)
+    dots = np.zeros(n, dtype=np.uint8)
+    valid = fits.copy()
+    ended = np.zeros(n, dtype=bool)
+
+    for j in range(IPV4_WIDTH + 1):
+        c = chars[:, j] if j < IPV4_WIDTH else np.zeros(n, dtype=np.uint8)
+        d = c - np.uint8(ord('0'))
+        is_digit = d < 10
+        is_dot = c == ord('.')
+        is_end = c == 0
+        # Apenas dígitos e pontos antes do fim da string, e nada depois dele
+        valid &= is_digit | is_dot | is_end
+        valid &= ~ended | is_end
+
+        current = np.where(is_digit, current * 10 + d, current)
+        digits += is_digit
+        # Um ponto ou o fim da string fecham o octeto corrente (1 a 3 dígitos, até 255)
+        closes = is_dot | (is_end & ~ended)
+        valid &= ~closes | (((digits - 1) < 3) & (current <= 255))
+        for k in range(4):
+            octets[k] = np.where(closes & (dots == k), current, octets[k])
+        dots += is_dot
+        current[closes] = 0
+        digits[closes] = 0
+        ended |= is_end
+    valid &= dots == 3
+
+    octets = [octet.astype(np.uint32) for octet in octets]
+    ips = (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+    return np.where(valid, ips, 0).astype(np.uint32), valid
+
+def mac_to_bytes(macs):
+    # (n, 6) uint8 em ordem de rede
+    return np.asarray(macs, dtype='>u8').view(np.uint8).reshape(-1, 8)[:, 2:]
+
+def ipv4_to_bytes(ips):
+    # (n, 4) uint8 em ordem de rede
+    return np.asarray(ips, dtype='>u4').view(np.uint8).reshape(-1, 4)
+
+def mac_to_bits(macs):
+    return np.unpackbits(mac_to_bytes(macs), axis=1)
+
+def ipv4_to_bits(ips):
+    return np.unpackbits(ipv4_to_bytes(ips), axis=1)
+
+def prefix_lengths(prefix_len, default=32):
+    # Comprimentos de prefixo válidos (0 a 32); ausentes ou inválidos viram o default
+    import pandas as pd
+    values = pd.to_numeric(pd.Series(np.asarray(prefix_len)), errors='coerce').to_numpy(dtype=np.float64)
+    values = np.where(np.isnan(values) | (values < 0) | (values > 32), default, values)
+    return values.astype(np.int64)
+
+def prefix_mask(prefix_len):
+    lengths = prefix_lengths(prefix_len)
+    # Deslocamento em 64 bits para que /0 gere a máscara 0
+    return ((np.uint64(0xFFFFFFFF) << (32 - lengths).astype(np.uint64)) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+def mask_ipv4(ips, prefix_len):
+    return np.asarray(ips, dtype=np.uint32) & prefix_mask(prefix_len)
+
+def ipv4_prefix_bits(ips, prefix_len):
+    # Bits do endereço com os bits fora do prefixo zerados
+    return ipv4_to_bits(mask_ipv4(ips, prefix_len))
+
+def bit_names(prefix, n_bits):
+    return [f'{prefix}_b{i}' for i in range(n_bits)]
+
+def address_features(df):
+    # Matriz de bits (uint8) e nomes das colunas para dst_mac e dst_ip, com as
+    # variantes mascaradas pelo prefix_len quando a coluna estiver presente
+    blocks = []
+    names = []
+    if 'dst_mac' in df.columns:
+        macs, valid = parse_mac(df['dst_mac'])
+        blocks += [mac_to_bits(macs), valid[:, None].astype(np.uint8)]
+        names += bit_names('dst_mac', 48) + ['dst_mac_valid']
+    if 'dst_ip' in df.columns:
+        ips, valid = parse_ipv4(df['dst_ip'])
+        blocks += [ipv4_to_bits(ips), valid[:, None].astype(np.uint8)]
+        names += bit_names('dst_ip', 32) + ['dst_ip_valid']
+        if 'prefix_len' in df.columns:
+            blocks.append(ipv4_prefix_bits(ips, df['prefix_len']))
+            names += bit_names('dst_ip_masked', 32)
+    if not blocks:
+        return np.zeros((len(df), 0), dtype=np.uint8), names
+    return np.hstack(blocks), names
@@ -1,48 +1,326 @@
+import numpy as np
 import pandas as pd
+import argparse
+import contextlib
+import json
 import os
+import sys
 
-def clean_data(input_path, output_path):
-    df = pd.read_csv(input_path)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.address_encoding import parse_ipv4, parse_mac
+from data_collection.columnar import (COLUMN_DTYPES, encode_columns, find_table, is_columnar_path, open_table_writer,
+                                      read_schema, table_path)
+from instrumentation import add_rows, phase, stage
 
-    # Exemplo de limpeza: remover linhas com valores ausentes em colunas críticas
-    # Adapte as colunas conforme a necessidade do seu dataset
-    initial_rows = len(df)
-    df.dropna(subset=["egress_port"], inplace=True) # Exemplo: egress_port não pode ser nulo
-    rows_after_dropna = len(df)
-    print(f"Removidas {initial_rows - rows_after_dropna} linhas com valores ausentes em colunas críticas.")
+# Limpeza em blocos com memória limitada: cada bloco é validado com operações
+# vetorizadas (uma contagem por motivo de descarte) e as linhas repetidas são
+# removidas entre blocos por um hash de 64 bits da linha inteira, guardado em
+# um conjunto hash compacto ('exact') ou em um filtro de Bloom (tamanho fixo,
+# com uma taxa configurável de falsos positivos). O modo 'exact' compara apenas
+# os hashes: duas linhas diferentes com o mesmo hash de 64 bits (cerca de
+# n²/2^65 pares esperados, ~3e-6 para 10 milhões de linhas) são tratadas como
+# repetidas e a segunda é descartada sem aviso.
+DEFAULT_CHUNK_SIZE = 1000000
+MAX_PORT = 511  # egress_port é bit<9> no basic_forwarding.p4
+MAX_PREFIX_LEN = 32
+_MISSING_TEXT = [b'', b'N/A']
+_INVALID_TEXT = '?'
 
-    # Exemplo de limpeza: remover duplicatas
-    initial_rows = len(df)
-    df.drop_duplicates(inplace=True)
-    rows_after_drop_duplicates = len(df)
-    print(f"Removidas {initial_rows - rows_after_drop_duplicates} linhas duplicadas.")
+def _mix(x):
+    # splitmix64 vetorizado
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
 
-    # Exemplo de limpeza: converter tipos de dados se necessário
-    # df["egress_port"] = pd.to_numeric(df["egress_port"], errors=\'coerce\')
+def _column_words(values):
+    # Cada valor como uma ou mais palavras uint64 (n, palavras)
+    values = np.ascontiguousarray(values)
+    if values.dtype.kind == 'f':
+        # Um único padrão de bits para NaN, e -0.0 igual a 0.0 (como em drop_duplicates)
+        values = np.where(np.isnan(values), np.nan, values.astype(np.float64) + 0.0)
+        return values.view(np.uint64)[:, np.newaxis]
+    if values.dtype.kind != 'S':
+        return values.astype(np.int64).view(np.uint64)[:, np.newaxis]
+    width = values.dtype.itemsize
+    raw = np.zeros((len(values), -(-width // 8) * 8), dtype=np.uint8)
+    raw[:, :width] = values.view(np.uint8).reshape(len(values), width)
+    return raw.view(np.uint64)
 
-    # Salvar dados limpos
-    df.to_csv(output_path, index=False)
-    print(f"Dados limpos salvos em {output_path}")
+def row_hashes(arrays):
+    # Hash de 64 bits da linha inteira (todas as colunas, na ordem da tabela)
+    n = len(next(iter(arrays.values()))) if arrays else 0
+    h = np.full(n, 0x243F6A8885A308D3, dtype=np.uint64)
+    for values in arrays.values():
+        words = _column_words(values)
+        for j in range(words.shape[1]):
+            h = _mix(h ^ words[:, j])
+    return h
+
+def first_occurrences(keys):
+    # Índices (em ordem) da primeira ocorrência de cada valor distinto
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.int64)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+    return np.sort(np.minimum.reduceat(order, starts))
+
+class RowHashSet:
+    # Conjunto de hashes de 64 bits com endereçamento aberto (sondagem linear),
+    # consultado e inserido em lote; usa entre 11 e 23 bytes por linha distinta.
+    # O hash 0 marca slots vazios (e é guardado como 1).
+    MAX_LOAD = 0.7
+
+    def __init__(self, capacity=1 << 16):
+        self.bits = max(4, int(np.ceil(np.log2(max(capacity, 1) / self.MAX_LOAD))))
+        self.slots = np.zeros(1 << self.bits, dtype=np.uint64)
+        self.count = 0
+
+    @property
+    def nbytes(self):
+        return self.slots.nbytes
+
+    def _home(self, keys):
+        return keys & np.uint64(len(self.slots) - 1)
+
+    def contains(self, keys):
+        mask = np.uint64(len(self.slots) - 1)
+        found = np.zeros(len(keys), dtype=bool)
+        pending = np.arange(len(keys))
+        slots = self._home(keys)
+        while len(pending):
+            current = self.slots[slots]
+            hit = current == keys[pending]
+            found[pending[hit]] = True
+            # Slot vazio encerra a busca daquela chave
+            keep = ~hit & (current != 0)
+            pending = pending[keep]
+            slots = (slots[keep] + np.uint64(1)) & mask
+        return found
+
+    def _insert(self, keys):
+        # keys distintos e ausentes do conjunto. Chaves que disputam o mesmo slot
+        # tentam slots consecutivos na mesma rodada (em vez de avançarem juntas, um
+        # slot por rodada); os slots pulados são ocupados na própria rodada, de modo
+        # que toda chave continua alcançável a partir do seu slot inicial.
+        mask = np.uint64(len(self.slots) - 1)
+        pending = keys
+        slots = self._home(keys)
+        while len(pending):
+            order = np.argsort(slots)
+            pending, slots = pending[order], slots[order]
+            group_start = np.concatenate([[True], slots[1:] != slots[:-1]])
+            positions = np.arange(len(slots))
+            rank = positions - np.maximum.accumulate(np.where(group_start, positions, 0))
+            slots = (slots + rank.astype(np.uint64)) & mask
+
+            empty = self.slots[slots] == 0
+            self.slots[slots[empty]] = pending[empty]
+            placed = empty & (self.slots[slots] == pending)
+            pending = pending[~placed]
+            slots = (slots[~placed] + np.uint64(1)) & mask
+        self.count += len(keys)
+
+    def _grow(self, needed):
+        keys = self.slots[self.slots != 0]
+        while needed > self.MAX_LOAD * (1 << self.bits):
+            self.bits += 1
+        self.slots = np.zeros(1 << self.bits, dtype=np.uint64)
+        # As chaves voltam para a tabela nova e são contadas de novo por _insert
+        self.count = 0
+        self._insert(keys)
+
+    def add(self, keys):
+        # keys distintos entre si; retorna a máscara dos que ainda não estavam no conjunto
+        keys = np.where(keys == 0, np.uint64(1), keys)
+        new = ~self.contains(keys)
+        if self.count + new.sum() > self.MAX_LOAD * len(self.slots):
+            self._grow(self.count + new.sum())
+        self._insert(keys[new])
+        return new
+
+class BloomFilter:
+    # Tamanho fixo, calculado para `capacity` linhas com a taxa de falsos positivos
+    # pedida (cerca de 1,8 bytes por linha a 0,1%). Um falso positivo descarta
+    # uma linha nova como se fosse repetida.
+    def __init__(self, capacity, false_positive_rate=0.001):
+        capacity = max(capacity, 1)
+        self.n_bits = int(np.ceil(-capacity * np.log(false_positive_rate) / np.log(2) ** 2))
+        self.n_hashes = max(1, int(round(self.n_bits / capacity * np.log(2))))
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def _positions(self, keys):
+        # Hashing duplo: posição i = h1 + i * h2 (mod n_bits)
+        h2 = _mix(keys) | np.uint64(1)
+        i = np.arange(self.n_hashes, dtype=np.uint64)[:, np.newaxis]
+        with np.errstate(over='ignore'):
+            return (keys + i * h2) % np.uint64(self.n_bits)
+
+    def add(self, keys):
+        positions = self._positions(keys)
+        present = ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=0)
+        # Posições ordenadas e agrupadas por byte: uma única escrita (OR dos bits
+        # do grupo) por byte, já que a atribuição com índices repetidos perderia bits
+        positions = np.sort(positions, axis=None)
+        byte = positions >> np.uint64(3)
+        bit = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        starts = np.flatnonzero(np.concatenate([[True], byte[1:] != byte[:-1]]))
+        self.bits[byte[starts]] |= np.bitwise_or.reduceat(bit, starts)
+        return ~present
+
+def validate(arrays):
+    # Máscara das linhas válidas e número de linhas descartadas por motivo; cada
+    # linha conta apenas no primeiro motivo, de modo que a soma é o total removido
+    checks = []
+    for col, max_value in (('egress_port', MAX_PORT), ('prefix_len', MAX_PREFIX_LEN)):
+        if col in arrays:
+            values = np.asarray(arrays[col], dtype=np.float64)
+            missing = np.isnan(values)
+            with np.errstate(invalid='ignore'):
+                invalid = ~missing & ((values != np.floor(values)) | (values < 0) | (values > max_value))
+            checks += [(f'missing_{col}', missing), (f'invalid_{col}', invalid)]
+    for col, parse in (('dst_mac', parse_mac), ('dst_ip', parse_ipv4)):
+        if col in arrays:
+            missing = np.isin(arrays[col], _MISSING_TEXT)
+            checks += [(f'missing_{col}', missing), (f'invalid_{col}', ~missing & ~parse(arrays[col])[1])]
+
+    n = len(next(iter(arrays.values()))) if arrays else 0
+    keep = np.ones(n, dtype=bool)
+    dropped = {}
+    for reason, bad in checks:
+        bad = bad & keep
+        dropped[reason] = int(bad.sum())
+        keep &= ~bad
+    return keep, dropped
+
+def _table_columns(path):
+    if is_columnar_path(path):
+        return [col['name'] for col in read_schema(path)['columns']]
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def _count_rows(path):
+    if is_columnar_path(path):
+        return read_schema(path)['rows']
+    with open(path, 'rb') as f:
+        return max(sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b'')) - 1, 0)
+
+def _encode_chunk(df):
+    # Endereços longos demais para o tipo da coluna não cabem no formato
+    # colunar: são marcados como inválidos em vez de interromper a limpeza
+    for col in ('dst_mac', 'dst_ip'):
+        if col in df.columns:
+            width = np.dtype(COLUMN_DTYPES[col]).itemsize
+            too_long = df[col].notna() & (df[col].astype(str).str.len() > width)
+            if too_long.any():
+                df[col] = df[col].astype(object).where(~too_long, _INVALID_TEXT)
+    return encode_columns(df)
+
+def iter_table_arrays(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Blocos {coluna: array tipado} lidos diretamente dos arquivos das colunas
+    # (ou do CSV em blocos), sem manter mais de um bloco em memória
+    if not is_columnar_path(path):
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            yield _encode_chunk(chunk)
+        return
+    schema = read_schema(path)
+    rows = schema['rows']
+    for start in range(0, rows, chunk_size):
+        count = min(chunk_size, rows - start)
+        arrays = {}
+        for col in schema['columns']:
+            dtype = np.dtype(col['dtype'])
+            arrays[col['name']] = np.fromfile(os.path.join(path, col['name'] + '.bin'), dtype=dtype, count=count, offset=start * dtype.itemsize)
+        yield arrays
+
+@stage('clean', target='input_path')
+def clean_data(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, dedup='exact', false_positive_rate=0.001, expected_rows=None):
+    if dedup == 'bloom':
+        seen = BloomFilter(expected_rows or _count_rows(input_path), false_positive_rate)
+    else:
+        seen = RowHashSet()
+    stats = {'input_rows': 0, 'output_rows': 0, 'dropped': {}, 'duplicates': 0}
+
+    # Salvar dados limpos (um ou mais caminhos, colunar e/ou CSV)
+    output_paths = [output_path] if isinstance(output_path, str) else output_path
+    columns = _table_columns(input_path)
+    with contextlib.ExitStack() as stack:
+        writers = [stack.enter_context(open_table_writer(path, columns)) for path in output_paths]
+        chunks = iter_table_arrays(input_path, chunk_size)
+        while True:
+            with phase('read'):
+                arrays = next(chunks, None)
+            if arrays is None:
+                break
+            with phase('validate'):
+                keep, dropped = validate(arrays)
+            for reason, count in dropped.items():
+                stats['dropped'][reason] = stats['dropped'].get(reason, 0) + count
+            rows = np.flatnonzero(keep)
+
+            # Repetidas dentro do bloco (vale a primeira) e em blocos anteriores
+            with phase('dedup'):
+                hashes = row_hashes({col: values[rows] for col, values in arrays.items()})
+                first = first_occurrences(hashes)
+                unique_rows = rows[first[seen.add(hashes[first])]]
+
+            stats['input_rows'] += len(keep)
+            stats['duplicates'] += len(rows) - len(unique_rows)
+            stats['output_rows'] += len(unique_rows)
+            with phase('write'):
+                for writer in writers:
+                    writer.append_arrays({col: values[unique_rows] for col, values in arrays.items()})
+    add_rows(stats['input_rows'])
+
+    removed = sum(stats['dropped'].values())
+    details = ', '.join(f"{reason}: {count}" for reason, count in stats['dropped'].items() if count)
+    print(f"Removidas {removed} linhas com valores ausentes ou inválidos" + (f" ({details})." if details else "."))
+    print(f"Removidas {stats['duplicates']} linhas duplicadas "
+          f"({'filtro de Bloom' if dedup == 'bloom' else 'conjunto hash'} com {seen.nbytes / 2**20:.1f} MiB).")
+    for path in output_paths:
+        print(f"Dados limpos salvos em {path}")
+    return stats
 
 if __name__ == '__main__':
-    processed_dir = 'processed_data'
-    cleaned_dir = 'cleaned_data'
+    parser = argparse.ArgumentParser(description='Limpa os dados pré-processados das tabelas.')
+    parser.add_argument('--input_dir', type=str, default='processed_data', help='Diretório com os dados pré-processados.')
+    parser.add_argument('--output_dir', type=str, default='cleaned_data', help='Diretório para salvar os dados limpos.')
+    parser.add_argument('--format', type=str, default='columnar', choices=['columnar', 'csv', 'both'], help='Formato de saída (colunar tipado, CSV ou ambos).')
+    parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE, help='Linhas por bloco.')
+    parser.add_argument('--dedup', type=str, default='exact', choices=['exact', 'bloom'],
+                        help='Remoção de duplicatas: conjunto dos hashes de 64 bits das linhas (memória proporcional às linhas distintas; '
+                             'linhas com hashes colididos são descartadas) ou filtro de Bloom (memória fixa).')
+    parser.add_argument('--false_positive_rate', type=float, default=0.001, help='Taxa de falsos positivos do filtro de Bloom.')
+    parser.add_argument('--expected_rows', type=int, default=None, help='Linhas previstas para dimensionar o filtro de Bloom (padrão: linhas da tabela).')
+    args = parser.parse_args()
+
+    processed_dir = args.input_dir
+    cleaned_dir = args.output_dir
+    formats = ['columnar', 'csv'] if args.format == 'both' else [args.format]
     os.makedirs(cleaned_dir, exist_ok=True)
+    options = dict(chunk_size=args.chunk_size, dedup=args.dedup, false_positive_rate=args.false_positive_rate, expected_rows=args.expected_rows)
+    stats = {}
 
     # Limpar dados da tabela Ethernet
-    ethernet_processed_path = os.path.join(processed_dir, 'processed_ethernet_data.csv')
-    ethernet_cleaned_path = os.path.join(cleaned_dir, 'cleaned_ethernet_data.csv')
+    ethernet_processed_path = find_table(processed_dir, 'processed_ethernet_data')
+    ethernet_cleaned_paths = [table_path(cleaned_dir, 'cleaned_ethernet_data', fmt) for fmt in formats]
     if os.path.exists(ethernet_processed_path):
-        clean_data(ethernet_processed_path, ethernet_cleaned_path)
+        stats['ethernet'] = clean_data(ethernet_processed_path, ethernet_cleaned_paths, **options)
     else:
         print(f"Arquivo {ethernet_processed_path} não encontrado. Pulando limpeza da tabela Ethernet.")
 
     # Limpar dados da tabela IPv4
-    ipv4_processed_path = os.path.join(processed_dir, 'processed_ipv4_data.csv')
-    ipv4_cleaned_path = os.path.join(cleaned_dir, 'cleaned_ipv4_data.csv')
+    ipv4_processed_path = find_table(processed_dir, 'processed_ipv4_data')
+    ipv4_cleaned_paths = [table_path(cleaned_dir, 'cleaned_ipv4_data', fmt) for fmt in formats]
     if os.path.exists(ipv4_processed_path):
-        clean_data(ipv4_processed_path, ipv4_cleaned_path)
+        stats['ipv4'] = clean_data(ipv4_processed_path, ipv4_cleaned_paths, **options)
     else:
         print(f"Arquivo {ipv4_processed_path} não encontrado. Pulando limpeza da tabela IPv4.")
 
-
+    with open(os.path.join(cleaned_dir, 'clean_stats.json'), 'w') as f:
+        json.dump(stats, f, indent=4)
@@ -1,36 +1,182 @@
 import argparse
+import concurrent.futures
 import json
 import os
+import random
+import sys
+import threading
 import time
-from p4utils.utils.thrift_API import ThriftAPI
 
-def collect_table_entries(p4_name, thrift_port, output_dir):
-    client = ThriftAPI(p4_name, thrift_port)
-    
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import add_rows, phase, stage
+
+TABLES = ['ethernet_table', 'ipv4_table']
+DEFAULT_THRIFT_IP = 'localhost'
+
+def thrift_client(p4_name, endpoint):
+    # Importado apenas quando necessário, para que o coletor possa ser usado
+    # (e testado) com um cliente falso sem o p4utils instalado
+    from p4utils.utils.thrift_API import ThriftAPI
+    return ThriftAPI(p4_name, endpoint['thrift_port'], thrift_ip=endpoint['host'])
+
+def _thrift_client_factory(p4_name):
+    return lambda endpoint: thrift_client(p4_name, endpoint)
+
+def write_json_entries(path, entries):
+    # Grava as entradas uma a uma, no mesmo formato de json.dump(entries, f, indent=4),
+    # sem montar o documento JSON inteiro em memória. Retorna o número de entradas.
+    # A leitura não é paginada: get_entries devolve a tabela inteira (a API Thrift
+    # do BMv2 lê todas as entradas de uma vez), então só a gravação é em streaming.
+    count = 0
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            for entry in entries:
+                f.write('[\n    ' if count == 0 else ',\n    ')
+                f.write(json.dumps(entry, indent=4).replace('\n', '\n    '))
+                count += 1
+            f.write('\n]' if count else '[]')
+    except BaseException:
+        # Uma coleta interrompida não deixa arquivo parcial para trás (se open
+        # falhou, não há arquivo e o erro original é o que deve subir)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return count
+
+@stage('collect', target='thrift_port')
+def collect_table_entries(p4_name, thrift_port, output_dir, thrift_ip=DEFAULT_THRIFT_IP):
+    client = thrift_client(p4_name, {'host': thrift_ip, 'thrift_port': thrift_port})
+
     # Criar diretório de saída se não existir
     os.makedirs(output_dir, exist_ok=True)
 
     # Coletar entradas da tabela ethernet_table
-    ethernet_entries = client.get_entries('ethernet_table')
-    with open(os.path.join(output_dir, 'ethernet_table_entries.json'), 'w') as f:
-        json.dump(ethernet_entries, f, indent=4)
-    print(f"Coletadas {len(ethernet_entries)} entradas da ethernet_table.")
+    with phase('read'):
+        entries = client.get_entries('ethernet_table')
+    with phase('write'):
+        count = write_json_entries(os.path.join(output_dir, 'ethernet_table_entries.json'), entries)
+    add_rows(count)
+    print(f"Coletadas {count} entradas da ethernet_table.")
 
     # Coletar entradas da tabela ipv4_table
-    ipv4_entries = client.get_entries('ipv4_table')
-    with open(os.path.join(output_dir, 'ipv4_table_entries.json'), 'w') as f:
-        json.dump(ipv4_entries, f, indent=4)
-    print(f"Coletadas {len(ipv4_entries)} entradas da ipv4_table.")
+    with phase('read'):
+        entries = client.get_entries('ipv4_table')
+    with phase('write'):
+        count = write_json_entries(os.path.join(output_dir, 'ipv4_table_entries.json'), entries)
+    add_rows(count)
+    print(f"Coletadas {count} entradas da ipv4_table.")
 
     print("Coleta de dados concluída.")
 
+def parse_endpoint(spec):
+    # "s1=10.0.0.2:9090" (nome, host e porta Thrift), "s1=9090", "10.0.0.2:9090"
+    # ou apenas "9090"; sem host, o switch é local
+    name, sep, address = spec.partition('=')
+    if not sep:
+        name, address = None, spec
+    host, sep, port = address.rpartition(':')
+    host = host.strip('[]') if sep else DEFAULT_THRIFT_IP
+    if not port.isdigit() or (sep and not host):
+        raise ValueError(f"Endereço Thrift inválido: '{spec}' (use porta, host:porta ou nome=host:porta).")
+    if name is None:
+        name = f'switch_{host}_{port}' if sep else f'switch_{port}'
+    return {'name': name, 'host': host, 'thrift_port': int(port)}
+
+class ClientPool:
+    # Um cliente Thrift por switch, reaproveitado entre tabelas e coletas.
+    # Clientes com erro são descartados e recriados na próxima tentativa.
+    def __init__(self, client_factory):
+        self.client_factory = client_factory
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, endpoint):
+        with self.lock:
+            client = self.clients.get(endpoint['name'])
+        if client is None:
+            client = self.client_factory(endpoint)
+            with self.lock:
+                self.clients[endpoint['name']] = client
+        return client
+
+    def discard(self, endpoint):
+        with self.lock:
+            self.clients.pop(endpoint['name'], None)
+
+@stage('collect_switch', target='endpoint')
+def collect_switch(endpoint, pool, output_dir, tables=TABLES, retries=3, backoff=0.5):
+    # Coleta as tabelas de um switch (sequencialmente: o cliente Thrift não é thread-safe)
+    switch_dir = os.path.join(output_dir, endpoint['name'])
+    os.makedirs(switch_dir, exist_ok=True)
+    counts = {}
+    for table in tables:
+        for attempt in range(retries + 1):
+            try:
+                client = pool.get(endpoint)
+                with phase('read'):
+                    entries = client.get_entries(table)
+                with phase('write'):
+                    counts[table] = write_json_entries(os.path.join(switch_dir, f'{table}_entries.json'), entries)
+                add_rows(counts[table])
+                break
+            except Exception as exc:
+                pool.discard(endpoint)
+                if attempt == retries:
+                    raise
+                # Backoff exponencial com jitter
+                delay = backoff * (2 ** attempt) * (1 + random.random())
+                print(f"[{endpoint['name']}] erro ao coletar {table} ({exc!r}); nova tentativa em {delay:.2f}s.")
+                time.sleep(delay)
+    return counts
+
+@stage('collect', target='output_dir')
+def collect_fleet(endpoints, output_dir, client_factory, tables=TABLES, max_workers=8, retries=3, backoff=0.5, pool=None):
+    # Coleta todos os switches em paralelo com um pool limitado de threads.
+    # Retorna {switch: {tabela: nº de entradas}} ou {switch: {'error': ...}}.
+    pool = pool or ClientPool(client_factory)
+    summary = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(collect_switch, endpoint, pool, output_dir, tables, retries, backoff): endpoint
+                   for endpoint in endpoints}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]['name']
+            try:
+                summary[name] = future.result()
+                print(f"[{name}] " + ', '.join(f"{count} entradas da {table}" for table, count in summary[name].items()))
+            except Exception as exc:
+                summary[name] = {'error': repr(exc)}
+                print(f"[{name}] falha na coleta: {exc!r}")
+    return summary
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Coleta entradas de tabelas de um switch BMv2.')
     parser.add_argument('--p4_name', type=str, default='basic_forwarding', help='Nome do programa P4.')
     parser.add_argument('--thrift_port', type=int, default=9090, help='Porta Thrift do BMv2.')
+    parser.add_argument('--thrift_ip', type=str, default=DEFAULT_THRIFT_IP, help='Endereço do BMv2 (switches em outros hosts).')
     parser.add_argument('--output_dir', type=str, default='collected_data', help='Diretório para salvar os dados coletados.')
+    parser.add_argument('--switches', type=str, nargs='*', default=None, help='Switches a coletar em paralelo, como nome=host:porta_thrift (ex.: s1=9090 s2=10.0.0.2:9090).')
+    parser.add_argument('--max_workers', type=int, default=8, help='Número máximo de switches coletados ao mesmo tempo.')
+    parser.add_argument('--retries', type=int, default=3, help='Novas tentativas por tabela em caso de erro.')
+    parser.add_argument('--backoff', type=float, default=0.5, help='Espera inicial (s) entre tentativas, dobrada a cada erro.')
+    parser.add_argument('--snapshot_dir', type=str, default=None, help='Guarda a coleta como uma nova versão (snapshot) neste diretório.')
+    parser.add_argument('--keep', type=int, default=10, help='Versões mantidas por tabela com --snapshot_dir (0 mantém todas).')
     args = parser.parse_args()
 
-    collect_table_entries(args.p4_name, args.thrift_port, args.output_dir)
-
+    if args.switches:
+        endpoints = [parse_endpoint(spec) for spec in args.switches]
+        summary = collect_fleet(endpoints, args.output_dir, _thrift_client_factory(args.p4_name),
+                                max_workers=args.max_workers, retries=args.retries, backoff=args.backoff)
+    else:
+        collect_table_entries(args.p4_name, args.thrift_port, args.output_dir, args.thrift_ip)
 
+    if args.snapshot_dir:
+        from data_collection.snapshots import snapshot_directory
+        if args.switches:
+            # Um histórico de versões por switch coletado com sucesso
+            for name, counts in summary.items():
+                if 'error' not in counts:
+                    snapshot_directory(os.path.join(args.output_dir, name), os.path.join(args.snapshot_dir, name), args.keep)
+        else:
+            snapshot_directory(args.output_dir, args.snapshot_dir, args.keep)
@@ -0,0 +1,263 @@
+import numpy as np
+import json
+import os
+
+# Formato colunar usado entre os estágios do pipeline: um diretório "<nome>.cols"
+# com um arquivo schema.json e um arquivo binário por coluna (<coluna>.bin).
+# Cada coluna tem tipo fixo e pode ser aberta com np.memmap sem cópia.
+COLUMNAR_SUFFIX = '.cols'
+SCHEMA_FILE = 'schema.json'
+FORMAT_VERSION = 1
+
+# Tipos das colunas conhecidas das tabelas. Valores ausentes ('N/A' ou vazios)
+# viram NaN nas colunas numéricas e b'' nas colunas de texto.
+COLUMN_DTYPES = {
+    'dst_mac': 'S17',
+    'dst_ip': 'S15',
+    'action_name': 'S64',
+    'egress_port': 'f8',
+    'prefix_len': 'f8',
+}
+
+def is_columnar_path(path):
+    return path.endswith(COLUMNAR_SUFFIX) or os.path.isfile(os.path.join(path, SCHEMA_FILE))
+
+def table_path(directory, stem, fmt='columnar'):
+    if fmt == 'csv':
+        return os.path.join(directory, stem + '.csv')
+    return os.path.join(directory, stem + COLUMNAR_SUFFIX)
+
+def find_table(directory, stem):
+    # Prefere o formato colunar; usa o CSV se for o único disponível
+    columnar_path = table_path(directory, stem, 'columnar')
+    if os.path.isfile(os.path.join(columnar_path, SCHEMA_FILE)):
+        return columnar_path
+    return table_path(directory, stem, 'csv')
+
+def data_table_path(data_path, table, directory='processed_data', stem='processed_{table}_data'):
+    # Tabela usada pelas CLIs de treino e avaliação: --data_path (com {table} no
+    # lugar do nome, ex.: processed_data/packet_{table}_data) ou a tabela pré-processada
+    if data_path is None:
+        return find_table(directory, stem.format(table=table))
+    path = data_path.format(table=table)
+    return path if os.path.exists(path) else find_table(os.path.dirname(path), os.path.basename(path))
+
+def _column_dtype(name, values):
+    import pandas as pd
+    if name in COLUMN_DTYPES:
+        return np.dtype(COLUMN_DTYPES[name])
+    if pd.api.types.is_bool_dtype(values):
+        return np.dtype('u1')
+    if pd.api.types.is_numeric_dtype(values):
+        return np.dtype('f8')
+    width = int(values.dropna().astype(str).str.len().max()) if values.notna().any() else 1
+    return np.dtype(f'S{max(width, 1)}')
+
+def _encode_column(values, dtype):
+    import pandas as pd
+    if dtype.kind == 'S':
+        text = values.astype(object).where(values.notna(), '').astype(str)
+        # Valores numéricos em colunas de texto não devem virar "1.0"
+        text = text.str.replace(r'\.0$', '', regex=True) if pd.api.types.is_float_dtype(values) else text
+        too_long = text.str.len() > dtype.itemsize
+        if too_long.any():
+            raise ValueError(f"Valor com mais de {dtype.itemsize} caracteres na coluna '{values.name}': {text[too_long].iloc[0]!r}")
+        return text.str.encode('ascii').to_numpy(dtype=dtype)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=dtype, na_value=np.nan)
+
+class ColumnarWriter:
+    # Escritor incremental: cada chamada a append() acrescenta um bloco de linhas
+    # aos arquivos das colunas; o schema é gravado em close().
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = list(columns) if columns is not None else None
+        self.dtypes = None
+        self.rows = 0
+        self._files = None
+        os.makedirs(path, exist_ok=True)
+        # Remover o schema antigo invalida a tabela até o fim da escrita
+        schema_path = os.path.join(path, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            os.remove(schema_path)
+
+    def _open(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+        self.dtypes = {col: _column_dtype(col, df[col]) for col in self.columns}
+        self._files = {col: open(os.path.join(self.path, col + '.bin'), 'wb') for col in self.columns}
+
+    def append(self, df):
+        if self._files is None:
+            if len(df) == 0 and self.columns is None:
+                return
+            self._open(df)
+        for col in self.columns:
+            self._files[col].write(_encode_column(df[col], self.dtypes[col]).tobytes())
+        self.rows += len(df)
+
+    def append_arrays(self, arrays):
+        # Acrescenta colunas NumPy já tipadas (dict ou array estruturado) sem passar
+        # pelo pandas; os tipos da primeira chamada são mantidos no arquivo
+        names = list(arrays.dtype.names) if isinstance(arrays, np.ndarray) else list(arrays)
+        if self._files is None:
+            if self.columns is None:
+                self.columns = names
+            self.dtypes = {col: np.asarray(arrays[col]).dtype for col in self.columns}
+            self._files = {col: open(os.path.join(self.path, col + '.bin'), 'wb') for col in self.columns}
+        for col in self.columns:
+            self._files[col].write(np.ascontiguousarray(arrays[col], dtype=self.dtypes[col]).tobytes())
+        self.rows += len(arrays[self.columns[0]]) if self.columns else 0
+
+    def close(self):
+        import pandas as pd
+        if self._files is None:
+            self._open(pd.DataFrame(columns=self.columns or []))
+        for f in self._files.values():
+            f.close()
+        schema = {
+            'format_version': FORMAT_VERSION,
+            'rows': self.rows,
+            'columns': [{'name': col, 'dtype': self.dtypes[col].str} for col in self.columns],
+        }
+        with open(os.path.join(self.path, SCHEMA_FILE), 'w') as f:
+            json.dump(schema, f, indent=4)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._files is not None:
+            for f in self._files.values():
+                f.close()
+
+class CsvWriter:
+    # Mesma interface do ColumnarWriter para exportação em CSV
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = list(columns) if columns is not None else None
+        self.rows = 0
+        self._file = open(path, 'w', newline='')
+
+    def append(self, df):
+        if len(df) == 0:
+            return
+        df.to_csv(self._file, index=False, header=self.rows == 0)
+        self.rows += len(df)
+
+    def append_arrays(self, arrays):
+        self.append(columns_to_frame(arrays))
+
+    def close(self):
+        import pandas as pd
+        if self.rows == 0:
+            # Tabela vazia: mesmo resultado de pd.DataFrame([]).to_csv()
+            pd.DataFrame([]).to_csv(self._file, index=False)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+def open_table_writer(path, columns=None):
+    if is_columnar_path(path):
+        return ColumnarWriter(path, columns)
+    return CsvWriter(path, columns)
+
+def read_schema(path):
+    with open(os.path.join(path, SCHEMA_FILE), 'r') as f:
+        return json.load(f)
+
+def read_columns(path, columns=None):
+    # Retorna {coluna: array} mapeado em memória (somente leitura, sem cópia)
+    schema = read_schema(path)
+    rows = schema['rows']
+    arrays = {}
+    for col in schema['columns']:
+        name = col['name']
+        if columns is not None and name not in columns:
+            continue
+        dtype = np.dtype(col['dtype'])
+        if rows == 0:
+            arrays[name] = np.empty(0, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(os.path.join(path, name + '.bin'), dtype=dtype, mode='r', shape=(rows,))
+    if columns is not None:
+        missing = [col for col in columns if col not in arrays]
+        if missing:
+            raise KeyError(f"Colunas {missing} não encontradas em {path}")
+        arrays = {col: arrays[col] for col in columns}
+    return arrays
+
+def _column_to_series(name, values):
+    import pandas as pd
+    if values.dtype.kind == 'S':
+        series = pd.Series(np.char.decode(values, 'ascii'), name=name, dtype=object)
+        return series.where(series != '', np.nan)
+    series = pd.Series(np.asarray(values), name=name)
+    if values.dtype.kind == 'f':
+        finite = series.dropna()
+        if (finite == np.floor(finite)).all():
+            return series.astype('Int64')
+    return series
+
+def columns_to_frame(arrays):
+    # {coluna: array tipado} -> DataFrame (inverso de encode_columns)
+    import pandas as pd
+    return pd.DataFrame({name: _column_to_series(name, values) for name, values in arrays.items()})
+
+def encode_columns(df, columns=None):
+    # {coluna: array} com os mesmos tipos e valores gravados pelo ColumnarWriter
+    columns = list(df.columns) if columns is None else columns
+    return {col: _encode_column(df[col], _column_dtype(col, df[col])) for col in columns}
+
+def read_columnar(path, columns=None):
+    return columns_to_frame(read_columns(path, columns))
+
+def iter_table(path, chunk_size=100000, shuffle_seed=None):
+    # Lê a tabela em blocos de até chunk_size linhas, retornando (linha inicial, DataFrame).
+    # No formato colunar, shuffle_seed embaralha a ordem dos blocos (o CSV é lido em ordem).
+    import pandas as pd
+    if not is_columnar_path(path):
+        start = 0
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            yield start, chunk.reset_index(drop=True)
+            start += len(chunk)
+        return
+    schema = read_schema(path)
+    rows = schema['rows']
+    starts = np.arange(0, rows, chunk_size)
+    if shuffle_seed is not None:
+        starts = np.random.default_rng(shuffle_seed).permutation(starts)
+    for start in starts:
+        start, count = int(start), min(chunk_size, rows - int(start))
+        # Leitura direta do trecho (sem memmap), para que as páginas já lidas não
+        # se acumulem no processo: a memória fica limitada a um bloco
+        columns = {}
+        for col in schema['columns']:
+            dtype = np.dtype(col['dtype'])
+            values = np.fromfile(os.path.join(path, col['name'] + '.bin'), dtype=dtype, count=count, offset=start * dtype.itemsize)
+            columns[col['name']] = _column_to_series(col['name'], values)
+        yield start, pd.DataFrame(columns)
+
+def write_columnar(df, path):
+    with ColumnarWriter(path, df.columns) as writer:
+        writer.append(df)
+
+def load_table(path):
+    import pandas as pd
+    if is_columnar_path(path):
+        return read_columnar(path)
+    return pd.read_csv(path)
+
+def save_table(df, path):
+    if is_columnar_path(path):
+        write_columnar(df, path)
+    else:
+        df.to_csv(path, index=False)
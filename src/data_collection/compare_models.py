@@ -1,105 +1,246 @@
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from tensorflow.keras.models import load_model
-import joblib
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
 import os
-
-def evaluate_model(model, X_test, y_test, model_name):
-    if model_name == "Neural Network":
-        _, accuracy = model.evaluate(X_test, y_test, verbose=0)
-        y_pred = np.argmax(model.predict(X_test), axis=1)
-        y_test_labels = np.argmax(y_test, axis=1)
-    else:
-        y_pred = model.predict(X_test)
-        accuracy = accuracy_score(y_test, y_pred)
-        y_test_labels = y_test
-
-    precision = precision_score(y_test_labels, y_pred, average=\'weighted\', zero_division=0)
-    recall = recall_score(y_test_labels, y_pred, average=\'weighted\', zero_division=0)
-    f1 = f1_score(y_test_labels, y_pred, average=\'weighted\', zero_division=0)
-
-    print(f"\n--- Avaliação do Modelo: {model_name} ---")
-    print(f"Acurácia: {accuracy:.4f}")
-    print(f"Precisão: {precision:.4f}")
-    print(f"Recall: {recall:.4f}")
-    print(f"F1-Score: {f1:.4f}")
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.address_encoding import parse_ipv4, parse_mac
+from data_collection.columnar import data_table_path, load_table
+from data_collection.features import (DEFAULT_CACHE_DIR, build_features, build_streaming_features, feature_info_path, iter_feature_chunks,
+                                      labeled_rows, load_feature_info, streaming_test_rows)
+from instrumentation import add_rows, phase, stage
+from runtime_info import PeakRss
+
+MODEL_ORDER = ["Neural Network", "Random Forest", "Logistic Regression"]
+
+def scores(y_true, y_pred):
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+    accuracy = accuracy_score(y_true, y_pred)
+    precision = precision_score(y_true, y_pred, average='weighted', zero_division=0)
+    recall = recall_score(y_true, y_pred, average='weighted', zero_division=0)
+    f1 = f1_score(y_true, y_pred, average='weighted', zero_division=0)
     return accuracy, precision, recall, f1
 
-def compare_models(data_path, nn_model_path, rf_model_path, ml_model_path):
-    df = pd.read_csv(data_path)
-
-    if 'action_name' in df.columns:
-        le = LabelEncoder()
-        df['action_name_encoded'] = le.fit_transform(df['action_name'])
-
-    features = [col for col in df.columns if col not in ["egress_port", "action_name", "dst_mac", "dst_ip"]]
-    if 'action_name_encoded' in df.columns:
-        features.append('action_name_encoded')
-
-    X = df[features].fillna(0)
-    y = df["egress_port"]
-
-    # Para NN, y precisa ser one-hot encoded
-    from tensorflow.keras.utils import to_categorical
-    y_nn = to_categorical(y)
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    _, _, _, y_test_nn = train_test_split(X, y_nn, test_size=0.2, random_state=42)
-
-    scaler = StandardScaler()
-    X_train = scaler.fit_transform(X_train)
-    X_test = scaler.transform(X_test)
-
-    results = {}
-
-    # Avaliar Rede Neural Artificial
-    if os.path.exists(nn_model_path):
-        nn_model = load_model(nn_model_path)
-        acc, prec, rec, f1 = evaluate_model(nn_model, X_test, y_test_nn, "Neural Network")
-        results["Neural Network"] = {"accuracy": acc, "precision": prec, "recall": rec, "f1_score": f1}
-    else:
-        print(f"Modelo de Rede Neural não encontrado em {nn_model_path}")
-
-    # Avaliar Random Forest
-    if os.path.exists(rf_model_path):
-        rf_model = joblib.load(rf_model_path)
-        acc, prec, rec, f1 = evaluate_model(rf_model, X_test, y_test, "Random Forest")
-        results["Random Forest"] = {"accuracy": acc, "precision": prec, "recall": rec, "f1_score": f1}
+def predict_labels(model, X, kind):
+    # kind: tipo retornado por load_model_file; só o Keras devolve probabilidades
+    # (os preditores NumPy, inclusive a NN int8, já retornam as classes)
+    if kind == 'keras':
+        return np.argmax(model.predict(X, verbose=0), axis=1)
+    return np.asarray(model.predict(X))
+
+def evaluate_model(model, X_test, y_test, kind):
+    # Uma única passada de predição por modelo; todas as métricas saem de y_pred
+    # (para a NN, a acurácia de model.evaluate é a mesma comparação de argmax)
+    y_test_labels = np.argmax(y_test, axis=1) if np.ndim(y_test) == 2 else np.asarray(y_test)
+    start = time.perf_counter()
+    y_pred = predict_labels(model, X_test, kind)
+    predict_seconds = time.perf_counter() - start
+    return scores(y_test_labels, y_pred) + (y_pred, predict_seconds)
+
+def evaluate_model_streaming(model, features, kind):
+    # Modelo treinado em blocos: conjunto de teste da divisão por hash, normalizado
+    # com o scaler ajustado em blocos (os mesmos usados no treinamento)
+    y_true, y_pred, predict_seconds = [], [], 0.0
+    for X, y in iter_feature_chunks(features, 'test'):
+        start = time.perf_counter()
+        y_pred.append(predict_labels(model, X, kind))
+        predict_seconds += time.perf_counter() - start
+        y_true.append(y)
+    y_true = np.concatenate(y_true) if y_true else np.zeros(0, dtype=np.int64)
+    y_pred = np.concatenate(y_pred) if y_pred else np.zeros(0, dtype=np.int64)
+    return scores(y_true, y_pred) + (y_pred, predict_seconds)
+
+def print_evaluation(model_name, metrics):
+    print(f"\n--- Avaliação do Modelo: {model_name} ---")
+    print(f"Acurácia: {metrics['accuracy']:.4f}")
+    print(f"Precisão: {metrics['precision']:.4f}")
+    print(f"Recall: {metrics['recall']:.4f}")
+    print(f"F1-Score: {metrics['f1_score']:.4f}")
+
+def load_evaluation_model(model_path):
+    # Modelo Keras (.h5), exportado para NumPy (.npz) ou sklearn (.pkl); retorna (tipo, modelo, tempo de carga).
+    # As matrizes de teste já estão normalizadas pelo scaler do cache de features
+    from models.model_registry import load_model_file
+    start = time.perf_counter()
+    kind, model = load_model_file(model_path, scaled_input=True)
+    return kind, model, time.perf_counter() - start
+
+def oracle_predictions(data_path, idx_test=None, feature_info=None):
+    # Consulta exact/LPM na própria tabela para os endereços do conjunto de teste
+    # (o da divisão por hash, para modelos treinados em blocos)
+    from data_collection.table_lookup import table_from_frame
+    df = load_table(data_path)
+    if feature_info is not None:
+        idx_test = streaming_test_rows(df, feature_info['test_size'], feature_info['random_state'])
+    df = labeled_rows(df)
+    table = table_from_frame(df)
+    if 'dst_ip' in df.columns:
+        addresses = parse_ipv4(df['dst_ip'].to_numpy()[idx_test])[0]
     else:
-        print(f"Modelo Random Forest não encontrado em {rf_model_path}")
-
-    # Avaliar Modelo ML Tradicional (Regressão Logística)
-    if os.path.exists(ml_model_path):
-        ml_model = joblib.load(ml_model_path)
-        acc, prec, rec, f1 = evaluate_model(ml_model, X_test, y_test, "Logistic Regression")
-        results["Logistic Regression"] = {"accuracy": acc, "precision": prec, "recall": rec, "f1_score": f1}
+        addresses = parse_mac(df['dst_mac'].to_numpy()[idx_test])[0]
+    start = time.perf_counter()
+    ports = table.lookup_ports(addresses)
+    lookup_seconds = time.perf_counter() - start
+    return ports, lookup_seconds
+
+def oracle_metrics(y_pred, oracle_ports, predict_seconds):
+    n = max(len(oracle_ports), 1)
+    return {
+        # Fração das predições iguais à porta retornada pela consulta à tabela
+        "oracle_agreement": float(np.mean(np.asarray(y_pred) == oracle_ports)) if len(oracle_ports) else 0.0,
+        "latency_per_row_us": predict_seconds / n * 1e6,
+    }
+
+@stage('evaluate_model', target='model_path')
+def evaluate_model_path(data_path, model_name, model_path, address_bits=False, oracle_ports=None, cache_dir=DEFAULT_CACHE_DIR):
+    # Tarefa de um worker: resolve e carrega o modelo e calcula todas as métricas com uma
+    # predição. O pico de RSS é o desta avaliação: no modo serial (e nos workers
+    # reaproveitados pelo pool) o mesmo processo já avaliou outros modelos, cuja
+    # memória ainda residente fica fora de peak_rss_delta_mb
+    with PeakRss() as rss:
+        feature_info = load_feature_info(model_path)
+        if feature_info is not None:
+            # Treinado em blocos: avaliado na divisão por hash com os seus pré-processadores;
+            # outra divisão de teste, e com ela outra resposta da tabela (sempre calculada aqui)
+            print(f"{model_name} ({model_path}) foi treinado em blocos: avaliado na divisão por hash com os seus pré-processadores.")
+            features = build_streaming_features(data_path, feature_info['test_size'], feature_info['random_state'],
+                                                feature_info['address_bits'], feature_info['chunk_size'], cache_dir=cache_dir)
+            with phase('oracle'):
+                oracle_ports = oracle_predictions(data_path, feature_info=feature_info)[0]
+        else:
+            features = build_features(data_path, address_bits=address_bits, cache_dir=cache_dir)
+        with phase('load'):
+            kind, model, load_seconds = load_evaluation_model(model_path)
+        with phase('predict'):
+            if feature_info is not None:
+                acc, prec, rec, f1, y_pred, predict_seconds = evaluate_model_streaming(model, features, kind)
+            else:
+                acc, prec, rec, f1, y_pred, predict_seconds = evaluate_model(model, features.X_test, features.y_test, kind)
+        n = len(y_pred)
+        add_rows(n)
+        metrics = {"accuracy": float(acc), "precision": float(prec), "recall": float(rec), "f1_score": float(f1)}
+        if oracle_ports is not None:
+            metrics.update(oracle_metrics(y_pred, oracle_ports, predict_seconds))
+        metrics["throughput_rows_per_second"] = n / predict_seconds if predict_seconds > 0 else 0.0
+        metrics["load_seconds"] = load_seconds
+    metrics["peak_rss_mb"] = rss.peak_mb
+    metrics["peak_rss_delta_mb"] = rss.increase_mb
+    return metrics
+
+def _evaluation_pool(workers):
+    # fork é mais rápido, mas não é seguro depois que o TensorFlow foi importado neste processo
+    method = 'spawn' if 'tensorflow' in sys.modules else 'fork'
+    return concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
+
+@stage('evaluate', target='tables')
+def compare_tables(tables, address_bits=False, workers=None, cache_dir=DEFAULT_CACHE_DIR):
+    # tables: {nome: (data_path, {nome do modelo: caminho})}. Todos os pares
+    # (tabela, modelo) são avaliados em paralelo; retorna {nome: resultados}.
+    # Cada modelo só é resolvido (divisão de teste, pré-processadores, carga) na
+    # tarefa que o avalia; aqui apenas se verifica quais arquivos existem e quais
+    # foram treinados em blocos (.features.json).
+    prepared = {}
+    jobs = []
+    for table_name, (data_path, model_paths) in tables.items():
+        available = []
+        for model_name, model_path in model_paths.items():
+            if os.path.exists(model_path):
+                available.append((model_name, model_path))
+            else:
+                print(f"[{table_name}] Modelo {model_name} não encontrado em {model_path}")
+        if not available:
+            continue
+        in_memory = [model_path for _, model_path in available if not os.path.exists(feature_info_path(model_path))]
+        oracle_ports = None
+        if in_memory:
+            # Features (cache) e oráculo da divisão em memória, uma vez por tabela antes dos
+            # workers; se todos os modelos foram treinados em blocos, a tabela não é
+            # carregada inteira aqui (cada tarefa usa a sua divisão por hash)
+            features = build_features(data_path, address_bits=address_bits, cache_dir=cache_dir)
+            with phase('oracle'):
+                oracle_ports, lookup_seconds = oracle_predictions(data_path, features.idx_test)
+            prepared[table_name] = (features.y_test, oracle_ports, lookup_seconds)
+        else:
+            prepared[table_name] = None
+        for model_name, model_path in available:
+            model_oracle = oracle_ports if model_path in in_memory else None
+            jobs.append((table_name, model_name, (data_path, model_name, model_path, address_bits, model_oracle, cache_dir)))
+
+    workers = workers if workers is not None else min(os.cpu_count() or 1, len(jobs), 4)
+    evaluated = {}
+    if workers > 1 and len(jobs) > 1:
+        # Os registros dos workers vão para o trace como estágios próprios
+        with phase('models'), _evaluation_pool(workers) as pool:
+            futures = {pool.submit(evaluate_model_path, *args): (table_name, model_name) for table_name, model_name, args in jobs}
+            for future in concurrent.futures.as_completed(futures):
+                evaluated[futures[future]] = future.result()
     else:
-        print(f"Modelo ML Tradicional não encontrado em {ml_model_path}")
-
-    print("\n--- Resumo dos Resultados ---")
-    for model_name, metrics in results.items():
-        print(f"Modelo: {model_name}")
-        for metric, value in metrics.items():
-            print(f"  {metric.replace("\'_\', \' \'").title()}: {value:.4f}")
+        for table_name, model_name, args in jobs:
+            evaluated[(table_name, model_name)] = evaluate_model_path(*args)
+
+    all_results = {}
+    for table_name, baseline in prepared.items():
+        results = {}
+        for model_name in MODEL_ORDER:
+            if (table_name, model_name) in evaluated:
+                results[model_name] = evaluated[(table_name, model_name)]
+                print_evaluation(model_name, results[model_name])
+
+        # Linha de base: a própria consulta à tabela (acurácia em relação aos rótulos de
+        # teste), calculada na divisão em memória
+        if baseline is not None:
+            y_test, oracle_ports, lookup_seconds = baseline
+            n = max(len(oracle_ports), 1)
+            results["Table Lookup"] = {
+                "accuracy": float(np.mean(oracle_ports == y_test)) if len(y_test) else 0.0,
+                "latency_per_row_us": lookup_seconds / n * 1e6,
+                "throughput_rows_per_second": len(oracle_ports) / lookup_seconds if lookup_seconds > 0 else 0.0,
+            }
+
+        print(f"\n--- Resumo dos Resultados ({table_name}) ---")
+        for model_name, metrics in results.items():
+            print(f"Modelo: {model_name}")
+            for metric, value in metrics.items():
+                print(f"  {metric.replace('_', ' ').title()}: {value:.4f}" if value is not None else f"  {metric.replace('_', ' ').title()}: -")
+        all_results[table_name] = results
+    return all_results
+
+def compare_models(data_path, nn_model_path, rf_model_path, ml_model_path, address_bits=False, workers=None, cache_dir=DEFAULT_CACHE_DIR):
+    # Mesmas features (e mesma divisão) usadas no treinamento, lidas do cache
+    model_paths = {"Neural Network": nn_model_path, "Random Forest": rf_model_path, "Logistic Regression": ml_model_path}
+    return compare_tables({data_path: (data_path, model_paths)}, address_bits, workers, cache_dir)[data_path]
+
+def table_models(table, models_dir="models"):
+    from models.model_registry import MODEL_FILES
+    names = {'nn': "Neural Network", 'rf': "Random Forest", 'lr': "Logistic Regression"}
+    return {names[key]: os.path.join(models_dir, pattern.format(table=table)) for key, pattern in MODEL_FILES.items()}
 
 if __name__ == '__main__':
-    # Exemplo de uso para a tabela ethernet
-    print("\nComparando modelos para a tabela Ethernet:")
-    ethernet_data_path = os.path.join("processed_data", "processed_ethernet_data.csv")
-    ethernet_nn_model = os.path.join("models", "neural_network_ethernet.h5")
-    ethernet_rf_model = os.path.join("models", "random_forest_ethernet.pkl")
-    ethernet_ml_model = os.path.join("models", "logistic_regression_ethernet.pkl")
-    compare_models(ethernet_data_path, ethernet_nn_model, ethernet_rf_model, ethernet_ml_model)
-
-    # Exemplo de uso para a tabela ipv4
-    print("\nComparando modelos para a tabela IPv4:")
-    ipv4_data_path = os.path.join("processed_data", "processed_ipv4_data.csv")
-    ipv4_nn_model = os.path.join("models", "neural_network_ipv4.h5")
-    ipv4_rf_model = os.path.join("models", "random_forest_ipv4.pkl")
-    ipv4_ml_model = os.path.join("models", "logistic_regression_ipv4.pkl")
-    compare_models(ipv4_data_path, ipv4_nn_model, ipv4_rf_model, ipv4_ml_model)
-
-
+    parser = argparse.ArgumentParser(description='Compara os modelos treinados para as tabelas do BMv2.')
+    parser.add_argument('--address_bits', action='store_true', help='Usa os bits de dst_mac/dst_ip (e prefixos mascarados) como features.')
+    parser.add_argument('--workers', type=int, default=None, help='Processos paralelos (1 avalia tudo no processo atual).')
+    parser.add_argument('--data_path', type=str, default=None,
+                        help='Tabela de cada modelo, com {table} no lugar de ethernet/ipv4 (padrão: processed_data/processed_{table}_data; ex.: processed_data/packet_{table}_data).')
+    parser.add_argument('--output_dir', type=str, default='evaluation', help='Diretório dos resultados (results_<tabela>.json, lidos por generate_report.py).')
+    args = parser.parse_args()
+
+    # Tabelas ethernet e ipv4 avaliadas juntas: os seis modelos rodam em paralelo
+    tables = {}
+    for table in ['ethernet', 'ipv4']:
+        data_path = data_table_path(args.data_path, table)
+        if os.path.exists(data_path):
+            tables[table] = (data_path, table_models(table))
+        else:
+            print(f"Dados para {table}_table não encontrados em {data_path}. Pulando.")
+    all_results = compare_tables(tables, address_bits=args.address_bits, workers=args.workers)
+    # Mesmo formato de pipeline.run_compare: generate_report.py lê evaluation/results_*.json
+    os.makedirs(args.output_dir, exist_ok=True)
+    for table, results in all_results.items():
+        results_path = os.path.join(args.output_dir, f'results_{table}.json')
+        with open(results_path, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Resultados de {table} salvos em {results_path}")
@@ -0,0 +1,244 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.collect_data import parse_endpoint, thrift_client
+
+# Leitura periódica de contadores do BMv2 (por exemplo o direct_counter
+# packet_counter de my_table em metrics.p4). Cada contador guarda as últimas
+# `capacity` leituras de todas as entradas em um buffer circular NumPy e as
+# taxas (pacotes/s e bytes/s) são calculadas com diferenças vetorizadas.
+
+def parse_counter(spec):
+    # "contador@tabela" para contadores diretos (uma célula por entrada da tabela)
+    # ou "contador:tamanho" para contadores indiretos (células 0..tamanho-1)
+    name, sep, table = spec.partition('@')
+    if sep:
+        return {'name': name, 'table': table, 'size': None}
+    name, sep, size = spec.partition(':')
+    return {'name': name, 'table': None, 'size': int(size) if sep else None}
+
+class ThriftCounterSource:
+    # Lê contadores pelas chamadas Thrift do runtime do BMv2 (a mesma conexão do
+    # ThriftAPI usado em collect_data.py). O runtime não tem leitura em lote de
+    # contadores: é uma chamada por célula, e os resultados são convertidos para
+    # arrays uma única vez por leitura.
+    def __init__(self, client):
+        self.client = client
+
+    def read(self, counter):
+        # Retorna (identificadores, pacotes, bytes) como arrays
+        runtime = self.client.client
+        if counter['table']:
+            handles = np.array(sorted(entry.entry_handle for entry in runtime.bm_mt_get_entries(0, counter['table'])), dtype=np.int64)
+            values = [runtime.bm_mt_read_counter(0, counter['table'], int(handle)) for handle in handles]
+        else:
+            handles = np.arange(counter['size'] or 0, dtype=np.int64)
+            values = [runtime.bm_counter_read(0, counter['name'], int(index)) for index in handles]
+        packets = np.fromiter((value.packets for value in values), dtype=np.float64, count=len(values))
+        n_bytes = np.fromiter((value.bytes for value in values), dtype=np.float64, count=len(values))
+        return handles, packets, n_bytes
+
+class MockCounterSource:
+    # Fonte simulada para testes: cada entrada recebe pacotes (Poisson) a uma taxa
+    # própria; `churn` é a fração de entradas substituídas a cada leitura (novos
+    # identificadores, contadores zerados), como quando o plano de controle
+    # remove e reinstala regras.
+    def __init__(self, n_entries, seed=0, mean_pps=100.0, mean_packet_size=500.0, churn=0.0, clock=time.monotonic):
+        self.rng = np.random.default_rng(seed)
+        self.mean_pps = mean_pps
+        self.mean_packet_size = mean_packet_size
+        self.churn = churn
+        self.clock = clock
+        self.handles = np.arange(n_entries, dtype=np.int64)
+        self.rates = self._new_rates(n_entries)
+        self.packets = np.zeros(n_entries)
+        self.bytes = np.zeros(n_entries)
+        self.last_read = {}
+
+    def _new_rates(self, n):
+        return self.rng.lognormal(np.log(self.mean_pps), 1.0, n)
+
+    def read(self, counter):
+        now = self.clock()
+        elapsed = now - self.last_read.get(counter['name'], now)
+        self.last_read[counter['name']] = now
+        new_packets = self.rng.poisson(self.rates * elapsed)
+        self.packets += new_packets
+        self.bytes += new_packets * self.mean_packet_size
+        if self.churn:
+            replaced = np.flatnonzero(self.rng.random(len(self.handles)) < self.churn)
+            self.handles[replaced] = self.handles.max() + 1 + np.arange(len(replaced))
+            self.rates[replaced] = self._new_rates(len(replaced))
+            self.packets[replaced] = 0
+            self.bytes[replaced] = 0
+        order = np.argsort(self.handles)
+        return self.handles[order], self.packets[order].copy(), self.bytes[order].copy()
+
+class CounterRing:
+    # Buffer circular de tamanho fixo: `capacity` leituras x entradas. Os valores
+    # ficam em float64 (exatos até 2**53) para que entradas que ainda não existiam
+    # em uma leitura sejam NaN.
+    def __init__(self, capacity=60):
+        self.capacity = capacity
+        self.handles = np.empty(0, dtype=np.int64)
+        self.times = np.full(capacity, np.nan)
+        self.packets = np.full((capacity, 0), np.nan)
+        self.bytes = np.full((capacity, 0), np.nan)
+        self.count = 0
+
+    def _remap(self, handles):
+        # Entradas novas ou removidas: copia o histórico das entradas que continuam
+        packets = np.full((self.capacity, len(handles)), np.nan)
+        n_bytes = np.full((self.capacity, len(handles)), np.nan)
+        _, old_idx, new_idx = np.intersect1d(self.handles, handles, assume_unique=True, return_indices=True)
+        packets[:, new_idx] = self.packets[:, old_idx]
+        n_bytes[:, new_idx] = self.bytes[:, old_idx]
+        self.handles, self.packets, self.bytes = handles, packets, n_bytes
+
+    def push(self, timestamp, handles, packets, n_bytes):
+        if len(handles) != len(self.handles) or not np.array_equal(handles, self.handles):
+            self._remap(handles)
+        slot = self.count % self.capacity
+        self.times[slot] = timestamp
+        self.packets[slot] = packets
+        self.bytes[slot] = n_bytes
+        self.count += 1
+
+    def last(self, n):
+        # Índices (em ordem cronológica) das últimas n leituras
+        n = min(n, self.count, self.capacity)
+        return (self.count - n + np.arange(n)) % self.capacity
+
+    def rates(self, window=1):
+        # Taxas por entrada nas últimas `window` leituras: soma das diferenças entre
+        # leituras consecutivas dividida pelo tempo em que a entrada foi observada.
+        # Uma diferença negativa indica contador zerado, e conta o valor atual.
+        # Retorna (pacotes/s, bytes/s, máximo de pacotes/s em uma leitura).
+        idx = self.last(window + 1)
+        n = len(self.handles)
+        if len(idx) < 2:
+            nan = np.full(n, np.nan)
+            return nan, nan.copy(), nan.copy()
+        dt = np.diff(self.times[idx])[:, None]
+        result = []
+        for values in (self.packets[idx], self.bytes[idx]):
+            delta = np.diff(values, axis=0)
+            delta = np.where(delta < 0, values[1:], delta)
+            result.append(delta)
+        valid = ~np.isnan(result[0])
+        observed = np.where(valid, dt, 0).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            packet_rate = np.where(valid, result[0], 0).sum(axis=0) / observed
+            byte_rate = np.where(valid, result[1], 0).sum(axis=0) / observed
+            step_rates = np.where(valid, result[0] / dt, -np.inf).max(axis=0)
+        return packet_rate, byte_rate, np.where(observed > 0, step_rates, np.nan)
+
+class CounterPoller:
+    def __init__(self, source, counters, capacity=60):
+        self.source = source
+        self.counters = [parse_counter(c) if isinstance(c, str) else c for c in counters]
+        self.rings = {counter['name']: CounterRing(capacity) for counter in self.counters}
+        self.poll_seconds = []
+
+    def poll_once(self, timestamp=None):
+        start = time.perf_counter()
+        for counter in self.counters:
+            handles, packets, n_bytes = self.source.read(counter)
+            self.rings[counter['name']].push(time.monotonic() if timestamp is None else timestamp, handles, packets, n_bytes)
+        self.poll_seconds.append(time.perf_counter() - start)
+
+    def run(self, interval=1.0, duration=None, polls=None, on_poll=None):
+        # Leituras em instantes fixos (sem acumular atraso); uma leitura mais lenta
+        # que o intervalo faz o próximo instante ser pulado
+        next_tick = time.monotonic()
+        stop = None if duration is None else next_tick + duration
+        done = 0
+        while (polls is None or done < polls) and (stop is None or next_tick <= stop):
+            self.poll_once()
+            done += 1
+            if on_poll:
+                on_poll(self)
+            next_tick += interval
+            now = time.monotonic()
+            if now > next_tick:
+                next_tick += interval * np.ceil((now - next_tick) / interval)
+            time.sleep(max(0.0, next_tick - now))
+
+    def snapshot(self, window=10, max_entries=None):
+        # Tabela de tamanho limitado (uma linha por entrada e, opcionalmente, só as
+        # `max_entries` entradas com mais tráfego por contador) para uso como atributos
+        import pandas as pd
+        frames = []
+        for name, ring in self.rings.items():
+            if ring.count == 0:
+                continue
+            slot = ring.last(1)[0]
+            last_packets, last_bytes, _ = ring.rates(1)
+            mean_packets, mean_bytes, max_packets = ring.rates(window)
+            frame = pd.DataFrame({
+                'counter': name,
+                'entry_handle': ring.handles,
+                'packets': ring.packets[slot],
+                'bytes': ring.bytes[slot],
+                'packet_rate': last_packets,
+                'byte_rate': last_bytes,
+                'packet_rate_mean': mean_packets,
+                'byte_rate_mean': mean_bytes,
+                'packet_rate_max': max_packets,
+            })
+            if max_entries is not None and len(frame) > max_entries:
+                frame = frame.iloc[np.argsort(-np.nan_to_num(mean_packets, nan=-1), kind='stable')[:max_entries]]
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def export_snapshot(self, path, window=10, max_entries=None):
+        from data_collection.columnar import save_table
+        snapshot = self.snapshot(window, max_entries)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        save_table(snapshot, path)
+        return len(snapshot)
+
+def _print_poll(poller):
+    line = ', '.join(f"{name}: {len(ring.handles)} entradas, {np.nansum(ring.rates(1)[0]):.1f} pkt/s"
+                     for name, ring in poller.rings.items())
+    print(f"[{len(poller.poll_seconds)}] {line} (leitura em {poller.poll_seconds[-1] * 1000:.1f} ms)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lê periodicamente contadores de tabelas do BMv2 e calcula taxas de pacotes/bytes.')
+    parser.add_argument('--p4_name', type=str, default='metrics', help='Nome do programa P4.')
+    parser.add_argument('--thrift_port', type=str, default='9090', help='Porta Thrift do BMv2 (ou host:porta).')
+    parser.add_argument('--counters', type=str, nargs='+', default=['MyIngress.packet_counter@MyIngress.my_table'],
+                        help='Contadores a ler: contador@tabela (direto) ou contador:tamanho (indireto).')
+    parser.add_argument('--interval', type=float, default=1.0, help='Intervalo entre leituras (s).')
+    parser.add_argument('--duration', type=float, default=None, help='Duração total (s); sem limite se omitido.')
+    parser.add_argument('--polls', type=int, default=None, help='Número de leituras; sem limite se omitido.')
+    parser.add_argument('--capacity', type=int, default=60, help='Leituras mantidas por contador no buffer circular.')
+    parser.add_argument('--window', type=int, default=10, help='Leituras usadas nas taxas médias do snapshot.')
+    parser.add_argument('--max_entries', type=int, default=None, help='Máximo de entradas por contador no snapshot.')
+    parser.add_argument('--output', type=str, default=os.path.join('collected_data', 'counter_snapshot.cols'), help='Snapshot exportado ao final (.cols ou .csv).')
+    parser.add_argument('--mock', type=int, default=None, help='Usa uma fonte simulada com este número de entradas.')
+    parser.add_argument('--mock_churn', type=float, default=0.0, help='Fração de entradas da fonte simulada substituídas por leitura.')
+    args = parser.parse_args()
+
+    if args.mock is not None:
+        source = MockCounterSource(args.mock, churn=args.mock_churn)
+    else:
+        source = ThriftCounterSource(thrift_client(args.p4_name, parse_endpoint(args.thrift_port)))
+
+    poller = CounterPoller(source, args.counters, args.capacity)
+    try:
+        poller.run(args.interval, args.duration, args.polls, _print_poll)
+    except KeyboardInterrupt:
+        print("Leitura interrompida.")
+    if poller.poll_seconds:
+        seconds = np.array(poller.poll_seconds)
+        print(f"{len(seconds)} leituras; tempo por leitura: mediana {np.median(seconds) * 1000:.2f} ms, máximo {seconds.max() * 1000:.2f} ms.")
+        count = poller.export_snapshot(args.output, args.window, args.max_entries)
+        print(f"Snapshot com {count} entradas salvo em {args.output}")
@@ -0,0 +1,319 @@
+import numpy as np
+from collections import namedtuple
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.address_encoding import address_features
+from data_collection.columnar import is_columnar_path, iter_table, load_table
+from instrumentation import add_rows, phase, stage
+
+# Versão do pipeline de features; alterar invalida os caches existentes. A chave
+# do cache também inclui o hash do código da codificação (FEATURE_CODE_FILES),
+# de modo que editar esses módulos invalida o cache sem mudar a versão.
+FEATURE_PIPELINE_VERSION = 1
+DEFAULT_CACHE_DIR = 'feature_cache'
+FEATURE_CODE_FILES = ['features.py', 'address_encoding.py', 'columnar.py']
+_code_digest = None
+TARGET_COLUMN = 'egress_port'
+# Colunas que não são usadas diretamente como features
+EXCLUDED_COLUMNS = ['egress_port', 'action_name', 'dst_mac', 'dst_ip']
+# Colunas usadas pela codificação em bits dos endereços (address_bits=True)
+ADDRESS_COLUMNS = ['dst_mac', 'dst_ip', 'prefix_len']
+MATRIX_NAMES = ['X_train', 'X_test', 'y_train', 'y_test', 'idx_train', 'idx_test']
+
+FeatureSet = namedtuple('FeatureSet', MATRIX_NAMES + ['preprocessors', 'cache_path'])
+
+def hash_table(data_path):
+    # Hash do conteúdo da tabela (arquivo CSV ou todos os arquivos do diretório colunar)
+    digest = hashlib.sha256()
+    if is_columnar_path(data_path):
+        paths = [os.path.join(data_path, name) for name in sorted(os.listdir(data_path))]
+    else:
+        paths = [data_path]
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def hash_feature_code():
+    # Hash dos módulos que definem as features (calculado uma vez por processo)
+    global _code_digest
+    if _code_digest is None:
+        digest = hashlib.sha256()
+        for name in FEATURE_CODE_FILES:
+            digest.update(name.encode())
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+                digest.update(f.read())
+        _code_digest = digest.hexdigest()
+    return _code_digest
+
+def feature_cache_key(data_path, params):
+    digest = hashlib.sha256()
+    digest.update(hash_table(data_path).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(str(FEATURE_PIPELINE_VERSION).encode())
+    digest.update(hash_feature_code().encode())
+    return digest.hexdigest()[:32]
+
+def encode_frame(df, preprocessors):
+    # Aplica a codificação de action_name e a seleção de features de um pipeline já ajustado
+    import pandas as pd
+    df = df.copy()
+    le = preprocessors['label_encoder']
+    if le is not None:
+        names = df['action_name'].fillna('N/A').astype(str).to_numpy() if 'action_name' in df.columns else np.full(len(df), 'N/A')
+        # Ações desconhecidas na inferência recebem o código -1
+        known = np.isin(names, le.classes_)
+        codes = np.full(len(df), -1, dtype=np.int64)
+        codes[known] = le.transform(names[known])
+        df['action_name_encoded'] = codes
+    for col in preprocessors['feature_names']:
+        if col not in df.columns:
+            df[col] = 0
+    features = df[preprocessors['feature_names']]
+    X = features.apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    if preprocessors.get('address_bits'):
+        # Mesmo layout de bits do ajuste, mesmo que faltem colunas na inferência
+        address_df = pd.DataFrame({col: df[col] if col in df.columns else np.nan for col in preprocessors['address_columns']}, index=df.index)
+        bits, _ = address_features(address_df)
+        X = np.hstack([X, bits])
+    return X
+
+def transform_features(df, preprocessors):
+    # Features normalizadas para inferência, sem reajustar encoder e scaler
+    return preprocessors['scaler'].transform(encode_frame(df, preprocessors))
+
+def feature_names(preprocessors):
+    # Nomes de todas as colunas da matriz de features, na ordem
+    return preprocessors['feature_names'] + preprocessors.get('address_feature_names', [])
+
+def labeled_rows(df):
+    # Linhas sem target não podem ser usadas para treino nem avaliação; os índices
+    # idx_train/idx_test do FeatureSet referem-se às linhas retornadas aqui
+    import pandas as pd
+    y = pd.to_numeric(df[TARGET_COLUMN], errors='coerce')
+    return df[y.notna()].reset_index(drop=True)
+
+def fit_features(df, test_size=0.2, random_state=42, address_bits=False):
+    # sklearn importado apenas ao ajustar (leitura de cache e inferência não precisam dele)
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler, LabelEncoder
+    df = labeled_rows(df)
+    y = pd.to_numeric(df[TARGET_COLUMN], errors='coerce').to_numpy(dtype=np.int64)
+
+    # Codificar a coluna 'action_name' se for categórica
+    le = None
+    if 'action_name' in df.columns:
+        le = LabelEncoder()
+        df['action_name_encoded'] = le.fit_transform(df['action_name'].fillna('N/A').astype(str))
+
+    # Selecionar features: todas as colunas numéricas restantes, incluindo action_name_encoded
+    feature_names = [col for col in df.columns if col not in EXCLUDED_COLUMNS]
+    preprocessors = {
+        'label_encoder': le,
+        'scaler': None,
+        'feature_names': feature_names,
+        'classes': np.unique(y),
+        # Número de classes para a saída one-hot da rede neural (portas de 0 a max)
+        'n_classes': int(y.max()) + 1 if len(y) else 0,
+        'address_bits': address_bits,
+    }
+    if address_bits:
+        # Bits de dst_mac/dst_ip (chaves das tabelas) e variantes mascaradas pelo prefix_len
+        preprocessors['address_columns'] = [col for col in ADDRESS_COLUMNS if col in df.columns]
+        _, preprocessors['address_feature_names'] = address_features(df[preprocessors['address_columns']].head(0))
+    X = encode_frame(df, preprocessors)
+
+    # Dividir dados em treino e teste (índices preservados para consultas à tabela original)
+    idx = np.arange(len(df))
+    X_train, X_test, y_train, y_test, idx_train, idx_test = train_test_split(
+        X, y, idx, test_size=test_size, random_state=random_state)
+
+    # Normalizar features
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    X_test = scaler.transform(X_test)
+    preprocessors['scaler'] = scaler
+
+    matrices = dict(zip(MATRIX_NAMES, [X_train, X_test, y_train, y_test, idx_train, idx_test]))
+    return matrices, preprocessors
+
+def save_feature_cache(cache_path, matrices, preprocessors, params):
+    # Escreve em um diretório temporário e renomeia no fim para não deixar cache incompleto
+    tmp_path = f'{cache_path}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in matrices.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array))
+    import joblib
+    joblib.dump(preprocessors, os.path.join(tmp_path, 'preprocessors.pkl'))
+    with open(os.path.join(tmp_path, 'params.json'), 'w') as f:
+        json.dump(params, f, indent=4)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    try:
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Outro processo gravou o mesmo cache (mesma chave) ao mesmo tempo
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def load_preprocessors(cache_path):
+    import joblib
+    return joblib.load(os.path.join(cache_path, 'preprocessors.pkl'))
+
+def load_feature_cache(cache_path):
+    # Matrizes abertas com mmap, sem cópia
+    matrices = {name: np.load(os.path.join(cache_path, name + '.npy'), mmap_mode='r') for name in MATRIX_NAMES}
+    return FeatureSet(preprocessors=load_preprocessors(cache_path), cache_path=cache_path, **matrices)
+
+@stage('features', target='data_path')
+def build_features(data_path, test_size=0.2, random_state=42, address_bits=False, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+    params = {'test_size': test_size, 'random_state': random_state, 'address_bits': address_bits}
+    with phase('hash'):
+        cache_path = os.path.join(cache_dir, feature_cache_key(data_path, params))
+    if use_cache and os.path.exists(os.path.join(cache_path, 'preprocessors.pkl')):
+        print(f"Features carregadas do cache {cache_path}")
+        with phase('load_cache'):
+            return load_feature_cache(cache_path)
+
+    with phase('read'):
+        df = load_table(data_path)
+    add_rows(len(df))
+    with phase('encode'):
+        matrices, preprocessors = fit_features(df, test_size=test_size, random_state=random_state, address_bits=address_bits)
+    if not use_cache:
+        return FeatureSet(preprocessors=preprocessors, cache_path=None, **matrices)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with phase('save'):
+        save_feature_cache(cache_path, matrices, preprocessors, params)
+    print(f"Features salvas no cache {cache_path}")
+    with phase('load_cache'):
+        return load_feature_cache(cache_path)
+
+# Modo fora da memória (tabelas maiores que a RAM): a tabela é lida em blocos,
+# a divisão treino/teste é decidida por um hash da posição da linha e o scaler
+# é ajustado incrementalmente. Nenhuma matriz completa é materializada.
+StreamingFeatureSet = namedtuple('StreamingFeatureSet', ['data_path', 'preprocessors', 'cache_path', 'chunk_size', 'test_size', 'random_state'])
+
+def is_test_row(positions, test_size, random_state):
+    # Divisão determinística e independente do tamanho do bloco (splitmix64 da posição)
+    x = np.asarray(positions, dtype=np.uint64) ^ np.uint64(random_state)
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53) < test_size
+
+def _labeled_chunks(data_path, chunk_size, shuffle_seed=None):
+    import pandas as pd
+    for start, chunk in iter_table(data_path, chunk_size, shuffle_seed):
+        y = pd.to_numeric(chunk[TARGET_COLUMN], errors='coerce')
+        labeled = y.notna().to_numpy()
+        positions = np.arange(start, start + len(chunk))[labeled]
+        yield chunk[labeled].reset_index(drop=True), y[labeled].to_numpy(dtype=np.int64), positions
+
+def fit_streaming_features(data_path, test_size=0.2, random_state=42, address_bits=False, chunk_size=100000):
+    # 1ª passada: ações, classes e colunas; 2ª passada: StandardScaler.partial_fit nas linhas de treino
+    import pandas as pd
+    from sklearn.preprocessing import StandardScaler, LabelEncoder
+    action_names, classes, columns = set(), set(), None
+    for chunk, y, _ in _labeled_chunks(data_path, chunk_size):
+        columns = list(chunk.columns) if columns is None else columns
+        if 'action_name' in chunk.columns:
+            action_names.update(chunk['action_name'].fillna('N/A').astype(str).unique())
+        classes.update(np.unique(y).tolist())
+    if columns is None:
+        raise ValueError(f"Tabela {data_path} sem linhas rotuladas.")
+
+    le = None
+    if 'action_name' in columns:
+        le = LabelEncoder().fit(sorted(action_names))
+        columns = columns + ['action_name_encoded']
+    classes = np.array(sorted(classes), dtype=np.int64)
+    preprocessors = {
+        'label_encoder': le,
+        'scaler': StandardScaler(),
+        'feature_names': [col for col in columns if col not in EXCLUDED_COLUMNS],
+        'classes': classes,
+        'n_classes': int(classes.max()) + 1 if len(classes) else 0,
+        'address_bits': address_bits,
+    }
+    if address_bits:
+        preprocessors['address_columns'] = [col for col in ADDRESS_COLUMNS if col in columns]
+        _, preprocessors['address_feature_names'] = address_features(pd.DataFrame(columns=preprocessors['address_columns']))
+
+    for chunk, _, positions in _labeled_chunks(data_path, chunk_size):
+        train = ~is_test_row(positions, test_size, random_state)
+        if train.any():
+            preprocessors['scaler'].partial_fit(encode_frame(chunk[train], preprocessors))
+    return preprocessors
+
+def build_streaming_features(data_path, test_size=0.2, random_state=42, address_bits=False, chunk_size=100000, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+    # Apenas o encoder e o scaler vão para o cache; as matrizes são geradas bloco a bloco
+    params = {'test_size': test_size, 'random_state': random_state, 'address_bits': address_bits, 'streaming': True}
+    cache_path = os.path.join(cache_dir, feature_cache_key(data_path, params))
+    if use_cache and os.path.exists(os.path.join(cache_path, 'preprocessors.pkl')):
+        print(f"Pré-processadores carregados do cache {cache_path}")
+        preprocessors = load_preprocessors(cache_path)
+    else:
+        preprocessors = fit_streaming_features(data_path, test_size, random_state, address_bits, chunk_size)
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            save_feature_cache(cache_path, {}, preprocessors, params)
+            print(f"Pré-processadores salvos no cache {cache_path}")
+        else:
+            cache_path = None
+    return StreamingFeatureSet(data_path, preprocessors, cache_path, chunk_size, test_size, random_state)
+
+def iter_feature_chunks(features, split='train', shuffle_seed=None):
+    # Blocos (X normalizado, y) de um StreamingFeatureSet; split: 'train', 'test' ou 'all'
+    for chunk, y, positions in _labeled_chunks(features.data_path, features.chunk_size, shuffle_seed):
+        keep = np.ones(len(chunk), dtype=bool)
+        if split != 'all':
+            test = is_test_row(positions, features.test_size, features.random_state)
+            keep = test if split == 'test' else ~test
+        if keep.any():
+            yield transform_features(chunk[keep], features.preprocessors), y[keep]
+
+def streaming_test_rows(df, test_size=0.2, random_state=42):
+    # Índices, nas linhas de labeled_rows(df), do conjunto de teste do modo em blocos
+    import pandas as pd
+    labeled = np.flatnonzero(pd.to_numeric(df[TARGET_COLUMN], errors='coerce').notna().to_numpy())
+    return np.flatnonzero(is_test_row(labeled, test_size, random_state))
+
+def feature_info_path(model_path):
+    return model_path + '.features.json'
+
+def save_feature_info(model_path, features):
+    # Modelos treinados em blocos usam outra divisão treino/teste (hash da posição)
+    # e outro scaler (partial_fit): a avaliação precisa saber disso para usar os mesmos
+    path = feature_info_path(model_path)
+    if isinstance(features, StreamingFeatureSet):
+        with open(path, 'w') as f:
+            json.dump({'streaming': True, 'chunk_size': features.chunk_size, 'test_size': features.test_size,
+                       'random_state': features.random_state, 'address_bits': bool(features.preprocessors.get('address_bits'))}, f, indent=4)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def load_feature_info(model_path):
+    # None para modelos treinados com as features em memória
+    path = feature_info_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def streaming_accuracy(predict, features, split='test'):
+    correct = total = 0
+    for X, y in iter_feature_chunks(features, split):
+        correct += int(np.sum(np.asarray(predict(X)) == y))
+        total += len(y)
+    return correct / total if total else 0.0
@@ -0,0 +1,219 @@
+import numpy as np
+import argparse
+import os
+import time
+
+# Gera dumps sintéticos de ethernet_table e ipv4_table no mesmo formato de
+# collect_data.py (json.dump(entries, f, indent=4)), em blocos, sem manter a
+# tabela inteira em memória. Todos os campos de uma entrada são derivados da
+# sua "chave" k por hashing, de modo que a mesma semente gera os mesmos bytes
+# independentemente do tamanho do bloco, e uma entrada duplicada (mesmo k) é
+# idêntica à original.
+DEFAULT_PREFIX_LENGTHS = {8: 0.01, 16: 0.09, 20: 0.05, 22: 0.1, 24: 0.6, 32: 0.15}
+_TABLE_CODES = {'ethernet_table': 1, 'ipv4_table': 2}
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_MASK40 = np.uint64((1 << 40) - 1)
+
+def _mix(x):
+    # splitmix64 vetorizado
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+def _field_hash(keys, seed, field):
+    return _mix(keys ^ _mix(np.uint64(seed * 1000 + field)))
+
+def parse_distribution(specs):
+    # ["24:0.6", "16:0.3", "32:0.1"] -> {24: 0.6, 16: 0.3, 32: 0.1}
+    distribution = {}
+    for spec in specs:
+        length, _, weight = spec.partition(':')
+        length = int(length)
+        if not 0 <= length <= 32:
+            raise ValueError(f"Comprimento de prefixo inválido: {length}")
+        distribution[length] = float(weight or 1.0)
+    return distribution
+
+def ethernet_fields(keys, seed, n_ports):
+    # MACs localmente administrados (02:xx:...): bijeção de k em 40 bits, sem colisões
+    with np.errstate(over='ignore'):
+        scrambled = (keys * np.uint64(0x5DEECE66D | 1) + _field_hash(np.uint64(0), seed, 0)) & _MASK40
+    macs = np.uint64(0x02 << 40) | scrambled
+    ports = _field_hash(macs, seed, 1) % np.uint64(n_ports)
+    return {'dst_mac': macs, 'port': ports.astype(np.int64)}
+
+def ipv4_fields(keys, seed, n_ports, prefix_lengths):
+    lengths_table = np.array(sorted(prefix_lengths), dtype=np.int64)
+    cdf = np.cumsum([prefix_lengths[length] for length in lengths_table], dtype=np.float64)
+    uniform = (_field_hash(keys, seed, 2) >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+    lengths = lengths_table[np.minimum(np.searchsorted(cdf / cdf[-1], uniform, side='right'), len(lengths_table) - 1)]
+
+    masks = (np.uint64(0xFFFFFFFF) << (np.uint64(32) - lengths.astype(np.uint64))) & np.uint64(0xFFFFFFFF)
+    networks = (_field_hash(keys, seed, 3) >> np.uint64(32)) & masks
+    # Porta (e MAC do próximo salto) dependem apenas do prefixo: redes repetidas
+    # em prefixos curtos geram entradas idênticas, nunca conflitantes
+    ports = _field_hash(networks | (lengths.astype(np.uint64) << np.uint64(32)), seed, 4) % np.uint64(n_ports)
+    next_hops = np.uint64(0x02 << 40) | ports
+    return {'dst_ip': networks.astype(np.uint32), 'prefix_len': lengths, 'port': ports.astype(np.int64), 'dst_mac': next_hops}
+
+def _quote(values):
+    return np.char.add(np.char.add(b'"', values), b'"')
+
+def format_mac(macs):
+    # uint64 -> b"xx:xx:xx:xx:xx:xx" (S17), montado em uma matriz de bytes
+    macs = np.asarray(macs, dtype=np.uint64)
+    chars = np.full((len(macs), 17), ord(':'), dtype=np.uint8)
+    for i in range(12):
+        chars[:, i // 2 * 3 + i % 2] = _HEX_DIGITS[(macs >> np.uint64(44 - 4 * i)) & np.uint64(0xF)]
+    return chars.view('S17').ravel()
+
+def format_ipv4(ips):
+    # uint32 -> b"a.b.c.d" (S15); cada linha avança sua própria posição de escrita
+    ips = np.asarray(ips).astype(np.uint32)
+    n = len(ips)
+    chars = np.zeros((n, 15), dtype=np.uint8)
+    rows = np.arange(n)
+    position = np.zeros(n, dtype=np.int64)
+    for k in range(4):
+        octet = (ips >> np.uint32(24 - 8 * k)) & np.uint32(0xFF)
+        if k:
+            chars[rows, position] = ord('.')
+            position += 1
+        for divisor in (100, 10, 1):
+            write = (octet >= divisor) | (divisor == 1)
+            chars[rows[write], position[write]] = ord('0') + octet[write] // divisor % 10
+            position += write
+    return chars.view('S15').ravel()
+
+def _render(layout, values, indent=1):
+    # Renderiza um objeto JSON (layout: lista de (chave, subobjeto ou coluna)) exatamente
+    # como json.dumps(indent=4) aninhado em um array; retorna partes constantes e colunas
+    if not layout:
+        return [b'{}']
+    pad = b'    ' * indent
+    parts = [b'{']
+    for i, (key, value) in enumerate(layout):
+        parts.append(b'\n' + pad + b'    "' + key.encode() + b'": ')
+        parts.extend(_render(value, values, indent + 1) if isinstance(value, list) else [values[value]])
+        if i < len(layout) - 1:
+            parts.append(b',')
+    parts.append(b'\n' + pad + b'}')
+    return parts
+
+def _concatenate(parts, n):
+    result = np.full(n, b'', dtype='S1')
+    constant = b''
+    for part in parts:
+        if isinstance(part, bytes):
+            constant += part
+            continue
+        result = np.char.add(np.char.add(result, constant), part)
+        constant = b''
+    return np.char.add(result, constant)
+
+def _without(layout, field):
+    # Mesmo layout sem a coluna `field`
+    pruned = []
+    for key, value in layout:
+        if isinstance(value, list):
+            pruned.append((key, _without(value, field)))
+        elif value != field:
+            pruned.append((key, value))
+    return pruned
+
+ETHERNET_LAYOUT = [
+    ('match_fields', [('hdr.ethernet.dstAddr', 'dst_mac')]),
+    ('action_name', 'action_name'),
+    ('action_params', [('port', 'port')]),
+]
+IPV4_LAYOUT = [
+    ('match_fields', [('hdr.ipv4.dstAddr', 'dst_ip'), ('hdr.ipv4.dstAddr_prefix_len', 'prefix_len')]),
+    ('action_name', 'action_name'),
+    ('action_params', [('port', 'port'), ('dst_mac', 'dst_mac')]),
+]
+TABLES = {
+    'ethernet_table': (ETHERNET_LAYOUT, 'set_egress_port', ['dst_mac', 'port']),
+    'ipv4_table': (IPV4_LAYOUT, 'ipv4_forward', ['dst_ip', 'prefix_len', 'port', 'dst_mac']),
+}
+
+def render_entries(table, fields, missing):
+    # fields: colunas numéricas do bloco; missing: índice do campo ausente em cada linha (-1 = completo)
+    layout, action_name, optional_fields = TABLES[table]
+    n = len(missing)
+    values = {'action_name': np.full(n, b'"' + action_name.encode() + b'"'), 'port': fields['port'].astype('S3')}
+    if 'dst_ip' in fields:
+        values['dst_ip'] = _quote(format_ipv4(fields['dst_ip']))
+        values['prefix_len'] = fields['prefix_len'].astype('S2')
+    values['dst_mac'] = _quote(format_mac(fields['dst_mac']))
+
+    rendered = np.empty(n, dtype=object)
+    for variant in np.unique(missing):
+        rows = np.flatnonzero(missing == variant)
+        variant_layout = layout if variant < 0 else _without(layout, optional_fields[variant])
+        rendered[rows] = list(_concatenate(_render(variant_layout, {k: v[rows] for k, v in values.items()}), len(rows)))
+    return rendered
+
+def generate_table(path, table, n_entries, seed=0, n_ports=16, prefix_lengths=None, duplicate_rate=0.0, missing_rate=0.0, block_size=65536):
+    prefix_lengths = prefix_lengths or DEFAULT_PREFIX_LENGTHS
+    optional_fields = TABLES[table][2]
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'[' if n_entries else b'[]')
+        for start in range(0, n_entries, block_size):
+            n = min(block_size, n_entries - start)
+            # Decisões por linha vêm de hashes da posição: não dependem do block_size
+            positions = np.arange(start, start + n, dtype=np.uint64)
+            code = _TABLE_CODES[table] * 100
+            draws = (_field_hash(positions, seed, code + 1) >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+            keys = positions.copy()
+            # Duplicatas repetem a chave de uma entrada anterior
+            duplicate = (draws < duplicate_rate) & (positions > 0)
+            if duplicate.any():
+                earlier = _field_hash(positions[duplicate], seed, code + 2) % positions[duplicate]
+                keys[duplicate] = earlier
+            missing_draws = (_field_hash(positions, seed, code + 3) >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+            missing = np.where(missing_draws < missing_rate,
+                               (_field_hash(positions, seed, code + 4) % np.uint64(len(optional_fields))).astype(np.int64), -1)
+
+            if table == 'ethernet_table':
+                fields = ethernet_fields(keys, seed, n_ports)
+            else:
+                fields = ipv4_fields(keys, seed, n_ports, prefix_lengths)
+            rendered = render_entries(table, fields, missing)
+            f.write((b'\n    ' if start == 0 else b',\n    ') + b',\n    '.join(rendered.tolist()))
+        if n_entries:
+            f.write(b'\n]')
+    os.replace(tmp_path, path)
+
+def generate_dataset(output_dir, ethernet_entries, ipv4_entries, **kwargs):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for table, n_entries in [('ethernet_table', ethernet_entries), ('ipv4_table', ipv4_entries)]:
+        paths[table] = os.path.join(output_dir, f'{table}_entries.json')
+        start = time.perf_counter()
+        generate_table(paths[table], table, n_entries, **kwargs)
+        elapsed = time.perf_counter() - start
+        print(f"{table}: {n_entries} entradas geradas em {elapsed:.1f}s ({os.path.getsize(paths[table]) / 1e6:.1f} MB) -> {paths[table]}")
+    return paths
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera dumps sintéticos das tabelas ethernet_table e ipv4_table (formato de collect_data.py).')
+    parser.add_argument('--output_dir', type=str, default='collected_data', help='Diretório de saída.')
+    parser.add_argument('--ethernet_entries', type=int, default=1000, help='Número de entradas da ethernet_table.')
+    parser.add_argument('--ipv4_entries', type=int, default=1000, help='Número de entradas da ipv4_table.')
+    parser.add_argument('--seed', type=int, default=0, help='Semente (a mesma semente gera os mesmos arquivos).')
+    parser.add_argument('--n_ports', type=int, default=16, help='Número de portas de saída (até 512, bit<9>).')
+    parser.add_argument('--prefix_lengths', type=str, nargs='+', default=None, help='Distribuição de prefix_len como comprimento:peso (ex.: 24:0.6 16:0.3 32:0.1).')
+    parser.add_argument('--duplicate_rate', type=float, default=0.0, help='Fração de entradas que repetem uma entrada anterior.')
+    parser.add_argument('--missing_rate', type=float, default=0.0, help='Fração de entradas com um campo ausente.')
+    parser.add_argument('--block_size', type=int, default=65536, help='Entradas geradas e gravadas por bloco.')
+    args = parser.parse_args()
+
+    if not 1 <= args.n_ports <= 512:
+        parser.error('--n_ports deve estar entre 1 e 512.')
+    generate_dataset(args.output_dir, args.ethernet_entries, args.ipv4_entries, seed=args.seed, n_ports=args.n_ports,
+                     prefix_lengths=parse_distribution(args.prefix_lengths) if args.prefix_lengths else None,
+                     duplicate_rate=args.duplicate_rate, missing_rate=args.missing_rate, block_size=args.block_size)
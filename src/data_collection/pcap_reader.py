@@ -0,0 +1,318 @@
+import pandas as pd
+import numpy as np
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.columnar import ColumnarWriter, encode_columns, open_table_writer, table_path
+from data_collection.generate_synthetic_data import format_ipv4, format_mac
+from data_collection.preprocess_data import ETHERNET_COLUMNS, IPV4_COLUMNS, output_formats
+from data_collection.table_lookup import LookupEngine
+
+# Leitura de capturas pcap/pcapng mapeadas em memória. Os cabeçalhos são extraídos
+# como no Parser do basic_forwarding.p4: ethernet_t sempre e ipv4_t quando
+# etherType == 0x0800 (sem opções IPv4, como o header de tamanho fixo do P4).
+# O único laço em Python percorre os registros para achar seus deslocamentos
+# (o tamanho de cada um está no registro anterior); todos os campos são lidos
+# em lote a partir desses deslocamentos.
+ETHERTYPE_IPV4 = 0x0800
+LINKTYPE_ETHERNET = 1
+ETHERNET_LEN = 14
+IPV4_LEN = 20
+
+PACKET_DTYPE = np.dtype([
+    ('timestamp', 'f8'),
+    ('wire_len', 'u4'),
+    ('cap_len', 'u4'),
+    ('ethernet_valid', '?'),
+    ('ethernet_dstAddr', 'u8'),
+    ('ethernet_srcAddr', 'u8'),
+    ('ethernet_etherType', 'u2'),
+    ('ipv4_valid', '?'),
+    ('ipv4_version', 'u1'),
+    ('ipv4_ihl', 'u1'),
+    ('ipv4_diffserv', 'u1'),
+    ('ipv4_totalLen', 'u2'),
+    ('ipv4_identification', 'u2'),
+    ('ipv4_flags', 'u1'),
+    ('ipv4_fragOffset', 'u2'),
+    ('ipv4_ttl', 'u1'),
+    ('ipv4_protocol', 'u1'),
+    ('ipv4_hdrChecksum', 'u2'),
+    ('ipv4_srcAddr', 'u4'),
+    ('ipv4_dstAddr', 'u4'),
+])
+
+_PCAP_MAGIC = {
+    0xa1b2c3d4: ('<', 1e-6), 0xa1b23c4d: ('<', 1e-9),
+    0xd4c3b2a1: ('>', 1e-6), 0x4d3cb2a1: ('>', 1e-9),
+}
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_IDB = 1
+_PCAPNG_EPB = 6
+# Bytes finais do arquivo copiados (com zeros depois do fim) para ler campos de
+# registros curtos no fim da captura
+TAIL_BYTES = 64
+
+def _overlapping(raw, dtype):
+    # Vista com o inteiro `dtype` que começa em cada byte do arquivo: uma única
+    # indexação lê o campo de todos os pacotes, sem copiar os pacotes
+    dtype = np.dtype(dtype)
+    return np.ndarray(shape=(max(len(raw) - dtype.itemsize + 1, 0),), dtype=dtype, buffer=raw, strides=(1,))
+
+def _read(views, name, offsets):
+    # Inteiros que terminam depois do fim do arquivo são lidos da cópia final,
+    # completada com zeros (em vez do último inteiro inteiro do arquivo)
+    view = views[name]
+    values = view[np.minimum(offsets, len(view) - 1)].astype(np.uint64)
+    beyond = offsets >= len(view)
+    if beyond.any():
+        tail = views['tail'][name]
+        values[beyond] = tail[np.minimum(offsets[beyond] - views['tail_start'], len(tail) - 1)]
+    return values
+
+def parse_headers(views, data_offsets, cap_len, ethernet_link=None):
+    # Campos ethernet_t/ipv4_t de todos os pacotes a partir do deslocamento dos dados
+    # e dos bytes capturados; views: vistas do arquivo (_header_views)
+    w0, w1, w2, w3 = (_read(views, '>u8', data_offsets + k) for k in (0, 8, 16, 24))
+    packets = np.zeros(len(data_offsets), dtype=PACKET_DTYPE)
+    packets['cap_len'] = cap_len
+    ethernet = cap_len >= ETHERNET_LEN
+    if ethernet_link is not None:
+        ethernet &= ethernet_link
+    zero = np.uint64(0)
+    packets['ethernet_valid'] = ethernet
+    packets['ethernet_dstAddr'] = np.where(ethernet, w0 >> np.uint64(16), zero)
+    packets['ethernet_srcAddr'] = np.where(ethernet, ((w0 & np.uint64(0xFFFF)) << np.uint64(32)) | (w1 >> np.uint64(32)), zero)
+    packets['ethernet_etherType'] = np.where(ethernet, (w1 >> np.uint64(16)) & np.uint64(0xFFFF), zero)
+
+    ipv4 = ethernet & (packets['ethernet_etherType'] == ETHERTYPE_IPV4) & (cap_len >= ETHERNET_LEN + IPV4_LEN)
+    packets['ipv4_valid'] = ipv4
+    w1, w2, w3 = (np.where(ipv4, w, zero) for w in (w1, w2, w3))
+    last = np.where(ipv4, _read(views, '>u2', data_offsets + 32), zero)
+    byte = np.uint64(0xFF)
+    half = np.uint64(0xFFFF)
+    packets['ipv4_version'] = (w1 >> np.uint64(12)) & np.uint64(0xF)
+    packets['ipv4_ihl'] = (w1 >> np.uint64(8)) & np.uint64(0xF)
+    packets['ipv4_diffserv'] = w1 & byte
+    packets['ipv4_totalLen'] = w2 >> np.uint64(48)
+    packets['ipv4_identification'] = (w2 >> np.uint64(32)) & half
+    packets['ipv4_flags'] = (w2 >> np.uint64(29)) & np.uint64(0x7)
+    packets['ipv4_fragOffset'] = (w2 >> np.uint64(16)) & np.uint64(0x1FFF)
+    packets['ipv4_ttl'] = (w2 >> np.uint64(8)) & byte
+    packets['ipv4_protocol'] = w2 & byte
+    packets['ipv4_hdrChecksum'] = w3 >> np.uint64(48)
+    packets['ipv4_srcAddr'] = (w3 >> np.uint64(16)) & np.uint64(0xFFFFFFFF)
+    packets['ipv4_dstAddr'] = ((w3 & half) << np.uint64(16)) | last
+    return packets
+
+def _header_views(raw, endian):
+    dtypes = {'>u8': '>u8', '>u2': '>u2', 'u4': endian + 'u4'}
+    tail_start = max(len(raw) - TAIL_BYTES, 0)
+    tail = bytes(raw[tail_start:]) + bytes(8)
+    views = {name: _overlapping(raw, dtype) for name, dtype in dtypes.items()}
+    views['tail'] = {name: _overlapping(tail, dtype) for name, dtype in dtypes.items()}
+    views['tail_start'] = tail_start
+    return views
+
+def _pcap_blocks(raw, block_packets):
+    magic = struct.unpack_from('<I', raw, 0)[0]
+    if magic not in _PCAP_MAGIC:
+        raise ValueError("Arquivo pcap com número mágico desconhecido.")
+    endian, resolution = _PCAP_MAGIC[magic]
+    linktype = struct.unpack_from(endian + 'I', raw, 20)[0]
+    views = _header_views(raw, endian)
+    # Comprimento capturado lido diretamente do cabeçalho do registro
+    incl_len = struct.Struct(endian + '8xI').unpack_from
+    limit = len(raw) - 16
+    offset = 24
+    offsets = array('q', bytes(8 * block_packets))
+    while offset <= limit:
+        count = 0
+        for count in range(1, block_packets + 1):
+            offsets[count - 1] = offset
+            offset += 16 + incl_len(raw, offset)[0]
+            if offset > limit:
+                break
+        records = np.frombuffer(offsets, dtype=np.int64, count=count).copy()
+        cap_len = _read(views, 'u4', records + 8)
+        # Último registro truncado (captura interrompida): descartado
+        complete = records + 16 + cap_len.astype(np.int64) <= len(raw)
+        records, cap_len = records[complete], cap_len[complete]
+        link = None if linktype == LINKTYPE_ETHERNET else np.zeros(len(records), dtype=bool)
+        packets = parse_headers(views, records + 16, cap_len, link)
+        packets['timestamp'] = _read(views, 'u4', records) + _read(views, 'u4', records + 4) * resolution
+        packets['wire_len'] = _read(views, 'u4', records + 12)
+        yield packets
+
+def _interface_description(raw, offset, block_len, endian):
+    # (linktype, resolução do timestamp) de um Interface Description Block
+    linktype = struct.unpack_from(endian + 'H', raw, offset + 8)[0]
+    resolution = 1e-6
+    position, end = offset + 16, offset + block_len - 4
+    while position + 4 <= end:
+        code, length = struct.unpack_from(endian + 'HH', raw, position)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = raw[position + 4]
+            resolution = 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        position += 4 + (length + 3) // 4 * 4
+    return linktype, resolution
+
+def _pcapng_blocks(raw, block_packets):
+    # Apenas Enhanced Packet Blocks; interfaces são numeradas por seção
+    end = len(raw)
+    offset = 0
+    endian = '<'
+    interfaces = []
+    section_starts, section_bases = [], []
+    offsets = array('q')
+    block_header = struct.Struct('<II').unpack_from
+    while offset + 12 <= end:
+        block_type, block_len = block_header(raw, offset)
+        if block_type == _PCAPNG_SHB:
+            endian = '<' if struct.unpack_from('<I', raw, offset + 8)[0] == 0x1A2B3C4D else '>'
+            block_header = struct.Struct(endian + 'II').unpack_from
+            block_len = block_header(raw, offset)[1]
+            section_starts.append(offset)
+            section_bases.append(len(interfaces))
+        elif block_type == _PCAPNG_IDB:
+            interfaces.append(_interface_description(raw, offset, block_len, endian))
+        elif block_type == _PCAPNG_EPB:
+            offsets.append(offset)
+        if block_len < 12 or offset + block_len > end:
+            # Bloco truncado (captura interrompida): o restante é ignorado
+            if offsets and offsets[-1] == offset:
+                offsets.pop()
+            break
+        offset += block_len
+        if len(offsets) == block_packets:
+            yield _enhanced_packets(raw, offsets, endian, interfaces, section_starts, section_bases)
+            offsets = array('q')
+    if offsets:
+        yield _enhanced_packets(raw, offsets, endian, interfaces, section_starts, section_bases)
+
+def _enhanced_packets(raw, offsets, endian, interfaces, section_starts, section_bases):
+    views = _header_views(raw, endian)
+    records = np.frombuffer(offsets, dtype=np.int64)
+    # Número global da interface: base da seção + número dentro da seção
+    bases = np.asarray(section_bases)[np.searchsorted(section_starts, records, side='right') - 1]
+    iface = bases + _read(views, 'u4', records + 8).astype(np.int64)
+    iface = np.where(iface < len(interfaces), iface, len(interfaces))
+    linktypes = np.array([link for link, _ in interfaces] + [-1])
+    resolutions = np.array([res for _, res in interfaces] + [0.0])
+    cap_len = _read(views, 'u4', records + 20)
+    packets = parse_headers(views, records + 28, cap_len, linktypes[iface] == LINKTYPE_ETHERNET)
+    ticks = (_read(views, 'u4', records + 12) << np.uint64(32)) | _read(views, 'u4', records + 16)
+    packets['timestamp'] = ticks * resolutions[iface]
+    packets['wire_len'] = _read(views, 'u4', records + 24)
+    return packets
+
+def iter_packets(path, block_packets=1 << 20):
+    # Blocos de até block_packets pacotes como arrays estruturados PACKET_DTYPE
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        raw = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        blocks = _pcapng_blocks if struct.unpack_from('<I', raw, 0)[0] == _PCAPNG_SHB else _pcap_blocks
+        yield from blocks(raw, block_packets)
+    finally:
+        raw.close()
+
+def read_packets(path):
+    blocks = list(iter_packets(path))
+    return np.concatenate(blocks) if blocks else np.zeros(0, dtype=PACKET_DTYPE)
+
+class PacketLabeler:
+    # Tabelas no mesmo formato do pré-processamento (processed_*_data), com o rótulo
+    # (egress_port) e os demais campos da entrada escolhida pelo motor de consulta:
+    # ethernet_table para os pacotes Ethernet e ipv4_table para os IPv4. Misses
+    # ficam com _NoAction e sem porta. As colunas saem já tipadas (encode_columns).
+    def __init__(self, engine):
+        self.engine = engine
+        self.columns = {}
+        for name, table, columns in [('ethernet', engine.ethernet_table, ETHERNET_COLUMNS), ('ipv4', engine.ipv4_table, IPV4_COLUMNS)]:
+            entries = table.entries if table is not None else pd.DataFrame(columns=columns)
+            self.columns[name] = encode_columns(entries.reindex(columns=columns), columns)
+
+    def _fill(self, name, idx, key_column, keys):
+        arrays = {}
+        hit = idx >= 0
+        for col, values in self.columns[name].items():
+            if col == key_column:
+                arrays[col] = keys
+                continue
+            column = np.zeros(len(idx), dtype=values.dtype)
+            if values.dtype.kind == 'f':
+                column[:] = np.nan
+            elif col == 'action_name':
+                column[:] = b'_NoAction'
+            column[hit] = values[idx[hit]]
+            arrays[col] = column
+        return arrays
+
+    def _label(self, name, table, keys, key_column, formatter):
+        # Tráfego real repete poucos destinos: consulta e formatação apenas dos
+        # endereços distintos do bloco, expandidas depois para todos os pacotes
+        unique, inverse = np.unique(keys, return_inverse=True)
+        idx = table.lookup(unique) if table is not None else np.full(len(unique), -1)
+        arrays = self._fill(name, idx, key_column, formatter(unique))
+        return {col: values[inverse] for col, values in arrays.items()}
+
+    def tables(self, packets):
+        return {
+            'ethernet': self._label('ethernet', self.engine.ethernet_table, packets['ethernet_dstAddr'][packets['ethernet_valid']], 'dst_mac', format_mac),
+            'ipv4': self._label('ipv4', self.engine.ipv4_table, packets['ipv4_dstAddr'][packets['ipv4_valid']], 'dst_ip', format_ipv4),
+        }
+
+def convert_capture(pcap_path, output_dir, source=None, formats=('columnar',), block_packets=1 << 20):
+    # Grava os cabeçalhos (packet_headers.cols, colunas tipadas) e, se houver uma
+    # fonte de entradas para o oráculo, as tabelas rotuladas packet_*_data
+    os.makedirs(output_dir, exist_ok=True)
+    labeler = PacketLabeler(LookupEngine.from_source(source)) if source and os.path.exists(source) else None
+    headers = ColumnarWriter(table_path(output_dir, 'packet_headers'))
+    writers = {}
+    if labeler is not None:
+        writers = {
+            'ethernet': [open_table_writer(table_path(output_dir, 'packet_ethernet_data', fmt), ETHERNET_COLUMNS) for fmt in formats],
+            'ipv4': [open_table_writer(table_path(output_dir, 'packet_ipv4_data', fmt), IPV4_COLUMNS) for fmt in formats],
+        }
+    start = time.perf_counter()
+    total = 0
+    try:
+        for packets in iter_packets(pcap_path, block_packets):
+            headers.append_arrays(packets)
+            if labeler is not None:
+                for name, arrays in labeler.tables(packets).items():
+                    for writer in writers[name]:
+                        writer.append_arrays(arrays)
+            total += len(packets)
+    finally:
+        headers.close()
+        for table_writers in writers.values():
+            for writer in table_writers:
+                writer.close()
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(pcap_path) / 2 ** 20
+    print(f"{total} pacotes lidos de {pcap_path} em {elapsed:.2f}s ({total / max(elapsed, 1e-9) / 1e6:.2f} M pacotes/s, {size_mb / max(elapsed, 1e-9):.0f} MB/s).")
+    if labeler is None:
+        print("Sem entradas das tabelas para o oráculo: apenas os cabeçalhos foram salvos.")
+    return total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extrai os cabeçalhos Ethernet/IPv4 de capturas pcap/pcapng e gera tabelas rotuladas para o pipeline de features.')
+    parser.add_argument('--pcap', type=str, required=True, help='Arquivo .pcap ou .pcapng.')
+    parser.add_argument('--source', type=str, default='collected_data', help='Entradas das tabelas para rotular os pacotes (JSON coletados ou commands.txt).')
+    parser.add_argument('--output_dir', type=str, default='processed_data', help='Diretório de saída.')
+    parser.add_argument('--format', type=str, default='columnar', choices=['columnar', 'csv', 'both'], help='Formato das tabelas rotuladas.')
+    parser.add_argument('--block_packets', type=int, default=1 << 20, help='Pacotes processados por bloco.')
+    args = parser.parse_args()
+
+    convert_capture(args.pcap, args.output_dir, args.source, output_formats(args.format), args.block_packets)
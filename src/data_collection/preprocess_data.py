@@ -1,74 +1,205 @@
 import pandas as pd
+import argparse
 import json
 import os
+import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.columnar import open_table_writer, save_table, table_path
+from instrumentation import add_rows, phase, stage
+
+ETHERNET_COLUMNS = ['dst_mac', 'action_name', 'egress_port']
+IPV4_COLUMNS = ['dst_ip', 'prefix_len', 'action_name', 'egress_port', 'dst_mac']
+
+def ethernet_row(entry):
+    # Exemplo de como extrair e processar dados de uma entrada
+    # Adapte isso com base na estrutura real das suas entradas de tabela
+    match_fields = entry.get('match_fields', {})
+    action_name = entry.get('action_name', 'N/A')
+    action_params = entry.get('action_params', {})
+
+    dst_mac = match_fields.get('hdr.ethernet.dstAddr', 'N/A')
+    egress_port = action_params.get('port', 'N/A')
+
+    return {
+        'dst_mac': dst_mac,
+        'action_name': action_name,
+        'egress_port': egress_port
+    }
+
+def ipv4_row(entry):
+    match_fields = entry.get('match_fields', {})
+    action_name = entry.get('action_name', 'N/A')
+    action_params = entry.get('action_params', {})
+
+    dst_ip = match_fields.get('hdr.ipv4.dstAddr', 'N/A')
+    prefix_len = match_fields.get('hdr.ipv4.dstAddr_prefix_len', 'N/A')
+    egress_port = action_params.get('port', 'N/A')
+    dst_mac = action_params.get('dst_mac', 'N/A')
+
+    return {
+        'dst_ip': dst_ip,
+        'prefix_len': prefix_len,
+        'action_name': action_name,
+        'egress_port': egress_port,
+        'dst_mac': dst_mac
+    }
+
+@stage('preprocess', target='json_file_path')
 def preprocess_ethernet_entries(json_file_path):
-    with open(json_file_path, 'r') as f:
+    with phase('read'), open(json_file_path, 'r') as f:
         data = json.load(f)
 
-    processed_data = []
-    for entry in data:
-        # Exemplo de como extrair e processar dados de uma entrada
-        # Adapte isso com base na estrutura real das suas entradas de tabela
-        match_fields = entry.get('match_fields', {})
-        action_name = entry.get('action_name', 'N/A')
-        action_params = entry.get('action_params', {})
+    with phase('encode'):
+        processed_data = [ethernet_row(entry) for entry in data]
+        df = pd.DataFrame(processed_data)
+    add_rows(len(df))
+    return df
 
-        dst_mac = match_fields.get('hdr.ethernet.dstAddr', 'N/A')
-        egress_port = action_params.get('port', 'N/A')
+@stage('preprocess', target='json_file_path')
+def preprocess_ipv4_entries(json_file_path):
+    with phase('read'), open(json_file_path, 'r') as f:
+        data = json.load(f)
 
-        processed_data.append({
-            'dst_mac': dst_mac,
-            'action_name': action_name,
-            'egress_port': egress_port
-        })
-    return pd.DataFrame(processed_data)
+    with phase('encode'):
+        processed_data = [ipv4_row(entry) for entry in data]
+        df = pd.DataFrame(processed_data)
+    add_rows(len(df))
+    return df
 
-def preprocess_ipv4_entries(json_file_path):
+def iter_table_entries(json_file_path, buffer_size=1 << 20):
+    # Lê um array JSON (formato gerado por collect_data.py) uma entrada por vez,
+    # mantendo em memória apenas o buffer de leitura e a entrada corrente.
+    decoder = json.JSONDecoder()
     with open(json_file_path, 'r') as f:
-        data = json.load(f)
+        buf = ''
+        pos = 0
+        eof = False
+        started = False
+
+        while True:
+            # Pular espaços e separadores entre entradas
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                chunk = f.read(buffer_size)
+                buf, pos = buf[pos:] + chunk, 0
+                eof = not chunk
+
+            if pos >= len(buf):
+                raise ValueError(f"Fim inesperado do arquivo {json_file_path}.")
+
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError(f"O arquivo {json_file_path} não contém um array JSON de entradas.")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            if buf[pos] == ',':
+                pos += 1
+                continue
+
+            try:
+                entry, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # Só aceitar o valor se ele não puder continuar no próximo bloco lido
+            if end is None or (end == len(buf) and not eof):
+                chunk = f.read(buffer_size)
+                buf, pos = buf[pos:] + chunk, 0
+                eof = not chunk
+                continue
 
-    processed_data = []
-    for entry in data:
-        match_fields = entry.get('match_fields', {})
-        action_name = entry.get('action_name', 'N/A')
-        action_params = entry.get('action_params', {})
-
-        dst_ip = match_fields.get('hdr.ipv4.dstAddr', 'N/A')
-        prefix_len = match_fields.get('hdr.ipv4.dstAddr_prefix_len', 'N/A')
-        egress_port = action_params.get('port', 'N/A')
-        dst_mac = action_params.get('dst_mac', 'N/A')
-
-        processed_data.append({
-            'dst_ip': dst_ip,
-            'prefix_len': prefix_len,
-            'action_name': action_name,
-            'egress_port': egress_port,
-            'dst_mac': dst_mac
-        })
-    return pd.DataFrame(processed_data)
+            yield entry
+            pos = end
+            if pos > buffer_size:
+                buf, pos = buf[pos:], 0
+
+@stage('preprocess', target='json_file_path')
+def preprocess_entries_streaming(json_file_path, output_paths, row_builder, columns, chunk_size=100000):
+    # Versão em streaming do pré-processamento: as entradas são lidas uma a uma
+    # e escritas em blocos de chunk_size linhas em cada saída (CSV ou colunar),
+    # de modo que o pico de memória depende do tamanho do bloco e não do
+    # tamanho da tabela.
+    # Observação: como no modo em memória, os tipos de cada bloco são inferidos
+    # pelo pandas; se uma coluna numérica contiver valores nulos (null no JSON)
+    # apenas em alguns blocos, a formatação desses valores pode diferir do CSV
+    # gerado de uma só vez.
+    if isinstance(output_paths, str):
+        output_paths = [output_paths]
+    writers = [open_table_writer(path, columns) for path in output_paths]
+    total_rows = 0
+    rows = []
+    try:
+        # A leitura do JSON é o restante do tempo do estágio (intercalada com row_builder)
+        for entry in iter_table_entries(json_file_path):
+            rows.append(row_builder(entry))
+            if len(rows) >= chunk_size:
+                with phase('write'):
+                    chunk = pd.DataFrame(rows, columns=columns)
+                    for writer in writers:
+                        writer.append(chunk)
+                total_rows += len(rows)
+                rows = []
+        if rows:
+            with phase('write'):
+                chunk = pd.DataFrame(rows, columns=columns)
+                for writer in writers:
+                    writer.append(chunk)
+            total_rows += len(rows)
+    finally:
+        with phase('write'):
+            for writer in writers:
+                writer.close()
+    add_rows(total_rows)
+    return total_rows
+
+def output_formats(fmt):
+    return ['columnar', 'csv'] if fmt == 'both' else [fmt]
 
 if __name__ == '__main__':
-    input_dir = 'collected_data'
-    output_dir = 'processed_data'
+    parser = argparse.ArgumentParser(description='Pré-processa as entradas coletadas das tabelas do BMv2.')
+    parser.add_argument('--input_dir', type=str, default='collected_data', help='Diretório com os arquivos JSON coletados.')
+    parser.add_argument('--output_dir', type=str, default='processed_data', help='Diretório para salvar os dados pré-processados.')
+    parser.add_argument('--streaming', action='store_true', help='Processa as entradas em streaming, com memória limitada pelo tamanho do bloco.')
+    parser.add_argument('--chunk_size', type=int, default=100000, help='Número de linhas por bloco no modo streaming.')
+    parser.add_argument('--format', type=str, default='columnar', choices=['columnar', 'csv', 'both'], help='Formato de saída (colunar tipado, CSV ou ambos).')
+    args = parser.parse_args()
+
+    input_dir = args.input_dir
+    output_dir = args.output_dir
     os.makedirs(output_dir, exist_ok=True)
 
     # Pré-processar e salvar dados da tabela Ethernet
     ethernet_json_path = os.path.join(input_dir, 'ethernet_table_entries.json')
+    ethernet_output_paths = [table_path(output_dir, 'processed_ethernet_data', fmt) for fmt in output_formats(args.format)]
     if os.path.exists(ethernet_json_path):
-        df_ethernet = preprocess_ethernet_entries(ethernet_json_path)
-        df_ethernet.to_csv(os.path.join(output_dir, 'processed_ethernet_data.csv'), index=False)
-        print(f"Dados da ethernet_table pré-processados e salvos em {os.path.join(output_dir, 'processed_ethernet_data.csv')}")
+        if args.streaming:
+            preprocess_entries_streaming(ethernet_json_path, ethernet_output_paths, ethernet_row, ETHERNET_COLUMNS, args.chunk_size)
+        else:
+            df_ethernet = preprocess_ethernet_entries(ethernet_json_path)
+            for path in ethernet_output_paths:
+                save_table(df_ethernet, path)
+        print(f"Dados da ethernet_table pré-processados e salvos em {', '.join(ethernet_output_paths)}")
     else:
         print(f"Arquivo {ethernet_json_path} não encontrado. Pulando pré-processamento da tabela Ethernet.")
 
     # Pré-processar e salvar dados da tabela IPv4
     ipv4_json_path = os.path.join(input_dir, 'ipv4_table_entries.json')
+    ipv4_output_paths = [table_path(output_dir, 'processed_ipv4_data', fmt) for fmt in output_formats(args.format)]
     if os.path.exists(ipv4_json_path):
-        df_ipv4 = preprocess_ipv4_entries(ipv4_json_path)
-        df_ipv4.to_csv(os.path.join(output_dir, 'processed_ipv4_data.csv'), index=False)
-        print(f"Dados da ipv4_table pré-processados e salvos em {os.path.join(output_dir, 'processed_ipv4_data.csv')}")
+        if args.streaming:
+            preprocess_entries_streaming(ipv4_json_path, ipv4_output_paths, ipv4_row, IPV4_COLUMNS, args.chunk_size)
+        else:
+            df_ipv4 = preprocess_ipv4_entries(ipv4_json_path)
+            for path in ipv4_output_paths:
+                save_table(df_ipv4, path)
+        print(f"Dados da ipv4_table pré-processados e salvos em {', '.join(ipv4_output_paths)}")
     else:
         print(f"Arquivo {ipv4_json_path} não encontrado. Pulando pré-processamento da tabela IPv4.")
-
-
@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.clean_data import row_hashes
+from data_collection.columnar import (ColumnarWriter, columns_to_frame, encode_columns, is_columnar_path, load_table,
+                                      read_columns)
+from data_collection.preprocess_data import ETHERNET_COLUMNS, IPV4_COLUMNS, ethernet_row, ipv4_row, preprocess_entries_streaming
+from instrumentation import add_rows, phase, stage
+
+# Snapshots versionados das tabelas coletadas. Cada versão guarda as entradas já
+# pré-processadas (formato colunar), ordenadas pelo hash da chave de
+# correspondência, e um índice (hash da chave, hash da linha inteira). O diff
+# entre duas versões é uma busca ordenada entre os dois índices: entradas
+# incluídas, removidas e alteradas (mesma chave, conteúdo diferente), sem
+# comparar as linhas em si. Uma coleta sem alterações não cria versão nova.
+DEFAULT_SNAPSHOT_DIR = 'snapshots'
+MANIFEST_FILE = 'manifest.json'
+TABLES = {
+    'ethernet_table': {'columns': ETHERNET_COLUMNS, 'keys': ['dst_mac'], 'row': ethernet_row},
+    'ipv4_table': {'columns': IPV4_COLUMNS, 'keys': ['dst_ip', 'prefix_len'], 'row': ipv4_row},
+}
+WRITE_BLOCK = 1000000
+
+def version_name(version):
+    return f'v{version:06d}'
+
+def table_dir(snapshot_dir, table):
+    return os.path.join(snapshot_dir, table)
+
+def snapshot_path(snapshot_dir, table, version):
+    return os.path.join(table_dir(snapshot_dir, table), version_name(version) + '.cols')
+
+def _index_path(snapshot_dir, table, version):
+    return os.path.join(table_dir(snapshot_dir, table), version_name(version) + '.index.npz')
+
+def _delta_path(snapshot_dir, table, version):
+    return os.path.join(table_dir(snapshot_dir, table), version_name(version) + '.delta.npz')
+
+def load_manifest(snapshot_dir, table):
+    path = os.path.join(table_dir(snapshot_dir, table), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'table': table, 'versions': []}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _save_manifest(snapshot_dir, table, manifest):
+    path = os.path.join(table_dir(snapshot_dir, table), MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+def latest_version(snapshot_dir, table):
+    versions = load_manifest(snapshot_dir, table)['versions']
+    return versions[-1]['version'] if versions else None
+
+def version_info(snapshot_dir, table, version):
+    for entry in load_manifest(snapshot_dir, table)['versions']:
+        if entry['version'] == version:
+            return entry
+    raise KeyError(f"Versão {version_name(version)} da {table} não encontrada em {snapshot_dir}.")
+
+def key_hashes(table, arrays):
+    return row_hashes({col: arrays[col] for col in TABLES[table]['keys']})
+
+def load_index(snapshot_dir, table, version):
+    # (hashes das chaves em ordem crescente, hashes das linhas)
+    with np.load(_index_path(snapshot_dir, table, version)) as index:
+        return index['keys'], index['rows']
+
+def diff_index(old_keys, old_rows, new_keys, new_rows):
+    # Diff entre dois índices ordenados pela chave. Posições em cada versão:
+    # added (nova), removed (antiga) e modified_new/modified_old (mesma chave)
+    if len(old_keys):
+        pos = np.minimum(np.searchsorted(old_keys, new_keys), len(old_keys) - 1)
+        present = old_keys[pos] == new_keys
+    else:
+        pos = np.zeros(len(new_keys), dtype=np.int64)
+        present = np.zeros(len(new_keys), dtype=bool)
+    modified = np.flatnonzero(present & (old_rows[pos] != new_rows)) if len(old_keys) else np.zeros(0, dtype=np.int64)
+    kept = np.zeros(len(old_keys), dtype=bool)
+    kept[pos[present]] = True
+    return {
+        'added': np.flatnonzero(~present),
+        'removed': np.flatnonzero(~kept),
+        'modified_new': modified,
+        'modified_old': pos[modified],
+    }
+
+def diff_counts(diff):
+    return {'added': int(len(diff['added'])), 'removed': int(len(diff['removed'])), 'modified': int(len(diff['modified_new']))}
+
+def diff_snapshots(snapshot_dir, table, old_version, new_version):
+    # Versões consecutivas usam o diff gravado na criação
+    delta_path = _delta_path(snapshot_dir, table, new_version)
+    if version_info(snapshot_dir, table, new_version).get('previous') == old_version and os.path.exists(delta_path):
+        with np.load(delta_path) as delta:
+            return {name: delta[name] for name in delta.files}
+    return diff_index(*load_index(snapshot_dir, table, old_version), *load_index(snapshot_dir, table, new_version))
+
+def snapshot_rows(snapshot_dir, table, version, positions, columns=None):
+    # Apenas as linhas pedidas (por exemplo, as alteradas) são lidas da versão
+    arrays = read_columns(snapshot_path(snapshot_dir, table, version), columns)
+    positions = np.asarray(positions, dtype=np.int64)
+    return columns_to_frame({name: np.asarray(values[positions]) for name, values in arrays.items()})
+
+def _read_source(table, source, tmp_path, chunk_size):
+    # JSON coletado (pré-processado em streaming) ou tabela já pré-processada
+    if source.endswith('.json'):
+        preprocess_entries_streaming(source, [tmp_path], TABLES[table]['row'], TABLES[table]['columns'], chunk_size)
+        return read_columns(tmp_path)
+    if is_columnar_path(source):
+        return read_columns(source)
+    return encode_columns(load_table(source))
+
+@stage('snapshot', target='table')
+def create_snapshot(table, source, snapshot_dir=DEFAULT_SNAPSHOT_DIR, keep=10, chunk_size=100000):
+    # Retorna a entrada do manifesto da nova versão, ou None se nada mudou
+    directory = table_dir(snapshot_dir, table)
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(snapshot_dir, table)
+    previous = manifest['versions'][-1]['version'] if manifest['versions'] else None
+    version = previous + 1 if previous is not None else 1
+    tmp_path = os.path.join(directory, f'.tmp{os.getpid()}.cols')
+    final_path = snapshot_path(snapshot_dir, table, version)
+    start = time.perf_counter()
+    try:
+        with phase('read'):
+            arrays = _read_source(table, source, tmp_path, chunk_size)
+        with phase('hash'):
+            keys = key_hashes(table, arrays)
+            rows = row_hashes(arrays)
+            # Ordem pela chave; vale a primeira entrada de cada chave repetida
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            first = np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]) if len(order) else np.zeros(0, dtype=bool)
+            order, keys, rows = order[first], sorted_keys[first], rows[order[first]]
+        add_rows(len(first))
+
+        with phase('diff'):
+            if previous is not None:
+                diff = diff_index(*load_index(snapshot_dir, table, previous), keys, rows)
+            else:
+                diff = diff_index(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64), keys, rows)
+        counts = diff_counts(diff)
+        if previous is not None and not any(counts.values()):
+            print(f"{table}: sem alterações desde {version_name(previous)}.")
+            return None
+
+        shutil.rmtree(final_path, ignore_errors=True)
+        with phase('write'):
+            with ColumnarWriter(final_path, list(arrays)) as writer:
+                for block in range(0, len(order), WRITE_BLOCK):
+                    rows_block = order[block:block + WRITE_BLOCK]
+                    writer.append_arrays({name: np.asarray(values[rows_block]) for name, values in arrays.items()})
+            np.savez(_index_path(snapshot_dir, table, version), keys=keys, rows=rows)
+            np.savez(_delta_path(snapshot_dir, table, version), **diff)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    entry = dict({
+        'version': version,
+        'path': os.path.basename(final_path),
+        'created': time.time(),
+        'source': source,
+        'rows': int(len(keys)),
+        'duplicate_keys': int(len(first) - len(keys)),
+        'previous': previous,
+        'seconds': time.perf_counter() - start,
+    }, **counts)
+    manifest['versions'].append(entry)
+    removed = manifest['versions'][:-keep] if keep else []
+    manifest['versions'] = manifest['versions'][len(removed):]
+    _save_manifest(snapshot_dir, table, manifest)
+    for old in removed:
+        shutil.rmtree(snapshot_path(snapshot_dir, table, old['version']), ignore_errors=True)
+        for path in (_index_path(snapshot_dir, table, old['version']), _delta_path(snapshot_dir, table, old['version'])):
+            if os.path.exists(path):
+                os.remove(path)
+    print(f"{table}: {version_name(version)} com {entry['rows']} entradas "
+          f"(+{counts['added']} -{counts['removed']} ~{counts['modified']}) em {entry['seconds']:.2f}s")
+    return entry
+
+def snapshot_directory(source_dir, snapshot_dir=DEFAULT_SNAPSHOT_DIR, keep=10, tables=TABLES):
+    # Um snapshot por tabela a partir dos JSON de collect_data.py
+    entries = {}
+    for table in tables:
+        source = os.path.join(source_dir, f'{table}_entries.json')
+        if os.path.exists(source):
+            entries[table] = create_snapshot(table, source, snapshot_dir, keep)
+        else:
+            print(f"Arquivo {source} não encontrado. Pulando snapshot da {table}.")
+    return entries
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cria snapshots versionados das tabelas coletadas e calcula o diff entre versões.')
+    parser.add_argument('--source', type=str, default='collected_data', help='Diretório com os JSON coletados.')
+    parser.add_argument('--snapshot_dir', type=str, default=DEFAULT_SNAPSHOT_DIR, help='Diretório dos snapshots.')
+    parser.add_argument('--tables', type=str, nargs='+', default=list(TABLES), choices=list(TABLES), help='Tabelas.')
+    parser.add_argument('--keep', type=int, default=10, help='Número de versões mantidas por tabela (0 mantém todas).')
+    parser.add_argument('--list', action='store_true', help='Lista as versões existentes.')
+    parser.add_argument('--diff', type=int, nargs=2, default=None, metavar=('ANTIGA', 'NOVA'), help='Mostra o diff entre duas versões.')
+    args = parser.parse_args()
+
+    if args.list:
+        for table in args.tables:
+            for entry in load_manifest(args.snapshot_dir, table)['versions']:
+                print(f"{table} {version_name(entry['version'])} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['created']))} "
+                      f"{entry['rows']:10d} entradas  +{entry['added']} -{entry['removed']} ~{entry['modified']}")
+    elif args.diff:
+        for table in args.tables:
+            diff = diff_snapshots(args.snapshot_dir, table, *args.diff)
+            counts = diff_counts(diff)
+            print(f"{table} {version_name(args.diff[0])} -> {version_name(args.diff[1])}: "
+                  f"{counts['added']} incluídas, {counts['removed']} removidas, {counts['modified']} alteradas")
+            for name, positions, version in (('+', diff['added'], args.diff[1]), ('~', diff['modified_new'], args.diff[1]),
+                                             ('-', diff['removed'], args.diff[0])):
+                if len(positions):
+                    rows = snapshot_rows(args.snapshot_dir, table, version, positions[:5])
+                    print(pd.concat([pd.Series(name, index=rows.index, name='diff'), rows], axis=1).to_string(index=False, header=False))
+    else:
+        snapshot_directory(args.source, args.snapshot_dir, args.keep, args.tables)
@@ -0,0 +1,394 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.address_encoding import mask_ipv4, parse_ipv4, parse_mac, prefix_lengths
+from data_collection.generate_synthetic_data import format_ipv4, format_mac
+from data_collection.table_lookup import LpmTable, load_entries
+
+# Compilador de regras para as tabelas do basic_forwarding.p4: recebe as
+# entradas coletadas (ou as portas previstas pelos modelos) e gera o menor
+# conjunto equivalente de entradas. Na ipv4_table (lpm) os prefixos são
+# agregados com o algoritmo ORTC (Draves et al., "Constructing Optimal IP
+# Routing Tables"), executado nível a nível da árvore binária de prefixos com
+# operações vetorizadas. O resultado é verificado contra o LpmTable de
+# table_lookup.py em todos os limites de intervalo das duas tabelas, o que
+# cobre todos os endereços.
+NO_ACTION = '_NoAction'
+IPV4_COLUMNS = ['dst_ip', 'prefix_len', 'action_name', 'egress_port', 'dst_mac']
+ETHERNET_COLUMNS = ['dst_mac', 'action_name', 'egress_port']
+
+def _ports(entries):
+    return pd.to_numeric(entries['egress_port'], errors='coerce').to_numpy(dtype=np.float64)
+
+def ipv4_routes(entries):
+    # (redes uint32, comprimentos, portas, MACs) das entradas válidas, com a
+    # mesma interpretação do LpmTable; porta -1 representa _NoAction
+    entries = entries.reset_index(drop=True)
+    ips, valid = parse_ipv4(entries['dst_ip'])
+    lengths = prefix_lengths(entries['prefix_len']) if 'prefix_len' in entries.columns else np.full(len(entries), 32)
+    ports = _ports(entries)
+    macs, mac_valid = parse_mac(entries['dst_mac']) if 'dst_mac' in entries.columns else (np.zeros(len(entries), dtype=np.uint64), np.zeros(len(entries), dtype=bool))
+    no_action = np.isnan(ports)
+    incomplete = valid & ~no_action & ~mac_valid
+    if incomplete.any():
+        print(f"Ignoradas {int(incomplete.sum())} entradas ipv4_forward sem dst_mac válido.")
+    valid &= ~incomplete
+    ports = np.where(no_action, -1, ports).astype(np.int64)
+    macs = np.where(no_action, 0, macs)
+    return mask_ipv4(ips[valid], lengths[valid]), lengths[valid], ports[valid], macs[valid]
+
+def _first_entries(networks, lengths):
+    # Primeira ocorrência de cada prefixo (como no HashIndex do LpmTable)
+    keys = (lengths.astype(np.uint64) << np.uint64(32)) | networks.astype(np.uint64)
+    _, first = np.unique(keys, return_index=True)
+    return np.sort(first)
+
+def installable_ipv4(entries):
+    # Rotas que de fato ficam na tabela: válidas e uma por prefixo
+    networks, lengths, ports, macs = ipv4_routes(entries)
+    first = _first_entries(networks, lengths)
+    return networks[first], lengths[first], ports[first], macs[first]
+
+def _shift(d):
+    return np.uint64(32 - d)
+
+def ortc(networks, lengths, labels):
+    # Agregação ótima de prefixos. labels: inteiros >= 1 (0 é o _NoAction padrão
+    # da tabela). Retorna (redes, comprimentos, rótulos) do conjunto mínimo.
+    networks = networks.astype(np.uint64)
+    n_labels = np.int64(labels.max() + 1) if len(labels) else np.int64(1)
+    order = np.argsort(networks, kind='stable')
+    networks, lengths, labels = networks[order], lengths[order], labels[order]
+    by_length = {}
+    for d in np.unique(lengths):
+        rows = lengths == d
+        by_length[int(d)] = (networks[rows] >> _shift(d), labels[rows])
+
+    # Passo 1 (de cima para baixo): nós da árvore normalizada, em que todo nó
+    # interno tem os dois filhos, e o rótulo herdado do prefixo mais longo
+    nodes = [np.zeros(1, dtype=np.uint64)]
+    inherited = [np.zeros(1, dtype=np.int64)]
+    internal = []
+    if 0 in by_length:
+        inherited[0][:] = by_length[0][1][0]
+    for d in range(32):
+        deeper = networks[lengths > d] >> _shift(d)
+        if len(deeper) == 0:
+            internal.append(np.zeros(len(nodes[d]), dtype=bool))
+            break
+        parents = deeper[np.concatenate([[True], deeper[1:] != deeper[:-1]])]
+        internal.append(np.isin(nodes[d], parents, assume_unique=True))
+        nodes.append(np.stack([parents << np.uint64(1), (parents << np.uint64(1)) | np.uint64(1)], axis=1).ravel())
+        labels_next = np.repeat(inherited[d][internal[d]], 2)
+        if d + 1 in by_length:
+            values, own = by_length[d + 1]
+            labels_next[np.searchsorted(nodes[d + 1], values)] = own
+        inherited.append(labels_next)
+    depth = len(nodes)
+    if len(internal) < depth:
+        internal.append(np.zeros(len(nodes[-1]), dtype=bool))
+
+    # Passo 2 (de baixo para cima): conjunto de cada nó; folhas têm o próprio
+    # rótulo e nós internos a interseção dos filhos (ou a união, se vazia).
+    # Conjuntos em formato CSR por nível: (início de cada nó, valores ordenados).
+    sets = [None] * depth
+    for d in range(depth - 1, -1, -1):
+        is_internal = internal[d]
+        sizes = np.ones(len(nodes[d]), dtype=np.int64)
+        if is_internal.any():
+            child_ptr, child_values = sets[d + 1]
+            # Valores dos dois filhos de cada nó interno, ordenados por (nó, rótulo)
+            group = np.repeat(np.arange(len(child_ptr) - 1) // 2, np.diff(child_ptr))
+            key = np.sort(group * n_labels + child_values)
+            first = np.concatenate([[True], key[1:] != key[:-1]])
+            count = np.diff(np.append(np.flatnonzero(first), len(key)))
+            key = key[first]
+            group, child_values = key // n_labels, key % n_labels
+            shared = np.zeros(len(child_ptr) // 2, dtype=bool)
+            shared[group[count == 2]] = True
+            keep = (count == 2) | ~shared[group]
+            group, child_values = group[keep], child_values[keep]
+            sizes[is_internal] = np.bincount(group, minlength=int(is_internal.sum()))
+        ptr = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=ptr[1:])
+        values = np.empty(ptr[-1], dtype=np.int64)
+        values[ptr[:-1][~is_internal]] = inherited[d][~is_internal]
+        if is_internal.any():
+            # Posição de cada valor: início do nó + ordem dentro do grupo
+            starts = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+            rank = np.arange(len(group)) - np.repeat(starts, np.diff(np.append(starts, len(group))))
+            values[ptr[:-1][is_internal][group] + rank] = child_values
+        sets[d] = (ptr, values)
+
+    # Passo 3 (de cima para baixo): um nó só recebe entrada se o rótulo herdado
+    # da entrada mais próxima acima dele (ou o _NoAction padrão) não estiver no
+    # seu conjunto
+    out_networks, out_lengths, out_labels = [], [], []
+    parent_choice = np.zeros(1, dtype=np.int64)
+    for d in range(depth):
+        ptr, values = sets[d]
+        member = np.logical_or.reduceat(values == np.repeat(parent_choice, np.diff(ptr)), ptr[:-1])
+        choice = np.where(member, parent_choice, values[ptr[:-1]])
+        new = ~member
+        out_networks.append(nodes[d][new] << _shift(d))
+        out_lengths.append(np.full(int(new.sum()), d, dtype=np.int64))
+        out_labels.append(choice[new])
+        parent_choice = np.repeat(choice[internal[d]], 2)
+    return (np.concatenate(out_networks).astype(np.uint32), np.concatenate(out_lengths), np.concatenate(out_labels))
+
+def ipv4_frame(networks, lengths, ports, macs):
+    no_action = ports < 0
+    return pd.DataFrame({
+        'dst_ip': format_ipv4(networks).astype('U15'),
+        'prefix_len': lengths,
+        'action_name': np.where(no_action, NO_ACTION, 'ipv4_forward'),
+        'egress_port': pd.array(np.where(no_action, pd.NA, ports), dtype='Int64'),
+        'dst_mac': np.where(no_action, None, format_mac(macs).astype('U17')),
+    }, columns=IPV4_COLUMNS)
+
+def compile_ipv4(routes):
+    # routes: (redes, comprimentos, portas, MACs) de installable_ipv4
+    networks, lengths, ports, macs = routes
+    # Rótulo = ação completa (porta e MAC de ipv4_forward); 0 é _NoAction
+    actions, labels = np.unique((np.maximum(ports, 0) << 48) | macs.astype(np.int64), return_inverse=True)
+    labels = labels.ravel() + 1
+    labels[ports < 0] = 0
+    out_networks, out_lengths, out_labels = ortc(networks, lengths, labels)
+    if len(out_networks) >= len(networks):
+        # Sem ganho: mantém as entradas originais, para não reescrever a tabela instalada
+        return ipv4_frame(networks, lengths, ports, macs)
+    chosen = actions[np.maximum(out_labels - 1, 0)]
+    out_ports = np.where(out_labels == 0, -1, chosen >> 48)
+    return ipv4_frame(out_networks, out_lengths, out_ports, (chosen & ((1 << 48) - 1)).astype(np.uint64))
+
+def installable_ethernet(entries):
+    # Uma entrada por endereço MAC válido (vale a primeira)
+    entries = entries.reset_index(drop=True)
+    macs, valid = parse_mac(entries['dst_mac'])
+    ports = _ports(entries)
+    _, first = np.unique(macs[valid], return_index=True)
+    rows = np.flatnonzero(valid)[np.sort(first)]
+    return pd.DataFrame({
+        'dst_mac': format_mac(macs[rows]).astype('U17'),
+        'action_name': np.where(np.isnan(ports[rows]), NO_ACTION, 'set_egress_port'),
+        'egress_port': pd.array(np.where(np.isnan(ports[rows]), pd.NA, ports[rows]), dtype='Int64'),
+    }, columns=ETHERNET_COLUMNS)
+
+def compile_ethernet(installed):
+    # Correspondência exata: não há agregação, mas entradas _NoAction (iguais à
+    # ação padrão da tabela) são removidas
+    return installed[installed['action_name'] != NO_ACTION].reset_index(drop=True)
+
+def _lpm_actions(table, ips):
+    # (porta, MAC) da entrada escolhida pelo LpmTable para cada endereço; (-1, 0) em miss ou _NoAction
+    idx = table.lookup(ips)
+    hit = idx >= 0
+    ports = np.where(hit, table.ports[np.maximum(idx, 0)], -1)
+    macs = parse_mac(table.entries['dst_mac'])[0] if len(table) else np.zeros(0, dtype=np.uint64)
+    macs = np.where(hit & (ports >= 0), macs[np.maximum(idx, 0)] if len(table) else 0, 0)
+    return ports, macs
+
+def _range_starts(networks, lengths):
+    networks = networks.astype(np.uint64)
+    ends = networks + (np.uint64(1) << (32 - lengths).astype(np.uint64))
+    return np.concatenate([[0], networks, ends[ends < (1 << 32)]])
+
+def verify_ipv4(reference, compiled):
+    # Entre dois limites consecutivos de prefixos (das duas tabelas) o resultado
+    # das duas consultas é constante: comparar os limites compara todos os endereços
+    starts = []
+    for frame in (reference, compiled):
+        ips, _ = parse_ipv4(frame['dst_ip'])
+        starts.append(_range_starts(ips, frame['prefix_len'].to_numpy(dtype=np.int64)))
+    addresses = np.unique(np.concatenate(starts)).astype(np.uint32)
+    expected = _lpm_actions(LpmTable(reference), addresses)
+    actual = _lpm_actions(LpmTable(compiled), addresses) if len(compiled) else (np.full(len(addresses), -1), np.zeros(len(addresses), dtype=np.uint64))
+    mismatches = (expected[0] != actual[0]) | (expected[1] != actual[1])
+    return {'addresses_checked': int(len(addresses)), 'mismatches': int(mismatches.sum())}
+
+def verify_ethernet(reference, compiled):
+    from data_collection.table_lookup import ExactMatchTable
+    macs = parse_mac(reference['dst_mac'])[0]
+    expected = ExactMatchTable(reference).lookup_ports(macs)
+    actual = ExactMatchTable(compiled).lookup_ports(macs) if len(compiled) else np.full(len(macs), -1)
+    return {'addresses_checked': int(len(macs)), 'mismatches': int((expected != actual).sum())}
+
+def installable(table, entries):
+    # Entradas normalizadas como ficam instaladas no switch
+    if table == 'ipv4_table':
+        return ipv4_frame(*installable_ipv4(entries))
+    return installable_ethernet(entries)
+
+def _rule_columns(table, frame):
+    # Chave (uint64), código da ação (-1 para _NoAction), nome da ação e
+    # strings de chave e parâmetros no formato do simple_switch_CLI/ThriftAPI
+    ports = pd.to_numeric(frame['egress_port'], errors='coerce').to_numpy(dtype=np.float64)
+    no_action = np.isnan(ports) | (frame['action_name'] == NO_ACTION).to_numpy()
+    ports = np.where(no_action, -1, np.nan_to_num(ports)).astype(np.int64)
+    port_text = pd.Series(ports, index=frame.index).astype(str)
+    if table == 'ipv4_table':
+        ips, _ = parse_ipv4(frame['dst_ip'])
+        lengths = frame['prefix_len'].to_numpy(dtype=np.int64)
+        keys = (lengths.astype(np.uint64) << np.uint64(32)) | ips.astype(np.uint64)
+        macs = np.where(no_action, 0, parse_mac(frame['dst_mac'])[0]).astype(np.int64)
+        codes = np.where(no_action, -1, (ports << 48) | macs)
+        match = frame['dst_ip'].astype(str) + '/' + pd.Series(lengths, index=frame.index).astype(str)
+        params = port_text + ' ' + frame['dst_mac'].astype(str)
+        action = np.where(no_action, NO_ACTION, 'ipv4_forward')
+    else:
+        keys = parse_mac(frame['dst_mac'])[0]
+        codes = ports
+        match = frame['dst_mac'].astype(str)
+        params = port_text
+        action = np.where(no_action, NO_ACTION, 'set_egress_port')
+    params = params.where(~no_action, '')
+    return keys, codes, action, match.to_numpy(), params.to_numpy()
+
+def api_calls(table, compiled, installed=None):
+    # Chamadas do ThriftAPI (p4utils) que levam a tabela instalada (já
+    # normalizada por installable) ao conjunto compilado: inclusões, alterações
+    # de ação e remoções, nessa ordem, para que os prefixos agregados já estejam
+    # instalados quando os mais específicos forem removidos
+    keys, codes, action, match, params = _rule_columns(table, compiled)
+    if installed is None or not len(installed):
+        current_keys, current_codes, current_match = np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64), []
+    else:
+        current_keys, current_codes, _, current_match, _ = _rule_columns(table, installed)
+    order = np.argsort(current_keys)
+    pos = np.minimum(np.searchsorted(current_keys[order], keys), max(len(order) - 1, 0))
+    present = (current_keys[order][pos] == keys) if len(order) else np.zeros(len(keys), dtype=bool)
+    changed = present & (current_codes[order][pos] != codes) if len(order) else present
+    removed = ~np.isin(current_keys, keys)
+
+    def call(method, i):
+        return {'method': method, 'table_name': table, 'action_name': str(action[i]), 'match_keys': [match[i]],
+                'action_params': params[i].split()}
+
+    calls = [call('table_add', i) for i in np.flatnonzero(~present)]
+    calls += [call('table_modify_match', i) for i in np.flatnonzero(changed)]
+    calls += [{'method': 'table_delete_match', 'table_name': table, 'match_keys': [current_match[i]]} for i in np.flatnonzero(removed)]
+    return calls
+
+def apply_calls(client, calls):
+    for call in calls:
+        args = {name: value for name, value in call.items() if name != 'method'}
+        getattr(client, call['method'])(**args)
+
+def cli_commands(table, compiled):
+    # Recarga completa em um único lote para o simple_switch_CLI (o CLI só remove
+    # entradas pelo handle, que não faz parte das entradas coletadas)
+    _, _, action, match, params = _rule_columns(table, compiled)
+    lines = (f"table_add {table} " + pd.Series(action, dtype=object) + ' ' + pd.Series(match, dtype=object)
+             + ' => ' + pd.Series(params, dtype=object)).str.rstrip()
+    return [f"table_clear {table}"] + lines.tolist()
+
+def predict_ports(entries, model_path, data_path, address_bits=False):
+    # Substitui egress_port pela porta prevista pelo modelo treinado para a tabela
+    from data_collection.features import build_features
+    from models.model_registry import load_model_file
+    from models.prediction_service import make_predict_fn
+    preprocessors = build_features(data_path, address_bits=address_bits).preprocessors
+    kind, model = load_model_file(model_path)
+    entries = entries.copy()
+    entries['egress_port'] = np.asarray(make_predict_fn(kind, model, preprocessors)(entries), dtype=np.int64)
+    entries['action_name'] = entries['action_name'].where(entries['action_name'] != NO_ACTION, 'ipv4_forward' if 'dst_ip' in entries.columns else 'set_egress_port')
+    return entries
+
+def compile_table(table, entries, installed=None):
+    # installed: entradas atualmente no switch, para o diff das chamadas
+    timings = {}
+    start = time.perf_counter()
+    if table == 'ipv4_table':
+        routes = installable_ipv4(entries)
+        reference = ipv4_frame(*routes)
+        timings['load'] = time.perf_counter() - start
+        compiled = compile_ipv4(routes)
+    else:
+        reference = installable_ethernet(entries)
+        timings['load'] = time.perf_counter() - start
+        compiled = compile_ethernet(reference)
+    timings['compile'] = time.perf_counter() - start - timings['load']
+
+    start = time.perf_counter()
+    verification = verify_ipv4(reference, compiled) if table == 'ipv4_table' else verify_ethernet(reference, compiled)
+    timings['verify'] = time.perf_counter() - start
+    start = time.perf_counter()
+    if installed is entries:
+        current = reference
+    else:
+        current = installable(table, installed) if installed is not None and len(installed) else None
+    calls = api_calls(table, compiled, current)
+    timings['diff'] = time.perf_counter() - start
+
+    report = {
+        'original_entries': int(len(entries)),
+        'installable_entries': int(len(reference)),
+        'compiled_entries': int(len(compiled)),
+        'reduction': 1 - len(compiled) / len(reference) if len(reference) else 0.0,
+        'no_action_entries': int((compiled['action_name'] == NO_ACTION).sum()),
+        'seconds': timings,
+        'verification': verification,
+        'api_calls': {method: sum(call['method'] == method for call in calls) for method in ('table_delete_match', 'table_modify_match', 'table_add')},
+    }
+    return compiled, calls, report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compila as entradas coletadas (ou previstas) no menor conjunto equivalente de regras.')
+    parser.add_argument('--source', type=str, default='collected_data', help='Diretório com os JSON coletados ou arquivo commands.txt.')
+    parser.add_argument('--installed', type=str, default=None, help='Entradas instaladas no switch, para o diff das chamadas (padrão: --source).')
+    parser.add_argument('--output_dir', type=str, default='compiled_tables', help='Diretório dos comandos, chamadas e relatório.')
+    parser.add_argument('--predict', type=str, nargs='*', default=[], help='Modelos que definem as portas, como tabela=arquivo (ex.: ipv4=models/random_forest_ipv4.pkl).')
+    parser.add_argument('--data_dir', type=str, default='processed_data', help='Dados pré-processados usados no treinamento dos modelos.')
+    parser.add_argument('--address_bits', action='store_true', help='Features com bits de dst_mac/dst_ip (como no treinamento).')
+    parser.add_argument('--apply', action='store_true', help='Aplica as chamadas no switch pelo ThriftAPI.')
+    parser.add_argument('--p4_name', type=str, default='basic_forwarding', help='Nome do programa P4 (com --apply).')
+    parser.add_argument('--thrift_port', type=int, default=9090, help='Porta Thrift do BMv2 (com --apply).')
+    args = parser.parse_args()
+
+    from data_collection.columnar import find_table
+    ethernet_entries, ipv4_entries = load_entries(args.source)
+    installed = load_entries(args.installed) if args.installed else (ethernet_entries, ipv4_entries)
+    models = dict(spec.split('=', 1) for spec in args.predict)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    reports, all_calls, commands = {}, [], []
+    for table, short, entries, current in [('ethernet_table', 'ethernet', ethernet_entries, installed[0]),
+                                           ('ipv4_table', 'ipv4', ipv4_entries, installed[1])]:
+        if not len(entries):
+            print(f"{table}: nenhuma entrada em {args.source}. Pulando.")
+            continue
+        if short in models:
+            entries = predict_ports(entries, models[short], find_table(args.data_dir, f'processed_{short}_data'), args.address_bits)
+            print(f"{table}: portas previstas por {models[short]}")
+        compiled, calls, report = compile_table(table, entries, current)
+        reports[table] = report
+        all_calls += calls
+        commands += cli_commands(table, compiled)
+        check = report['verification']
+        print(f"{table}: {report['installable_entries']} -> {report['compiled_entries']} entradas "
+              f"({report['reduction']:.1%} menor) em {report['seconds']['compile']:.2f}s; "
+              f"{check['mismatches']} divergências em {check['addresses_checked']} endereços verificados")
+        if check['mismatches']:
+            raise SystemExit(f"{table}: tabela compilada diverge da consulta de referência.")
+
+    with open(os.path.join(args.output_dir, 'commands.txt'), 'w') as f:
+        f.write(f"# Gerado por table_compiler.py a partir de {args.source}\n")
+        f.write("# Execute com: simple_switch_CLI --thrift-port 9090 < commands.txt\n")
+        f.write('\n'.join(commands) + '\n')
+    with open(os.path.join(args.output_dir, 'api_calls.json'), 'w') as f:
+        json.dump(all_calls, f, indent=4)
+    with open(os.path.join(args.output_dir, 'report.json'), 'w') as f:
+        json.dump(reports, f, indent=4)
+    print(f"Comandos, chamadas e relatório salvos em {args.output_dir}")
+
+    if args.apply:
+        from p4utils.utils.thrift_API import ThriftAPI
+        start = time.perf_counter()
+        apply_calls(ThriftAPI(args.p4_name, args.thrift_port), all_calls)
+        print(f"{len(all_calls)} chamadas aplicadas em {time.perf_counter() - start:.2f}s")
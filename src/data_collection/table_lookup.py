@@ -0,0 +1,232 @@
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.address_encoding import parse_ipv4, parse_mac, prefix_lengths, prefix_mask
+from data_collection.preprocess_data import ethernet_row, ipv4_row, iter_table_entries
+
+# Motor de consulta de referência com a semântica das tabelas do basic_forwarding.p4:
+# ethernet_table (hdr.ethernet.dstAddr exact) e ipv4_table (hdr.ipv4.dstAddr lpm).
+# Serve de oráculo para avaliar os modelos e de linha de base de latência.
+NO_ACTION_PORT = -1
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+class HashIndex:
+    # Tabela hash de endereçamento aberto (sondagem linear) construída e consultada
+    # em lote: cada rodada trata todas as chaves ainda pendentes de uma vez
+    def __init__(self, keys):
+        keys = np.asarray(keys, dtype=np.uint64)
+        self.bits = max(4, int(np.ceil(np.log2(max(len(keys), 1) * 2))))
+        size = 1 << self.bits
+        self.mask = np.uint64(size - 1)
+        self.slot_keys = np.zeros(size, dtype=np.uint64)
+        self.slot_values = np.full(size, -1, dtype=np.int64)
+        self.max_probe = 0
+
+        # Chaves repetidas: vale a primeira ocorrência
+        unique_keys, first = np.unique(keys, return_index=True)
+        pending_keys = unique_keys
+        pending_values = first.astype(np.int64)
+        slots = self._hash(pending_keys)
+        probe = 0
+        while len(pending_keys):
+            # Entre as chaves que disputam o mesmo slot livre, a primeira vence
+            free = self.slot_values[slots] == -1
+            candidate_slots = slots[free]
+            _, winners = np.unique(candidate_slots, return_index=True)
+            placed = np.zeros(len(pending_keys), dtype=bool)
+            placed[np.flatnonzero(free)[winners]] = True
+            self.slot_keys[slots[placed]] = pending_keys[placed]
+            self.slot_values[slots[placed]] = pending_values[placed]
+            self.max_probe = probe
+
+            pending_keys = pending_keys[~placed]
+            pending_values = pending_values[~placed]
+            slots = (slots[~placed] + np.uint64(1)) & self.mask
+            probe += 1
+
+    def _hash(self, keys):
+        with np.errstate(over='ignore'):
+            return (keys * _HASH_MULTIPLIER) >> np.uint64(64 - self.bits)
+
+    def lookup(self, keys):
+        # Índice da entrada para cada chave (-1 quando não encontrada)
+        keys = np.asarray(keys, dtype=np.uint64)
+        result = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        slots = self._hash(keys)
+        for _ in range(self.max_probe + 1):
+            values = self.slot_values[slots]
+            hit = (values != -1) & (self.slot_keys[slots] == keys[pending])
+            result[pending[hit]] = values[hit]
+            # Slot vazio encerra a busca daquela chave
+            keep = ~hit & (values != -1)
+            pending = pending[keep]
+            slots = (slots[keep] + np.uint64(1)) & self.mask
+            if len(pending) == 0:
+                break
+        return result
+
+class ExactMatchTable:
+    # ethernet_table: correspondência exata de hdr.ethernet.dstAddr
+    def __init__(self, entries):
+        entries = entries.reset_index(drop=True)
+        macs, valid = parse_mac(entries['dst_mac'])
+        self.entries = entries[valid].reset_index(drop=True)
+        self.ports = pd.to_numeric(self.entries['egress_port'], errors='coerce').fillna(NO_ACTION_PORT).to_numpy(dtype=np.int64)
+        self.index = HashIndex(macs[valid])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, macs):
+        # macs: strings "xx:xx:..." ou uint64; retorna o índice da entrada (-1 em caso de miss)
+        macs = np.asarray(macs)
+        if macs.dtype.kind not in 'ui':
+            macs, valid = parse_mac(macs)
+            result = self.index.lookup(macs)
+            result[~valid] = -1
+            return result
+        return self.index.lookup(macs)
+
+    def lookup_ports(self, macs):
+        idx = self.lookup(macs)
+        return np.where(idx >= 0, self.ports[np.maximum(idx, 0)], NO_ACTION_PORT)
+
+class LpmTable:
+    # ipv4_table: maior prefixo de hdr.ipv4.dstAddr, com um índice hash por comprimento de prefixo
+    def __init__(self, entries):
+        entries = entries.reset_index(drop=True)
+        ips, valid = parse_ipv4(entries['dst_ip'])
+        self.entries = entries[valid].reset_index(drop=True)
+        self.ports = pd.to_numeric(self.entries['egress_port'], errors='coerce').fillna(NO_ACTION_PORT).to_numpy(dtype=np.int64)
+        lengths = prefix_lengths(self.entries['prefix_len']) if 'prefix_len' in self.entries.columns else np.full(len(self.entries), 32)
+        networks = ips[valid] & prefix_mask(lengths)
+
+        # Comprimentos em ordem decrescente: a primeira correspondência é a mais longa
+        self.levels = []
+        for length in sorted(np.unique(lengths), reverse=True):
+            rows = np.flatnonzero(lengths == length)
+            index = HashIndex(networks[rows])
+            self.levels.append((int(length), prefix_mask([length])[0], index, rows))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, ips):
+        # ips: strings "a.b.c.d" ou uint32; retorna o índice da entrada (-1 em caso de miss)
+        ips = np.asarray(ips)
+        valid = np.ones(len(ips), dtype=bool)
+        if ips.dtype.kind not in 'ui':
+            ips, valid = parse_ipv4(ips)
+        ips = ips.astype(np.uint64)
+        result = np.full(len(ips), -1, dtype=np.int64)
+        pending = np.flatnonzero(valid)
+        for _, mask, index, rows in self.levels:
+            if len(pending) == 0:
+                break
+            found = index.lookup(ips[pending] & np.uint64(mask))
+            hit = found >= 0
+            result[pending[hit]] = rows[found[hit]]
+            pending = pending[~hit]
+        return result
+
+    def lookup_ports(self, ips):
+        idx = self.lookup(ips)
+        return np.where(idx >= 0, self.ports[np.maximum(idx, 0)], NO_ACTION_PORT)
+
+def table_from_frame(df):
+    # Cria a tabela adequada a partir das colunas pré-processadas
+    if 'dst_ip' in df.columns:
+        return LpmTable(df)
+    return ExactMatchTable(df)
+
+def parse_commands(commands_path):
+    # Lê as linhas table_add de um arquivo de comandos do simple_switch_CLI
+    ethernet_rows, ipv4_rows = [], []
+    with open(commands_path, 'r') as f:
+        for line in f:
+            parts = line.split('#', 1)[0].split()
+            if len(parts) < 4 or parts[0] != 'table_add' or '=>' not in parts:
+                continue
+            arrow = parts.index('=>')
+            table, action, keys, params = parts[1], parts[2], parts[3:arrow], parts[arrow + 1:]
+            if table == 'ethernet_table':
+                ethernet_rows.append({'dst_mac': keys[0], 'action_name': action,
+                                      'egress_port': int(params[0]) if params else np.nan})
+            elif table == 'ipv4_table':
+                address, _, length = keys[0].partition('/')
+                ipv4_rows.append({'dst_ip': address, 'prefix_len': int(length) if length else 32, 'action_name': action,
+                                  'egress_port': int(params[0]) if params else np.nan,
+                                  'dst_mac': params[1] if len(params) > 1 else np.nan})
+    return pd.DataFrame(ethernet_rows, columns=['dst_mac', 'action_name', 'egress_port']), \
+        pd.DataFrame(ipv4_rows, columns=['dst_ip', 'prefix_len', 'action_name', 'egress_port', 'dst_mac'])
+
+def load_entries(source):
+    # source: diretório com *_table_entries.json (collect_data.py) ou arquivo commands.txt
+    if os.path.isdir(source):
+        frames = []
+        for name, row_builder in [('ethernet_table_entries.json', ethernet_row), ('ipv4_table_entries.json', ipv4_row)]:
+            path = os.path.join(source, name)
+            frames.append(pd.DataFrame([row_builder(entry) for entry in iter_table_entries(path)]) if os.path.exists(path) else pd.DataFrame())
+        return frames[0], frames[1]
+    return parse_commands(source)
+
+class LookupEngine:
+    def __init__(self, ethernet_entries, ipv4_entries):
+        self.ethernet_table = ExactMatchTable(ethernet_entries) if len(ethernet_entries) else None
+        self.ipv4_table = LpmTable(ipv4_entries) if len(ipv4_entries) else None
+
+    @classmethod
+    def from_source(cls, source):
+        return cls(*load_entries(source))
+
+def benchmark_lookup(table, addresses, repeats=3):
+    # Melhor tempo de consulta em lote (endereços já convertidos para inteiros)
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        table.lookup(addresses)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Motor de consulta exact/LPM de referência para as tabelas do BMv2.')
+    parser.add_argument('--source', type=str, default='collected_data', help='Diretório com os JSON coletados ou arquivo commands.txt.')
+    parser.add_argument('--lookup', type=str, nargs='*', default=[], help='Endereços MAC ou IPv4 a consultar.')
+    parser.add_argument('--benchmark', type=int, default=0, help='Mede a vazão com N endereços aleatórios.')
+    args = parser.parse_args()
+
+    engine = LookupEngine.from_source(args.source)
+    for name, table in [('ethernet_table', engine.ethernet_table), ('ipv4_table', engine.ipv4_table)]:
+        print(f"{name}: {len(table) if table is not None else 0} entradas")
+
+    for address in args.lookup:
+        table = engine.ipv4_table if '.' in address else engine.ethernet_table
+        if table is None:
+            print(f"{address} -> tabela não carregada")
+            continue
+        idx = table.lookup(np.array([address], dtype=object))[0]
+        print(f"{address} -> {'miss (_NoAction)' if idx < 0 else table.entries.iloc[idx].to_dict()}")
+
+    if args.benchmark:
+        rng = np.random.default_rng(0)
+        for name, table, bits in [('ethernet_table', engine.ethernet_table, 48), ('ipv4_table', engine.ipv4_table, 32)]:
+            if table is None:
+                continue
+            # Metade dos endereços vem da própria tabela (hits), metade é aleatória
+            if bits == 48:
+                known = parse_mac(table.entries['dst_mac'])[0]
+                addresses = rng.integers(0, 1 << 48, args.benchmark, dtype=np.uint64)
+            else:
+                known = parse_ipv4(table.entries['dst_ip'])[0].astype(np.uint64)
+                addresses = rng.integers(0, 1 << 32, args.benchmark, dtype=np.uint64)
+            addresses[::2] = known[rng.integers(0, len(known), len(addresses[::2]))]
+            if bits == 32:
+                addresses = addresses.astype(np.uint32)
+            elapsed = benchmark_lookup(table, addresses)
+            print(f"{name}: {args.benchmark} consultas em {elapsed * 1e3:.1f} ms ({args.benchmark / elapsed / 1e6:.2f} M consultas/s)")
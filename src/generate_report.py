@@ -1,6 +1,29 @@
-import pandas as pd
+import argparse
+import datetime
+import glob
+import json
 import os
 
+from instrumentation import phase, stage
+from runtime_info import git_commit
+
+# Métricas de desempenho comparadas entre execuções (variação relativa) e se
+# valores maiores são melhores. As métricas de qualidade usam variação absoluta.
+PERFORMANCE_METRICS = {
+    'throughput_rows_per_second': True,
+    'latency_per_row_us': False,
+    'load_seconds': False,
+    'peak_rss_mb': False,
+    'peak_rss_delta_mb': False,
+}
+QUALITY_METRICS = ['accuracy', 'precision', 'recall', 'f1_score', 'oracle_agreement']
+HISTORY_FILE = os.path.join('evaluation', 'history.jsonl')
+
+def _format_value(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"{value:.4f}"
+    return '-' if value is None else str(value)
+
 def generate_report(results, output_file):
     with open(output_file, "w") as f:
         f.write("Relatório de Avaliação de Modelos\n")
@@ -8,19 +31,127 @@ def generate_report(results, output_file):
         for model_name, metrics in results.items():
             f.write(f"Modelo: {model_name}\n")
             for metric, value in metrics.items():
-                f.write(f" {metric.replace("\\'_\\', \\' \\'").title()}: {value:.4f}\n")
+                f.write(f" {metric.replace('_', ' ').title()}: {_format_value(value)}\n")
             f.write("\n")
     print(f"Relatório gerado em {output_file}")
 
-if __name__ == '__main__':
-    # Este script é um placeholder. Os resultados devem ser passados de compare_models.py
-    # Exemplo de como os resultados seriam passados (apenas para demonstração):
-    sample_results = {
-        "Neural Network": {"accuracy": 0.85, "precision": 0.84, "recall": 0.86, "f1_score": 0.85},
-        "Random Forest": {"accuracy": 0.88, "precision": 0.87, "recall": 0.88, "f1_score": 0.87},
-        "Logistic Regression": {"accuracy": 0.82, "precision": 0.81, "recall": 0.83, "f1_score": 0.82}
+def write_machine_readable(results, output_file, run_info=None):
+    # JSON (resultados + informações da execução) e CSV (uma linha por modelo) ao lado do relatório texto
+    base = os.path.splitext(output_file)[0]
+    with open(base + '.json', 'w') as f:
+        json.dump({'run': run_info or {}, 'results': results}, f, indent=4)
+    import pandas as pd
+    frame = pd.DataFrame.from_dict(results, orient='index')
+    frame.index.name = 'model'
+    frame.to_csv(base + '.csv')
+    return base + '.json', base + '.csv'
+
+def load_history(history_path, label=None):
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path, 'r') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [record for record in records if label is None or record.get('label') == label]
+
+def append_history(history_path, record):
+    os.makedirs(os.path.dirname(history_path) or '.', exist_ok=True)
+    with open(history_path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+def diff_results(previous, current, threshold=0.1, quality_threshold=0.01):
+    # Compara duas execuções ({modelo: {métrica: valor}}). Retorna todas as variações
+    # e marca como regressão desempenho pior que `threshold` (relativo) e quedas de
+    # qualidade maiores que `quality_threshold` (absoluto).
+    changes = []
+    for model_name, metrics in current.items():
+        old_metrics = previous.get(model_name, {})
+        for metric, value in metrics.items():
+            old = old_metrics.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            if metric in PERFORMANCE_METRICS:
+                if old == 0:
+                    continue
+                change = value / old - 1
+                worse = -change if PERFORMANCE_METRICS[metric] else change
+                regression = worse > threshold
+            elif metric in QUALITY_METRICS:
+                change = value - old
+                regression = -change > quality_threshold
+            else:
+                continue
+            changes.append({'model': model_name, 'metric': metric, 'previous': old, 'current': value,
+                            'change': change, 'relative': metric in PERFORMANCE_METRICS, 'regression': regression})
+    return changes
+
+def print_diff(changes, reference):
+    print(f"\n--- Comparação com {reference} ---")
+    for change in changes:
+        delta = f"{change['change']:+.1%}" if change['relative'] else f"{change['change']:+.4f}"
+        flag = 'REGRESSÃO ' if change['regression'] else ''
+        print(f"{flag}{change['model']} {change['metric']}: {_format_value(change['previous'])} -> {_format_value(change['current'])} ({delta})")
+    regressions = [change for change in changes if change['regression']]
+    print(f"{len(regressions)} regressão(ões) acima do limite." if regressions else "Nenhuma regressão acima do limite.")
+    return regressions
+
+def _baseline_results(baseline_path):
+    # Aceita um JSON de resultados, um JSON gerado por write_machine_readable ou um registro do histórico
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    return baseline.get('results', baseline)
+
+@stage('report', target='output_file')
+def publish_report(results, output_file, label=None, history_path=HISTORY_FILE, baseline_path=None, threshold=0.1):
+    # Relatório texto, JSON e CSV; diff contra a linha de base fixada (ou a execução
+    # anterior com o mesmo rótulo) e registro da execução no histórico
+    label = label or os.path.splitext(os.path.basename(output_file))[0]
+    run_info = {
+        'label': label,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
     }
-    output_report_path = os.path.join("evaluation", "model_evaluation_report.txt")
-    generate_report(sample_results, output_report_path)
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with phase('write'):
+        generate_report(results, output_file)
+        write_machine_readable(results, output_file, run_info)
+
+    regressions = []
+    if baseline_path and os.path.exists(baseline_path):
+        regressions = print_diff(diff_results(_baseline_results(baseline_path), results, threshold), f"linha de base {baseline_path}")
+    else:
+        history = load_history(history_path, label)
+        if history:
+            previous = history[-1]
+            regressions = print_diff(diff_results(previous['results'], results, threshold),
+                                     f"execução anterior ({previous['timestamp']}, {previous['git_commit'][:12]})")
+    if history_path:
+        append_history(history_path, dict(run_info, results=results))
+    return regressions
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera os relatórios de avaliação (texto, JSON e CSV) e compara com execuções anteriores.')
+    parser.add_argument('--results', type=str, nargs='*', default=None, help='JSON de resultados de compare_models (padrão: evaluation/results_*.json).')
+    parser.add_argument('--output_dir', type=str, default='evaluation', help='Diretório dos relatórios.')
+    parser.add_argument('--history', type=str, default=HISTORY_FILE, help='Arquivo JSONL com o histórico de execuções.')
+    parser.add_argument('--baseline', type=str, default=None, help='Linha de base fixada (JSON); {label} é substituído pelo nome da tabela.')
+    parser.add_argument('--pin_baseline', action='store_true', help='Fixa os resultados atuais como linha de base.')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Piora relativa de vazão/latência considerada regressão (0.1 = 10%%).')
+    args = parser.parse_args()
 
+    results_paths = args.results or sorted(glob.glob(os.path.join('evaluation', 'results_*.json')))
+    if not results_paths:
+        print("Nenhum arquivo de resultados encontrado. Execute compare_models.py (ou o pipeline) antes.")
+    regressions = []
+    for results_path in results_paths:
+        label = os.path.splitext(os.path.basename(results_path))[0].replace('results_', '', 1)
+        with open(results_path, 'r') as f:
+            results = json.load(f)
+        output_file = os.path.join(args.output_dir, f"model_evaluation_report_{label}.txt")
+        baseline_path = args.baseline.format(label=label) if args.baseline else None
+        regressions += publish_report(results, output_file, label, args.history, baseline_path, args.threshold)
+        if args.pin_baseline:
+            pinned = baseline_path or os.path.join(args.output_dir, f"baseline_{label}.json")
+            with open(pinned, 'w') as f:
+                json.dump(results, f, indent=4)
+            print(f"Linha de base fixada em {pinned}")
+    raise SystemExit(1 if regressions else 0)
@@ -0,0 +1,357 @@
+import argparse
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from runtime_info import PeakRss, current_rss_bytes, process_peak_rss_bytes
+
+# Instrumentação opcional dos estágios (coleta, pré-processamento, limpeza,
+# features, treinamentos, avaliação e relatório). Cada função decorada com
+# @stage registra tempo de relógio e de CPU (do processo e dos subprocessos),
+# pico de memória durante o estágio (RSS e, opcionalmente, tracemalloc), linhas processadas e os
+# tempos das fases internas marcadas com phase(). Os registros vão para um
+# trace JSON (uma linha por estágio, escrita por qualquer processo da execução)
+# e, ao fim de cada processo, para um arquivo textfile do Prometheus com a
+# última execução. Desativada, cada chamada custa uma verificação de atributo.
+#
+# Ativação pelas variáveis de ambiente (herdadas por subprocessos e pools):
+#   PIPELINE_TRACE=trace.jsonl      liga a instrumentação
+#   PIPELINE_METRICS=pipeline.prom  textfile do Prometheus (padrão: <trace>.prom)
+#   PIPELINE_PROFILE=clean,train_rf cProfile nos estágios indicados ('all' para todos)
+#   PIPELINE_TRACEMALLOC=1          pico de memória alocada pelo Python (lento)
+# ou por configure(), usada pelas opções --trace/--profile de run_example.py e pipeline.py.
+TRACE_ENV = 'PIPELINE_TRACE'
+METRICS_ENV = 'PIPELINE_METRICS'
+PROFILE_ENV = 'PIPELINE_PROFILE'
+TRACEMALLOC_ENV = 'PIPELINE_TRACEMALLOC'
+RUN_ENV = 'PIPELINE_RUN_ID'
+PROFILE_TOP = 25
+
+class _Config:
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = None
+        self.metrics_path = None
+        self.profile = set()
+        self.tracemalloc = False
+        self.run_id = None
+        self.profiling = False
+        self.exit_hook = False
+        self.lock = threading.Lock()
+
+_config = _Config()
+_local = threading.local()
+
+def configure(trace_path, metrics_path=None, profile=(), tracemalloc=False):
+    # Também exporta a configuração no ambiente, para os subprocessos
+    os.environ[TRACE_ENV] = trace_path
+    os.environ[METRICS_ENV] = metrics_path or os.path.splitext(trace_path)[0] + '.prom'
+    os.environ[PROFILE_ENV] = ','.join(profile)
+    os.environ[TRACEMALLOC_ENV] = '1' if tracemalloc else ''
+    os.environ.setdefault(RUN_ENV, uuid.uuid4().hex[:12])
+    _load_environment()
+
+def _load_environment():
+    trace_path = os.environ.get(TRACE_ENV)
+    _config.enabled = bool(trace_path)
+    if not _config.enabled:
+        return
+    _config.trace_path = trace_path
+    _config.metrics_path = os.environ.get(METRICS_ENV) or os.path.splitext(trace_path)[0] + '.prom'
+    _config.profile = {name for name in os.environ.get(PROFILE_ENV, '').split(',') if name}
+    _config.tracemalloc = os.environ.get(TRACEMALLOC_ENV, '') not in ('', '0')
+    # Processos iniciados sem configure() (um script executado diretamente) formam uma execução própria
+    _config.run_id = os.environ.setdefault(RUN_ENV, uuid.uuid4().hex[:12])
+    os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+    if not _config.exit_hook:
+        atexit.register(write_metrics)
+        _config.exit_hook = True
+
+def enabled():
+    return _config.enabled
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _children_cpu():
+    # CPU dos subprocessos já encerrados
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return children.ru_utime + children.ru_stime
+
+def _target_value(value):
+    if isinstance(value, dict) and 'name' in value:
+        return str(value['name'])
+    if isinstance(value, (list, tuple)):
+        return ','.join(_target_value(item) for item in value)
+    if isinstance(value, dict):
+        return ','.join(_target_value(str(key)) for key in value)
+    if isinstance(value, str):
+        return os.path.basename(value.rstrip('/')) or value
+    return str(value)
+
+class _Phase:
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        entry = self.record['phases'].setdefault(self.name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0})
+        entry['wall_seconds'] += time.perf_counter() - self.wall
+        entry['cpu_seconds'] += time.process_time() - self.cpu
+        entry['calls'] += 1
+        return False
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NO_PHASE = _NoPhase()
+
+def phase(name):
+    # Sub-tempo (leitura, codificação, ajuste, gravação...) do estágio corrente
+    if not _config.enabled:
+        return _NO_PHASE
+    stack = _stack()
+    return _Phase(stack[-1], name) if stack else _NO_PHASE
+
+def add_rows(count):
+    # Linhas processadas pelo estágio corrente
+    if _config.enabled:
+        stack = _stack()
+        if stack:
+            stack[-1]['rows'] += int(count)
+
+def _profile_summary(profiler, record):
+    import pstats
+    base = os.path.splitext(_config.trace_path)[0]
+    path = f"{base}_profile_{record['stage']}_{record['target'] or 'all'}_{os.getpid()}.prof"
+    profiler.dump_stats(path)
+    stats = pstats.Stats(profiler).stats
+    top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+    record['profile'] = {
+        'path': path,
+        'top': [{'function': f"{os.path.basename(filename)}:{line}({name})", 'calls': calls,
+                 'total_seconds': total, 'cumulative_seconds': cumulative}
+                for (filename, line, name), (_, calls, total, cumulative, _) in top],
+    }
+
+def run_stage(name, func, args=(), kwargs=None, target=None):
+    # Executa func como um estágio instrumentado (as funções decoradas com
+    # @stage chamadas dentro dele aparecem como estágios filhos)
+    kwargs = kwargs or {}
+    if not _config.enabled:
+        return func(*args, **kwargs)
+    stack = _stack()
+    if stack and stack[-1]['pid'] != os.getpid():
+        # Processo criado por fork dentro de um estágio: os registros do pai não são deste processo
+        stack.clear()
+        _config.profiling = False
+    record = {'stage': name, 'target': target, 'run_id': _config.run_id, 'pid': os.getpid(), 'started': time.time(),
+              'rows': 0, 'phases': {}, 'stages': []}
+    if _config.tracemalloc:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    profiler = None
+    if (name in _config.profile or 'all' in _config.profile) and not _config.profiling:
+        import cProfile
+        profiler = cProfile.Profile()
+        _config.profiling = True
+    children_cpu = _children_cpu()
+    # Pico de RSS do próprio estágio (o ru_maxrss é o pico da vida inteira do processo)
+    rss = PeakRss().start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    stack.append(record)
+    try:
+        result = profiler.runcall(func, *args, **kwargs) if profiler else func(*args, **kwargs)
+        record['status'] = 'ok'
+        return result
+    except BaseException as exc:
+        record['status'] = 'failed'
+        record['error'] = repr(exc)
+        raise
+    finally:
+        stack.pop()
+        record['wall_seconds'] = time.perf_counter() - wall
+        record['cpu_seconds'] = time.process_time() - cpu
+        rss.stop()
+        record['children_cpu_seconds'] = _children_cpu() - children_cpu
+        record['peak_rss_bytes'] = rss.peak_bytes
+        record['peak_rss_increase_bytes'] = rss.increase_bytes
+        record['process_peak_rss_bytes'] = process_peak_rss_bytes()
+        record['rss_bytes'] = current_rss_bytes()
+        if _config.tracemalloc:
+            import tracemalloc
+            # O pico dos estágios filhos foi medido antes de cada reset_peak
+            record['peak_traced_bytes'] = max(tracemalloc.get_traced_memory()[1], record.pop('_child_peak', 0))
+            if stack:
+                stack[-1]['_child_peak'] = max(stack[-1].get('_child_peak', 0), record['peak_traced_bytes'])
+            tracemalloc.reset_peak()
+        if profiler is not None:
+            _config.profiling = False
+            _profile_summary(profiler, record)
+        if stack:
+            stack[-1]['stages'].append(record)
+        else:
+            _write_record(record)
+
+def stage(name, target=None):
+    # Decorador: target é o parâmetro que identifica a entrada (tabela, modelo...)
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _config.enabled:
+                return func(*args, **kwargs)
+            value = None
+            if target is not None:
+                bound = signature.bind_partial(*args, **kwargs)
+                bound.apply_defaults()
+                value = _target_value(bound.arguments.get(target))
+            return run_stage(name, func, args, kwargs, value)
+        return wrapper
+    return decorator
+
+def _write_record(record):
+    line = json.dumps(record, default=str) + '\n'
+    with _config.lock:
+        # Uma única escrita em modo append por registro (vários processos no mesmo arquivo)
+        with open(_config.trace_path, 'a') as f:
+            f.write(line)
+
+def load_trace(trace_path, run_id=None):
+    # Registros de uma execução (padrão: a última do arquivo)
+    records = []
+    if os.path.exists(trace_path):
+        with open(trace_path, 'r') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    if run_id is None and records:
+        run_id = records[-1]['run_id']
+    return [record for record in records if record['run_id'] == run_id]
+
+def _flatten(records):
+    for record in records:
+        yield record
+        yield from _flatten(record.get('stages', []))
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+METRICS = [
+    ('pipeline_stage_wall_seconds', 'Tempo de relógio dos estágios na última execução.', 'wall_seconds', sum),
+    ('pipeline_stage_cpu_seconds', 'Tempo de CPU do processo nos estágios.', 'cpu_seconds', sum),
+    ('pipeline_stage_children_cpu_seconds', 'Tempo de CPU dos subprocessos encerrados durante os estágios.', 'children_cpu_seconds', sum),
+    ('pipeline_stage_rows', 'Linhas processadas pelos estágios.', 'rows', sum),
+    ('pipeline_stage_peak_rss_bytes', 'Pico de RSS durante os estágios.', 'peak_rss_bytes', max),
+    ('pipeline_stage_peak_rss_increase_bytes', 'Pico de RSS dos estágios acima do RSS do início de cada um.', 'peak_rss_increase_bytes', max),
+    ('pipeline_process_peak_rss_bytes', 'Pico de RSS do processo (desde o início) ao fim dos estágios.', 'process_peak_rss_bytes', max),
+    ('pipeline_stage_peak_traced_bytes', 'Pico de memória alocada pelo Python (tracemalloc) durante os estágios.', 'peak_traced_bytes', max),
+    ('pipeline_stage_calls', 'Execuções dos estágios.', None, len),
+    ('pipeline_stage_failures', 'Execuções dos estágios que falharam.', 'failed', sum),
+]
+
+def prometheus_text(records):
+    # Séries agregadas por (estágio, alvo): somas de tempo e linhas, máximo de memória
+    groups, phases = {}, {}
+    for record in _flatten(records):
+        key = (record['stage'], record.get('target') or '')
+        groups.setdefault(key, []).append(record)
+        for name, entry in record.get('phases', {}).items():
+            totals = phases.setdefault(key + (name,), [0.0, 0.0])
+            totals[0] += entry['wall_seconds']
+            totals[1] += entry['cpu_seconds']
+    lines = []
+    for metric, help_text, field, aggregate in METRICS:
+        values = []
+        for (stage_name, target), group in sorted(groups.items()):
+            if field is None:
+                value = aggregate(group)
+            elif field == 'failed':
+                value = aggregate(record.get('status') == 'failed' for record in group)
+            else:
+                present = [record[field] for record in group if record.get(field) is not None]
+                if not present:
+                    continue
+                value = aggregate(present)
+            values.append(f'{metric}{{stage="{_label(stage_name)}",target="{_label(target)}"}} {float(value):.6g}')
+        if values:
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} gauge'] + values
+    for index, (metric, help_text) in enumerate([('pipeline_phase_wall_seconds', 'Tempo de relógio das fases dos estágios.'),
+                                                 ('pipeline_phase_cpu_seconds', 'Tempo de CPU das fases dos estágios.')]):
+        if phases:
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} gauge']
+            lines += [f'{metric}{{stage="{_label(s)}",target="{_label(t)}",phase="{_label(p)}"}} {totals[index]:.6g}'
+                      for (s, t, p), totals in sorted(phases.items())]
+    if records:
+        lines += ['# HELP pipeline_run_timestamp_seconds Início da última execução instrumentada.',
+                  '# TYPE pipeline_run_timestamp_seconds gauge',
+                  f"pipeline_run_timestamp_seconds{{run_id=\"{_label(records[0]['run_id'])}\"}} {min(r['started'] for r in records):.3f}"]
+    return '\n'.join(lines) + '\n'
+
+def write_metrics(trace_path=None, metrics_path=None, run_id=None):
+    # Reescreve o textfile (temporário + rename, como exige o textfile collector)
+    trace_path = trace_path or _config.trace_path
+    metrics_path = metrics_path or _config.metrics_path
+    if not trace_path or not metrics_path:
+        return
+    records = load_trace(trace_path, run_id or _config.run_id)
+    if not records:
+        return
+    tmp_path = f'{metrics_path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        f.write(prometheus_text(records))
+    os.replace(tmp_path, metrics_path)
+    return metrics_path
+
+def print_summary(records, indent=0):
+    for record in records:
+        name = record['stage'] + (f" [{record['target']}]" if record.get('target') else '')
+        memory = f"{record['peak_rss_bytes'] / 2**20:8.1f} MiB" if record.get('peak_rss_bytes') else '       -'
+        rows = f"{record['rows']:>10d}" if record.get('rows') else '         -'
+        print(f"{'  ' * indent}{name:{48 - 2 * indent}s} {record['wall_seconds']:9.2f}s {record['cpu_seconds']:9.2f}s {memory} {rows} {record.get('status', '')}")
+        for phase_name, entry in sorted(record.get('phases', {}).items(), key=lambda item: -item[1]['wall_seconds']):
+            print(f"{'  ' * (indent + 1)}. {phase_name:{44 - 2 * indent}s} {entry['wall_seconds']:9.2f}s {entry['cpu_seconds']:9.2f}s")
+        print_summary(record.get('stages', []), indent + 1)
+
+_load_environment()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resumo de uma execução instrumentada e geração do textfile do Prometheus.')
+    parser.add_argument('--trace', type=str, default=os.environ.get(TRACE_ENV, 'pipeline_trace.jsonl'), help='Trace JSON (uma linha por estágio).')
+    parser.add_argument('--metrics', type=str, default=None, help='Textfile do Prometheus a gerar (padrão: <trace>.prom).')
+    parser.add_argument('--run_id', type=str, default=None, help='Execução a resumir (padrão: a última).')
+    args = parser.parse_args()
+
+    records = load_trace(args.trace, args.run_id)
+    if not records:
+        print(f"Nenhum registro em {args.trace}.")
+        sys.exit(1)
+    print(f"Execução {records[0]['run_id']} ({len(records)} estágios de primeiro nível)")
+    print(f"{'estágio':48s} {'relógio':>10s} {'CPU':>10s} {'pico RSS':>12s} {'linhas':>10s}")
+    print_summary(records)
+    metrics_path = args.metrics or os.path.splitext(args.trace)[0] + '.prom'
+    write_metrics(args.trace, metrics_path, records[0]['run_id'])
+    print(f"Métricas do Prometheus salvas em {metrics_path}")
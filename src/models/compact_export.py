@@ -0,0 +1,192 @@
+import numpy as np
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from models.numpy_inference import (ForestPredictor, benchmark_predictors, export_quantized_nn, export_random_forest,
+                                    forest_arrays, load_predictor)
+
+# Versões compactas dos modelos para servir com baixa latência: a rede neural
+# com pesos int8 (inferência em NumPy, sem TensorFlow) e a Random Forest com
+# profundidade limitada e só as árvores necessárias. A escolha usa metade do
+# conjunto de teste e o relatório (tamanho, latência e diferença de acurácia em
+# relação ao original) é calculado na outra metade.
+
+def order_trees(model, X, y):
+    # Árvores da mais para a menos precisa individualmente no conjunto de escolha
+    predictor = ForestPredictor(forest_arrays(model))
+    votes = predictor.classes.take(np.argmax(predictor.tree_proba(X), axis=2), axis=0)
+    accuracy = (votes == y).mean(axis=1)
+    return np.argsort(-accuracy, kind='stable')
+
+def forest_candidates(model, X, y, depths, tree_counts):
+    # Acurácia de cada combinação (profundidade, número de árvores); o custo da
+    # travessia é proporcional a árvores x profundidade
+    order = order_trees(model, X, y)
+    n_trees = len(order)
+    counts = sorted({min(k, n_trees) for k in tree_counts} | {n_trees})
+    candidates = []
+    for depth in list(depths) + [None]:
+        predictor = ForestPredictor(forest_arrays(model, max_depth=depth, trees=order))
+        if depth is not None and predictor.max_depth < depth:
+            continue  # Nenhuma árvore chega a essa profundidade
+        proba = np.cumsum(predictor.tree_proba(X), axis=0)
+        for k in counts:
+            accuracy = float((predictor.classes.take(np.argmax(proba[k - 1], axis=1), axis=0) == y).mean())
+            candidates.append({'max_depth': depth, 'n_trees': k, 'depth': predictor.max_depth,
+                               'cost': k * predictor.max_depth, 'accuracy': accuracy})
+    return order, candidates
+
+def select_forest(candidates, tolerance):
+    # Menor custo entre as combinações a até `tolerance` da floresta completa
+    full = next(c for c in candidates if c['max_depth'] is None and c['n_trees'] == max(c['n_trees'] for c in candidates))
+    eligible = [c for c in candidates if c['accuracy'] >= full['accuracy'] - tolerance]
+    return min(eligible, key=lambda c: (c['cost'], -c['accuracy']))
+
+def _model_report(path, predict, X, y, reference):
+    predictions = np.asarray(predict(X))
+    return {
+        'path': path,
+        'size_bytes': os.path.getsize(path),
+        'accuracy': float((predictions == y).mean()),
+        'agreement': float((predictions == reference).mean()),
+    }
+
+def compare(original, compact, y, batch_sizes):
+    # original/compact: (caminho, função predict, features de entrada). O original
+    # recebe as features normalizadas pelo sklearn e o compacto as features
+    # codificadas, que ele mesmo normaliza com a média/escala gravadas
+    reference = np.asarray(original[1](original[2]))
+    report = {}
+    for name, (path, predict, X) in (('original', original), ('compact', compact)):
+        report[name] = _model_report(path, predict, X, y, reference)
+        report[name]['latency'] = benchmark_predictors({name: predict}, X, batch_sizes)[name]
+        largest = report[name]['latency'][str(min(max(batch_sizes), X.shape[0]))]
+        report[name]['us_per_row'] = 1e6 / largest['rows_per_second']
+    report['accuracy_delta'] = report['compact']['accuracy'] - report['original']['accuracy']
+    report['size_ratio'] = report['compact']['size_bytes'] / report['original']['size_bytes']
+    report['speedup'] = report['original']['us_per_row'] / report['compact']['us_per_row']
+    return report
+
+def compact_random_forest(model_path, output_path, preprocessors, X_select, y_select, X_report, y_report, raw_report,
+                          depths=(4, 6, 8, 10, 12, 16), tree_counts=(5, 10, 25, 50), tolerance=0.002, batch_sizes=(1, 64, 4096)):
+    # raw_report: as linhas de X_report codificadas, antes da normalização
+    import joblib
+    model = joblib.load(model_path)
+    order, candidates = forest_candidates(model, X_select, y_select, depths, tree_counts)
+    chosen = select_forest(candidates, tolerance)
+    export_random_forest(model, output_path, preprocessors['scaler'], max_depth=chosen['max_depth'],
+                         trees=order[:chosen['n_trees']], compact=True)
+    report = compare((model_path, model.predict, X_report), (output_path, load_predictor(output_path).predict, raw_report),
+                     y_report, batch_sizes)
+    report['chosen'] = chosen
+    report['candidates'] = candidates
+    return report
+
+def quantize_neural_network(model_path, output_path, preprocessors, X_report, y_report, raw_report, batch_sizes=(1, 64, 4096)):
+    from tensorflow.keras.models import load_model
+    model = load_model(model_path)
+    export_quantized_nn(model, output_path, preprocessors['scaler'])
+
+    def keras_predict(X):
+        # Chamada direta ao modelo, como no serviço de predição
+        return np.argmax(np.asarray(model(X.astype(np.float32), training=False)), axis=1)
+
+    return compare((model_path, keras_predict, X_report), (output_path, load_predictor(output_path).predict, raw_report),
+                   y_report, batch_sizes)
+
+def evaluation_split(data_path, model_path, address_bits=False, splits=None):
+    # Pré-processadores e conjunto de teste do modelo (como em compare_models.evaluate_model_path):
+    # para um modelo treinado em blocos (<modelo>.features.json), os pré-processadores
+    # ajustados em blocos e a divisão por hash; senão, o cache de features em memória.
+    # Retorna (pré-processadores, X_select, y_select, X_report, y_report, raw_report):
+    # metade do teste escolhe a RF compacta, a outra metade vai para o relatório, e
+    # raw_report são as linhas do relatório sem normalização (entrada dos modelos compactos)
+    from data_collection.columnar import load_table
+    from data_collection.features import (TARGET_COLUMN, build_features, build_streaming_features, encode_frame, labeled_rows,
+                                          load_feature_info, streaming_test_rows)
+    feature_info = load_feature_info(model_path)
+    key = json.dumps(feature_info, sort_keys=True)
+    if splits is not None and key in splits:
+        return splits[key]
+    df = load_table(data_path)
+    if feature_info is not None:
+        print(f"{model_path} foi treinado em blocos: exportado com os seus pré-processadores e avaliado na divisão por hash.")
+        preprocessors = build_streaming_features(data_path, feature_info['test_size'], feature_info['random_state'],
+                                                 feature_info['address_bits'], feature_info['chunk_size']).preprocessors
+        idx_test = streaming_test_rows(df, feature_info['test_size'], feature_info['random_state'])
+        test_rows = labeled_rows(df).iloc[idx_test]
+        y = test_rows[TARGET_COLUMN].to_numpy(dtype=np.int64)
+        X = preprocessors['scaler'].transform(encode_frame(test_rows, preprocessors))
+    else:
+        features = build_features(data_path, address_bits=address_bits)
+        preprocessors, y, X = features.preprocessors, features.y_test, features.X_test
+        test_rows = labeled_rows(df).iloc[features.idx_test]
+    X = np.ascontiguousarray(X)
+    half = X.shape[0] // 2
+    raw_report = np.ascontiguousarray(encode_frame(test_rows.iloc[half:], preprocessors))
+    split = (preprocessors, X[:half], y[:half], X[half:], y[half:], raw_report)
+    if splits is not None:
+        splits[key] = split
+    return split
+
+def print_report(name, report):
+    for label in ('original', 'compact'):
+        entry = report[label]
+        print(f"  {name} {label:8s} {entry['size_bytes'] / 1024:10.1f} KiB  acurácia={entry['accuracy']:.4f}  "
+              f"{entry['us_per_row']:8.3f} us/linha  ({entry['path']})")
+    print(f"  Diferença de acurácia: {report['accuracy_delta']:+.4f}, concordância com o original: {report['compact']['agreement']:.4f}, "
+          f"tamanho: {report['size_ratio']:.2f}x, velocidade: {report['speedup']:.1f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exporta versões compactas (NN int8, RF podada) dos modelos para inferência em NumPy.')
+    parser.add_argument('--tables', type=str, nargs='+', default=['ethernet', 'ipv4'], help='Tabelas a exportar.')
+    parser.add_argument('--models', type=str, nargs='+', default=['nn', 'rf'], choices=['nn', 'rf'], help='Modelos a compactar.')
+    parser.add_argument('--models_dir', type=str, default='models', help='Diretório dos modelos treinados.')
+    parser.add_argument('--address_bits', action='store_true', help='Features com bits de dst_mac/dst_ip (como no treinamento).')
+    parser.add_argument('--depths', type=int, nargs='+', default=[4, 6, 8, 10, 12, 16], help='Profundidades máximas testadas na RF.')
+    parser.add_argument('--tree_counts', type=int, nargs='+', default=[5, 10, 25, 50], help='Números de árvores testados na RF.')
+    parser.add_argument('--tolerance', type=float, default=0.002, help='Perda de acurácia aceita na RF compacta.')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 64, 4096], help='Tamanhos de lote do benchmark.')
+    args = parser.parse_args()
+
+    from data_collection.columnar import find_table
+
+    os.makedirs('evaluation', exist_ok=True)
+    for table in args.tables:
+        data_path = find_table("processed_data", f"processed_{table}_data")
+        if not os.path.exists(data_path):
+            print(f"Dados para {table}_table não encontrados em {data_path}. Pulando.")
+            continue
+        splits = {}
+
+        reports = {}
+        print(f"\n--- Tabela {table} ---")
+        if 'nn' in args.models:
+            model_path = os.path.join(args.models_dir, f'neural_network_{table}.h5')
+            if os.path.exists(model_path):
+                preprocessors, _, _, X_report, y_report, raw_report = evaluation_split(data_path, model_path, args.address_bits, splits)
+                reports['nn'] = quantize_neural_network(model_path, os.path.join(args.models_dir, f'neural_network_{table}_int8.npz'),
+                                                        preprocessors, X_report, y_report, raw_report, args.batch_sizes)
+                print_report('NN', reports['nn'])
+            else:
+                print(f"Modelo não encontrado em {model_path}. Pulando.")
+        if 'rf' in args.models:
+            model_path = os.path.join(args.models_dir, f'random_forest_{table}.pkl')
+            if os.path.exists(model_path):
+                preprocessors, X_select, y_select, X_report, y_report, raw_report = evaluation_split(data_path, model_path, args.address_bits, splits)
+                reports['rf'] = compact_random_forest(model_path, os.path.join(args.models_dir, f'random_forest_{table}_compact.npz'),
+                                                      preprocessors, X_select, y_select, X_report, y_report, raw_report,
+                                                      args.depths, args.tree_counts, args.tolerance, args.batch_sizes)
+                chosen = reports['rf']['chosen']
+                print(f"  RF: profundidade {chosen['depth']}, {chosen['n_trees']} árvores (acurácia de escolha {chosen['accuracy']:.4f})")
+                print_report('RF', reports['rf'])
+            else:
+                print(f"Modelo não encontrado em {model_path}. Pulando.")
+
+        report_path = os.path.join('evaluation', f'compact_export_{table}.json')
+        with open(report_path, 'w') as f:
+            json.dump(reports, f, indent=4)
+        print(f"Relatório salvo em {report_path}")
@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.columnar import read_columns
+from data_collection.features import TARGET_COLUMN, build_features, transform_features
+from data_collection.snapshots import (DEFAULT_SNAPSHOT_DIR, diff_counts, diff_snapshots, latest_version, snapshot_path,
+                                       snapshot_rows, version_info, version_name)
+from models.model_registry import MODEL_FILES
+from instrumentation import add_rows, phase, stage
+
+# Atualização dos modelos a partir dos snapshots (data_collection/snapshots.py):
+# apenas as entradas incluídas ou alteradas desde a última versão treinada são
+# transformadas em features, junto com uma amostra de reposição das demais
+# linhas (para o modelo não esquecer o restante da tabela). A Random Forest
+# ganha árvores novas treinadas nesse conjunto (warm_start) no lugar das mais
+# antigas, a regressão logística parte dos coeficientes atuais e a rede neural
+# é ajustada por algumas épocas com taxa de aprendizado menor. O treinamento
+# completo só acontece quando a tabela se afasta demais da versão do último
+# treinamento completo (fração de entradas alteradas ou mudança na distribuição
+# das portas acima do limite) ou quando o conjunto de portas muda. A acurácia
+# antes/depois é medida fora do conjunto da atualização: uma fração das linhas
+# alteradas fica de fora do ajuste, e a amostra da tabela exclui as linhas usadas.
+DRIFT_THRESHOLD = 0.2
+STATE_FILE = 'delta_state_{table}.json'
+PREPROCESSORS_FILE = 'delta_preprocessors_{table}.pkl'
+HISTORY_LENGTH = 50
+
+def _state_path(models_dir, table):
+    return os.path.join(models_dir, STATE_FILE.format(table=table))
+
+def load_state(models_dir, table):
+    path = _state_path(models_dir, table)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _save_state(models_dir, table, state):
+    path = _state_path(models_dir, table)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+def _labels(snapshot_dir, table, version, positions=None):
+    labels = read_columns(snapshot_path(snapshot_dir, table, version), [TARGET_COLUMN])[TARGET_COLUMN]
+    labels = np.asarray(labels if positions is None else labels[np.asarray(positions, dtype=np.int64)])
+    return labels[~np.isnan(labels)].astype(np.int64)
+
+def class_counts(labels):
+    classes, counts = np.unique(labels, return_counts=True)
+    return {str(c): int(n) for c, n in zip(classes, counts)}
+
+def _add_counts(counts, labels, sign):
+    counts = dict(counts)
+    for c, n in class_counts(labels).items():
+        counts[c] = counts.get(c, 0) + sign * n
+    return {c: n for c, n in counts.items() if n}
+
+def label_shift(base_counts, counts):
+    # Distância de variação total entre as distribuições de portas
+    classes = set(base_counts) | set(counts)
+    base_total = max(sum(base_counts.values()), 1)
+    total = max(sum(counts.values()), 1)
+    return 0.5 * sum(abs(base_counts.get(c, 0) / base_total - counts.get(c, 0) / total) for c in classes)
+
+def measure_drift(snapshot_dir, table, state, version):
+    # Diff em relação à última versão treinada (as linhas a atualizar) e em
+    # relação à base do último treinamento completo (o afastamento acumulado)
+    step = diff_snapshots(snapshot_dir, table, state['trained_version'], version)
+    from_base = diff_counts(diff_snapshots(snapshot_dir, table, state['base_version'], version))
+    counts = _add_counts(state['class_counts'], _labels(snapshot_dir, table, state['trained_version'],
+                                                        np.concatenate([step['removed'], step['modified_old']])), -1)
+    counts = _add_counts(counts, _labels(snapshot_dir, table, version, np.concatenate([step['added'], step['modified_new']])), 1)
+    drift = {
+        'change_fraction': sum(from_base.values()) / max(version_info(snapshot_dir, table, state['base_version'])['rows'], 1),
+        'label_shift': label_shift(state['base_class_counts'], counts),
+        'new_classes': sorted(set(counts) - set(state['base_class_counts']), key=int),
+        'vanished_classes': sorted(set(state['base_class_counts']) - set(counts), key=int),
+    }
+    return drift, step, counts
+
+def _trainer(kind):
+    if kind == 'nn':
+        from models.train_neural_network import train_nn_model
+        return train_nn_model
+    if kind == 'rf':
+        from models.train_random_forest import train_rf_model
+        return train_rf_model
+    from models.train_ml_model import train_lr_model
+    return train_lr_model
+
+def full_retrain(table, snapshot_dir, version, models_dir, kinds, address_bits=False):
+    import joblib
+    data_path = snapshot_path(snapshot_dir, f'{table}_table', version)
+    seconds = {}
+    for kind in kinds:
+        start = time.perf_counter()
+        _trainer(kind)(data_path, os.path.join(models_dir, MODEL_FILES[kind].format(table=table)), address_bits=address_bits)
+        seconds[kind] = time.perf_counter() - start
+    # Encoder e scaler usados pelos modelos, para as próximas atualizações
+    joblib.dump(build_features(data_path, address_bits=address_bits).preprocessors,
+                os.path.join(models_dir, PREPROCESSORS_FILE.format(table=table)))
+    return seconds
+
+def delta_rows(snapshot_dir, table, version, step, preprocessors, replay_ratio=4.0, rng=None):
+    # Features das linhas incluídas/alteradas e de uma amostra (com reposição)
+    # das demais; retorna (X, y, máscara das linhas alteradas, posições na versão)
+    rng = rng or np.random.default_rng(42)
+    changed = np.concatenate([step['added'], step['modified_new']])
+    rows = version_info(snapshot_dir, table, version)['rows']
+    replay = rng.integers(0, rows, size=min(int(replay_ratio * len(changed)), rows)) if rows else np.zeros(0, dtype=np.int64)
+    positions = np.concatenate([changed, replay])
+    df = snapshot_rows(snapshot_dir, table, version, positions)
+    y = pd.to_numeric(df[TARGET_COLUMN], errors='coerce')
+    labeled = y.notna().to_numpy()
+    X = transform_features(df[labeled], preprocessors)
+    return X, y[labeled].to_numpy(dtype=np.int64), (np.arange(len(df)) < len(changed))[labeled], positions[labeled]
+
+def with_all_classes(snapshot_dir, table, version, X, y, classes, preprocessors):
+    # warm_start do sklearn exige as mesmas classes do primeiro ajuste: uma linha
+    # de cada classe ausente do conjunto é acrescentada
+    missing = np.setdiff1d(classes, y)
+    if not len(missing):
+        return X, y
+    labels = np.asarray(read_columns(snapshot_path(snapshot_dir, table, version), [TARGET_COLUMN])[TARGET_COLUMN])
+    positions = np.flatnonzero(np.isin(labels, missing))
+    _, first = np.unique(labels[positions], return_index=True)
+    df = snapshot_rows(snapshot_dir, table, version, positions[first])
+    return (np.vstack([X, transform_features(df, preprocessors)]),
+            np.concatenate([y, pd.to_numeric(df[TARGET_COLUMN]).to_numpy(dtype=np.int64)]))
+
+def warm_start_forest(model, X, y, new_trees):
+    # Árvores novas no conjunto da atualização; as mais antigas saem, de modo
+    # que o tamanho da floresta não muda
+    n_trees = len(model.estimators_)
+    model.set_params(warm_start=True, n_estimators=n_trees + new_trees)
+    model.fit(X, y)
+    model.estimators_ = model.estimators_[-n_trees:]
+    model.set_params(n_estimators=n_trees, warm_start=False)
+    return model
+
+def warm_start_linear(model, X, y):
+    model.set_params(warm_start=True)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return model
+
+def fine_tune_nn(model, X, y, epochs=5, learning_rate=1e-4, batch_size=32):
+    from tensorflow.keras.optimizers import Adam
+    from tensorflow.keras.utils import to_categorical
+    model.compile(optimizer=Adam(learning_rate=learning_rate), loss='categorical_crossentropy', metrics=['accuracy'])
+    model.fit(X, to_categorical(y, num_classes=model.output_shape[-1]), epochs=epochs, batch_size=batch_size, verbose=0)
+    return model
+
+def _predict(kind, model, X):
+    if kind == 'nn':
+        return np.argmax(np.asarray(model(X.astype(np.float32), training=False)), axis=1)
+    return model.predict(X)
+
+def _accuracy(kind, model, X, y):
+    return float((_predict(kind, model, X) == y).mean()) if len(y) else 1.0
+
+def delta_update(table, snapshot_dir, version, step, models_dir, kinds, replay_ratio=4.0, tree_fraction=0.25,
+                 nn_epochs=5, nn_learning_rate=1e-4, eval_rows=20000, holdout_fraction=0.2, seed=42):
+    import joblib
+    snapshot_table = f'{table}_table'
+    rng = np.random.default_rng(seed)
+    preprocessors = joblib.load(os.path.join(models_dir, PREPROCESSORS_FILE.format(table=table)))
+    seconds = {}
+    start = time.perf_counter()
+    with phase('features'):
+        X, y, changed, positions = delta_rows(snapshot_dir, snapshot_table, version, step, preprocessors, replay_ratio, rng)
+        # Linhas alteradas separadas para avaliação (não entram no ajuste)
+        held = changed & (rng.random(len(y)) < holdout_fraction)
+        X_held, y_held = X[held], y[held]
+        X, y = X[~held], y[~held]
+        # Amostra da versão atual, sem as linhas do ajuste, para comparar a acurácia antes e depois
+        rows = version_info(snapshot_dir, snapshot_table, version)['rows']
+        candidates = rng.integers(0, rows, size=min(eval_rows, rows))
+        candidates = candidates[~np.isin(candidates, positions[~held])]
+        sample = snapshot_rows(snapshot_dir, snapshot_table, version, candidates)
+        sample = sample[pd.to_numeric(sample[TARGET_COLUMN], errors='coerce').notna()]
+        X_sample, y_sample = transform_features(sample, preprocessors), pd.to_numeric(sample[TARGET_COLUMN]).to_numpy(dtype=np.int64)
+    add_rows(len(y))
+    seconds['features'] = time.perf_counter() - start
+
+    accuracy = {}
+    for kind in kinds:
+        start = time.perf_counter()
+        model_path = os.path.join(models_dir, MODEL_FILES[kind].format(table=table))
+        if kind == 'nn':
+            from tensorflow.keras.models import load_model
+            model = load_model(model_path)
+        else:
+            model = joblib.load(model_path)
+        before = _accuracy(kind, model, X_held, y_held), _accuracy(kind, model, X_sample, y_sample)
+        if kind == 'nn':
+            fine_tune_nn(model, X, y, nn_epochs, nn_learning_rate)
+            model.save(model_path)
+        else:
+            X_fit, y_fit = with_all_classes(snapshot_dir, snapshot_table, version, X, y, model.classes_, preprocessors)
+            if kind == 'rf':
+                warm_start_forest(model, X_fit, y_fit, max(1, math.ceil(len(model.estimators_) * tree_fraction)))
+            else:
+                warm_start_linear(model, X_fit, y_fit)
+            joblib.dump(model, model_path)
+        after = _accuracy(kind, model, X_held, y_held), _accuracy(kind, model, X_sample, y_sample)
+        accuracy[kind] = {'changed_before': before[0], 'changed_after': after[0], 'sample_before': before[1], 'sample_after': after[1]}
+        seconds[kind] = time.perf_counter() - start
+    return {'rows': int(len(y)), 'changed_rows': int(changed.sum()), 'held_out_rows': int(held.sum()),
+            'sample_rows': int(len(y_sample)), 'accuracy': accuracy, 'seconds': seconds}
+
+@stage('delta_training', target='table')
+def update_models(table, snapshot_dir=DEFAULT_SNAPSHOT_DIR, models_dir='models', kinds=('rf', 'nn'), address_bits=False,
+                  threshold=DRIFT_THRESHOLD, **delta_params):
+    # table: 'ethernet' ou 'ipv4'. Retorna o relatório da atualização (ou None sem snapshots)
+    snapshot_table = f'{table}_table'
+    version = latest_version(snapshot_dir, snapshot_table)
+    if version is None:
+        print(f"Nenhum snapshot da {snapshot_table} em {snapshot_dir}. Pulando.")
+        return None
+    state = load_state(models_dir, table)
+    if state is not None and state['trained_version'] == version and set(kinds) <= set(state['models']):
+        print(f"{snapshot_table}: modelos já treinados com {version_name(version)}.")
+        return {'mode': 'none', 'version': version}
+
+    start = time.perf_counter()
+    report = {'version': version}
+    reason = None
+    if state is None:
+        reason = 'sem treinamento anterior'
+    elif state['address_bits'] != address_bits or not set(kinds) <= set(state['models']):
+        reason = 'parâmetros diferentes do último treinamento'
+    elif not all(os.path.exists(os.path.join(models_dir, MODEL_FILES[kind].format(table=table))) for kind in kinds):
+        reason = 'modelo ausente'
+    else:
+        try:
+            drift, step, counts = measure_drift(snapshot_dir, snapshot_table, state, version)
+        except (KeyError, FileNotFoundError):
+            drift = None
+            reason = 'versão anterior não disponível'
+        if drift is not None:
+            report['drift'] = drift
+            report['changes'] = diff_counts(step)
+            if drift['new_classes'] or drift['vanished_classes']:
+                reason = 'conjunto de portas alterado'
+            elif max(drift['change_fraction'], drift['label_shift']) > threshold:
+                reason = f"drift acima de {threshold}"
+
+    if reason is None:
+        print(f"{snapshot_table}: atualização incremental {version_name(state['trained_version'])} -> {version_name(version)} "
+              f"(+{report['changes']['added']} -{report['changes']['removed']} ~{report['changes']['modified']})")
+        report.update(delta_update(table, snapshot_dir, version, step, models_dir, kinds, **delta_params))
+        report['mode'] = 'delta'
+        state['trained_version'] = version
+        state['class_counts'] = counts
+    else:
+        print(f"{snapshot_table}: treinamento completo com {version_name(version)} ({reason})")
+        report['seconds'] = full_retrain(table, snapshot_dir, version, models_dir, kinds, address_bits)
+        report['mode'] = 'full'
+        report['reason'] = reason
+        counts = class_counts(_labels(snapshot_dir, snapshot_table, version))
+        state = {'base_version': version, 'trained_version': version, 'address_bits': address_bits, 'models': list(kinds),
+                 'base_class_counts': counts, 'class_counts': counts, 'history': (state or {}).get('history', [])}
+    report['total_seconds'] = time.perf_counter() - start
+    state['history'] = (state['history'] + [report])[-HISTORY_LENGTH:]
+    _save_state(models_dir, table, state)
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Atualiza os modelos com as alterações entre snapshots (treinamento completo só com drift).')
+    parser.add_argument('--snapshot_dir', type=str, default=DEFAULT_SNAPSHOT_DIR, help='Diretório dos snapshots.')
+    parser.add_argument('--models_dir', type=str, default='models', help='Diretório dos modelos.')
+    parser.add_argument('--tables', type=str, nargs='+', default=['ethernet', 'ipv4'], help='Tabelas a atualizar.')
+    parser.add_argument('--models', type=str, nargs='+', default=['rf', 'nn'], choices=list(MODEL_FILES), help='Modelos a atualizar.')
+    parser.add_argument('--address_bits', action='store_true', help='Usa os bits de dst_mac/dst_ip (e prefixos mascarados) como features.')
+    parser.add_argument('--threshold', type=float, default=DRIFT_THRESHOLD, help='Drift (fração alterada ou mudança na distribuição das portas) que força o treinamento completo.')
+    parser.add_argument('--replay_ratio', type=float, default=4.0, help='Linhas não alteradas amostradas por linha alterada.')
+    parser.add_argument('--tree_fraction', type=float, default=0.25, help='Fração das árvores da RF substituída a cada atualização.')
+    parser.add_argument('--nn_epochs', type=int, default=5, help='Épocas do ajuste fino da rede neural.')
+    parser.add_argument('--nn_learning_rate', type=float, default=1e-4, help='Taxa de aprendizado do ajuste fino.')
+    parser.add_argument('--holdout_fraction', type=float, default=0.2, help='Fração das linhas alteradas deixada fora do ajuste para medir a acurácia.')
+    parser.add_argument('--force', action='store_true', help='Treinamento completo mesmo sem drift.')
+    args = parser.parse_args()
+
+    os.makedirs('evaluation', exist_ok=True)
+    for table in args.tables:
+        threshold = -1.0 if args.force else args.threshold
+        report = update_models(table, args.snapshot_dir, args.models_dir, args.models, args.address_bits, threshold,
+                               replay_ratio=args.replay_ratio, tree_fraction=args.tree_fraction,
+                               nn_epochs=args.nn_epochs, nn_learning_rate=args.nn_learning_rate, holdout_fraction=args.holdout_fraction)
+        if report is None or report['mode'] == 'none':
+            continue
+        for kind, accuracy in report.get('accuracy', {}).items():
+            print(f"  {kind}: acurácia nas linhas alteradas fora do ajuste {accuracy['changed_before']:.4f} -> {accuracy['changed_after']:.4f}, "
+                  f"na amostra da tabela fora do ajuste {accuracy['sample_before']:.4f} -> {accuracy['sample_after']:.4f}")
+        print(f"  Concluído em {report['total_seconds']:.2f}s")
+        with open(os.path.join('evaluation', f'delta_training_{table}.json'), 'w') as f:
+            json.dump(report, f, indent=4)
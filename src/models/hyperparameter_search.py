@@ -0,0 +1,279 @@
+import numpy as np
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.columnar import find_table
+from data_collection.features import build_features
+
+# Busca de hiperparâmetros com validação cruzada em um pool de processos. As
+# matrizes normalizadas vêm do cache de features (arquivos .npy) e os folds são
+# gravados ao lado delas: cada processo abre tudo com mmap, sem cópias pelo pool.
+# RF e LR usam successive halving (as configurações sobreviventes recebem cada
+# vez mais linhas de treino); a NN usa EarlyStopping em cada fold, monitorando
+# uma parte das linhas de treino do fold (o fold de validação só é usado na nota).
+SEARCH_SPACES = {
+    'rf': {'n_estimators': [25, 50, 100, 200], 'max_depth': [None, 12, 24], 'min_samples_leaf': [1, 4]},
+    'lr': {'C': [0.01, 0.1, 1.0, 10.0, 100.0], 'max_iter': [200, 1000]},
+    'nn': {'units': [[32], [64, 32], [128, 64]], 'learning_rate': [0.001, 0.003], 'batch_size': [32, 256]},
+}
+TUNING_DIR = 'evaluation'
+
+def search_space(kind, max_configs=None, seed=42):
+    # Todas as combinações da grade (ou uma amostra de max_configs delas)
+    grid = SEARCH_SPACES[kind]
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    if max_configs and len(configs) > max_configs:
+        rows = np.random.default_rng(seed).choice(len(configs), max_configs, replace=False)
+        configs = [configs[i] for i in sorted(rows)]
+    return configs
+
+def prepare_folds(features, n_folds=3, seed=42):
+    # Fold de cada linha de treino, estratificado por classe; gravado uma vez no diretório do cache
+    folds_path = os.path.join(features.cache_path, f'folds_{n_folds}_{seed}.npy')
+    if not os.path.exists(folds_path):
+        y = np.asarray(features.y_train)
+        order = np.lexsort((np.random.default_rng(seed).random(len(y)), y))
+        folds = np.empty(len(y), dtype=np.int8)
+        folds[order] = np.arange(len(y)) % n_folds
+        tmp_path = f'{folds_path}.tmp{os.getpid()}.npy'
+        np.save(tmp_path, folds)
+        os.replace(tmp_path, folds_path)
+    return folds_path
+
+def _fold_rows(folds_path, fold, n_rows=None):
+    # Linhas de treino e validação do fold; n_rows limita o treino às primeiras
+    # linhas (X_train já vem embaralhado de train_test_split)
+    folds = np.load(folds_path, mmap_mode='r')
+    train = np.flatnonzero(folds != fold)
+    if n_rows is not None:
+        train = train[:n_rows]
+    return train, np.flatnonzero(folds == fold)
+
+def evaluate_config(kind, params, cache_path, folds_path, fold, n_rows=None, max_epochs=50, patience=5, validation_split=0.1, threads=None):
+    # Treina uma configuração em um fold e mede acurácia e latência de predição na validação
+    X = np.load(os.path.join(cache_path, 'X_train.npy'), mmap_mode='r')
+    y = np.load(os.path.join(cache_path, 'y_train.npy'), mmap_mode='r')
+    train, val = _fold_rows(folds_path, fold, n_rows)
+    X_train, y_train, X_val, y_val = X[train], y[train], X[val], y[val]
+    result = {'params': params, 'fold': fold, 'rows': len(train)}
+
+    start = time.perf_counter()
+    if kind == 'nn':
+        import tensorflow as tf
+        from tensorflow.keras.callbacks import EarlyStopping
+        from tensorflow.keras.utils import to_categorical
+        from models.train_neural_network import build_nn_model
+        if threads:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(threads)
+        n_classes = int(y.max()) + 1
+        model = build_nn_model(X.shape[1], n_classes, params)
+        stop = EarlyStopping(monitor='val_loss', patience=patience, restore_best_weights=True)
+        # A parada antecipada usa as últimas linhas de treino do fold (X_train já vem
+        # embaralhado), não X_val: a acurácia do fold continua sendo fora da amostra
+        history = model.fit(X_train, to_categorical(y_train, n_classes), epochs=max_epochs, batch_size=params['batch_size'],
+                            validation_split=validation_split, callbacks=[stop], verbose=0)
+        # Época com a menor perda de validação (pesos restaurados por restore_best_weights)
+        result['epochs'] = int(np.argmin(history.history['val_loss'])) + 1
+        predict = lambda X: np.argmax(model.predict(X, batch_size=4096, verbose=0), axis=1)
+    else:
+        if kind == 'rf':
+            from models.train_random_forest import build_rf_model as build
+        else:
+            from models.train_ml_model import build_lr_model as build
+        model = build(params)
+        model.fit(X_train, y_train)
+        predict = model.predict
+    result['fit_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = predict(X_val)
+    elapsed = time.perf_counter() - start
+    result['accuracy'] = float(np.mean(y_pred == y_val)) if len(y_val) else float('nan')
+    result['latency_per_row_us'] = elapsed / max(len(y_val), 1) * 1e6
+    return result
+
+def _search_pool(workers, deadline=None):
+    # Com um processo só e sem prazo, as tarefas rodam no próprio processo; com
+    # prazo, mesmo um único treino roda em um pool de 1 processo, para que possa
+    # ser interrompido quando o tempo acaba
+    if workers <= 1 and deadline is None:
+        return None
+    # fork é mais rápido, mas não é seguro depois que o TensorFlow foi importado neste processo.
+    # multiprocessing.Pool (e não ProcessPoolExecutor) para poder encerrar os
+    # processos no meio de um treino quando o prazo acaba
+    method = 'spawn' if 'tensorflow' in sys.modules else 'fork'
+    return multiprocessing.get_context(method).Pool(max(workers, 1))
+
+def _run_tasks(pool, tasks, deadline):
+    # Executa (no pool ou, sem prazo, no próprio processo) e retorna os resultados
+    # concluídos antes do prazo; no fim do prazo o pool é encerrado, interrompendo
+    # os treinos em andamento (o pool não pode mais ser usado depois disso)
+    if pool is None:
+        return [evaluate_config(**task) for task in tasks]
+    pending = [pool.apply_async(evaluate_config, kwds=task) for task in tasks]
+    for result in pending:
+        result.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    results = [result.get() for result in pending if result.ready()]
+    if len(results) < len(pending):
+        pool.terminate()
+    return results
+
+def aggregate(results, n_folds):
+    # Média por configuração, apenas das configurações avaliadas em todos os folds
+    grouped = {}
+    for result in results:
+        grouped.setdefault(json.dumps(result['params'], sort_keys=True), []).append(result)
+    summary = []
+    for runs in grouped.values():
+        if len(runs) < n_folds:
+            continue
+        entry = {
+            'params': runs[0]['params'],
+            'rows': runs[0]['rows'],
+            'accuracy': float(np.mean([run['accuracy'] for run in runs])),
+            'accuracy_std': float(np.std([run['accuracy'] for run in runs])),
+            'latency_per_row_us': float(np.mean([run['latency_per_row_us'] for run in runs])),
+            'fit_seconds': float(np.mean([run['fit_seconds'] for run in runs])),
+        }
+        if 'epochs' in runs[0]:
+            entry['epochs'] = int(round(np.mean([run['epochs'] for run in runs])))
+        summary.append(entry)
+    # Melhor acurácia primeiro; empates decididos pela latência
+    return sorted(summary, key=lambda entry: (-entry['accuracy'], entry['latency_per_row_us']))
+
+def rank(summary, tolerance=0.005):
+    # Configurações a até `tolerance` da melhor acurácia são equivalentes e ordenadas
+    # pela latência (a mais rápida primeiro); as demais vêm depois, pela acurácia
+    top = max(entry['accuracy'] for entry in summary)
+    return sorted(summary, key=lambda entry: (0, entry['latency_per_row_us']) if entry['accuracy'] >= top - tolerance else (1, -entry['accuracy']))
+
+def successive_halving(pool, kind, configs, cache_path, folds_path, n_folds, n_train, eta=3, min_rows=1000, deadline=None, threads=None, tolerance=0.005):
+    # Cada rodada avalia as configurações restantes com eta vezes mais linhas e
+    # mantém a melhor fração 1/eta; a última rodada usa todas as linhas de treino
+    # e compara as poucas finalistas (fronteira acurácia/latência do relatório)
+    rounds = max(1, math.ceil(math.log(max(len(configs), 1), eta)))
+    rounds = min(rounds, 1 + max(0, int(math.log(max(n_train / min_rows, 1), eta))))
+    history = []
+    for r in range(rounds):
+        n_rows = n_train if r == rounds - 1 else int(n_train / eta ** (rounds - 1 - r))
+        tasks = [dict(kind=kind, params=params, cache_path=cache_path, folds_path=folds_path, fold=fold, n_rows=n_rows, threads=threads)
+                 for params in configs for fold in range(n_folds)]
+        summary = aggregate(_run_tasks(pool, tasks, deadline), n_folds)
+        if not summary:
+            break
+        history.append(summary)
+        print(f"Rodada {r + 1}/{rounds}: {len(summary)} configurações com {summary[0]['rows']} linhas; melhor acurácia {summary[0]['accuracy']:.4f}")
+        if deadline is not None and time.monotonic() >= deadline:
+            print("Tempo da busca esgotado.")
+            break
+        configs = [entry['params'] for entry in rank(summary, tolerance)[:max(1, math.ceil(len(summary) / eta))]]
+    return history
+
+def pareto_front(summary):
+    # Configurações sem outra ao mesmo tempo mais precisa e mais rápida
+    front = []
+    best_accuracy = -np.inf
+    for entry in sorted(summary, key=lambda entry: (entry['latency_per_row_us'], -entry['accuracy'])):
+        if entry['accuracy'] > best_accuracy:
+            front.append(entry)
+            best_accuracy = entry['accuracy']
+    return front
+
+def print_summary(summary, best, front):
+    print(f"{'acurácia':>9s} {'±':>7s} {'lat. (µs)':>10s} {'treino (s)':>10s}  parâmetros")
+    for entry in summary:
+        mark = '*' if entry is best else ('P' if entry in front else ' ')
+        extra = f" epochs={entry['epochs']}" if 'epochs' in entry else ''
+        print(f"{entry['accuracy']:9.4f} {entry['accuracy_std']:7.4f} {entry['latency_per_row_us']:10.2f} {entry['fit_seconds']:10.2f} {mark} {entry['params']}{extra}")
+    print("* escolhida (mais rápida dentro da tolerância de acurácia), P fronteira acurácia/latência")
+
+def tune(kind, data_path, address_bits=False, n_folds=3, workers=None, time_budget=None, max_configs=None, eta=3,
+         min_rows=1000, max_epochs=50, patience=5, tolerance=0.005, seed=42, report_path=None):
+    # Retorna os melhores hiperparâmetros (com 'epochs' para a NN) e grava o relatório da busca
+    start = time.monotonic()
+    deadline = start + time_budget if time_budget else None
+    features = build_features(data_path, address_bits=address_bits)
+    folds_path = prepare_folds(features, n_folds, seed)
+    configs = search_space(kind, max_configs, seed)
+    workers = workers or os.cpu_count() or 1
+    # Vários processos: uma thread por processo, para não disputar os núcleos
+    threads = 1 if workers > 1 else None
+    n_train = len(_fold_rows(folds_path, 0)[0])
+    print(f"Busca de hiperparâmetros ({kind}): {len(configs)} configurações, {n_folds} folds, {workers} processo(s).")
+
+    pool = _search_pool(workers, deadline)
+    try:
+        if kind == 'nn':
+            tasks = [dict(kind=kind, params=params, cache_path=features.cache_path, folds_path=folds_path, fold=fold,
+                          max_epochs=max_epochs, patience=patience, threads=threads)
+                     for params in configs for fold in range(n_folds)]
+            history = [aggregate(_run_tasks(pool, tasks, deadline), n_folds)]
+        else:
+            history = successive_halving(pool, kind, configs, features.cache_path, folds_path, n_folds, n_train,
+                                         eta, min_rows, deadline, threads, tolerance)
+    finally:
+        if pool is not None:
+            # Todas as tarefas já terminaram ou foram abandonadas no prazo
+            pool.terminate()
+            pool.join()
+
+    history = [summary for summary in history if summary]
+    if not history:
+        print("Nenhuma configuração concluída dentro do tempo; usando os hiperparâmetros padrão.")
+        return None
+    summary = history[-1]
+    best = rank(summary, tolerance)[0]
+    front = pareto_front(summary)
+    print_summary(summary, best, front)
+
+    report = {
+        'kind': kind,
+        'data_path': data_path,
+        'n_folds': n_folds,
+        'workers': workers,
+        'time_budget': time_budget,
+        'elapsed_seconds': time.monotonic() - start,
+        'best': best,
+        'pareto_front': front,
+        'rounds': history,
+    }
+    report_path = report_path or os.path.join(TUNING_DIR, f"tuning_{kind}_{os.path.splitext(os.path.basename(data_path))[0]}.json")
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Relatório da busca salvo em {report_path} ({report['elapsed_seconds']:.1f}s)")
+
+    params = dict(best['params'])
+    if 'epochs' in best:
+        params['epochs'] = best['epochs']
+    return params
+
+def tune_params(kind, data_path, args):
+    # Atalho para as CLIs dos treinadores (--tune, --folds, --workers, --time_budget)
+    return tune(kind, data_path, address_bits=args.address_bits, n_folds=args.folds, workers=args.workers,
+                time_budget=args.time_budget, max_epochs=getattr(args, 'epochs', 50))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Busca de hiperparâmetros com validação cruzada em paralelo.')
+    parser.add_argument('--model', type=str, default='rf', choices=sorted(SEARCH_SPACES), help='Modelo a ajustar.')
+    parser.add_argument('--data_path', type=str, default=None, help='Tabela pré-processada (padrão: processed_data/processed_ipv4_data).')
+    parser.add_argument('--address_bits', action='store_true', help='Usa os bits de dst_mac/dst_ip (e prefixos mascarados) como features.')
+    parser.add_argument('--folds', type=int, default=3, help='Número de folds da validação cruzada.')
+    parser.add_argument('--workers', type=int, default=None, help='Processos da busca (padrão: todos os núcleos).')
+    parser.add_argument('--time_budget', type=float, default=None, help='Tempo máximo (s) da busca.')
+    parser.add_argument('--max_configs', type=int, default=None, help='Amostra aleatória de configurações da grade.')
+    parser.add_argument('--epochs', type=int, default=50, help='Épocas máximas por configuração da NN (EarlyStopping).')
+    parser.add_argument('--tolerance', type=float, default=0.005, help='Perda de acurácia aceita em troca de menor latência.')
+    args = parser.parse_args()
+
+    data_path = args.data_path or find_table("processed_data", "processed_ipv4_data")
+    tune(args.model, data_path, address_bits=args.address_bits, n_folds=args.folds, workers=args.workers,
+         time_budget=args.time_budget, max_configs=args.max_configs, max_epochs=args.epochs, tolerance=args.tolerance)
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+# Registro de modelos com carga preguiçosa: cada arquivo é carregado (e o
+# TensorFlow ou o sklearn importado) apenas na primeira vez que o modelo é
+# pedido, e reaproveitado depois disso.
+MODEL_FILES = {
+    'nn': 'neural_network_{table}.h5',
+    'rf': 'random_forest_{table}.pkl',
+    'lr': 'logistic_regression_{table}.pkl',
+}
+
+def model_kind(path):
+    if path.endswith('.h5') or path.endswith('.keras'):
+        return 'keras'
+    if path.endswith('.npz'):
+        return 'numpy'
+    return 'sklearn'
+
+def load_model_file(path, scaled_input=False):
+    # Retorna (tipo, modelo); importa apenas a biblioteca necessária para o formato.
+    # scaled_input: as features já chegam normalizadas (modelos .npz não reaplicam o scaler)
+    kind = model_kind(path)
+    if kind == 'keras':
+        from tensorflow.keras.models import load_model
+        return kind, load_model(path)
+    if kind == 'numpy':
+        from models.numpy_inference import load_predictor
+        return kind, load_predictor(path, scaled_input)
+    import joblib
+    return kind, joblib.load(path)
+
+class ModelRegistry:
+    def __init__(self, paths=None, scaled_input=False):
+        self.paths = dict(paths or {})
+        self.scaled_input = scaled_input
+        self.load_seconds = {}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, models_dir='models', tables=('ethernet', 'ipv4')):
+        # Nomes no formato "<modelo>_<tabela>", por exemplo "rf_ipv4"
+        return cls({f'{key}_{table}': os.path.join(models_dir, pattern.format(table=table))
+                    for table in tables for key, pattern in MODEL_FILES.items()})
+
+    def register(self, name, path):
+        with self._lock:
+            self.paths[name] = path
+            self._models.pop(name, None)
+
+    def available(self):
+        return [name for name, path in self.paths.items() if path and os.path.exists(path)]
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name):
+        # (tipo, modelo), carregando o arquivo na primeira chamada
+        entry = self._models.get(name)
+        if entry is not None:
+            return entry
+        with self._lock:
+            if name not in self._models:
+                if name not in self.paths:
+                    raise KeyError(f"Modelo '{name}' não registrado.")
+                start = time.perf_counter()
+                self._models[name] = load_model_file(self.paths[name], self.scaled_input)
+                self.load_seconds[name] = time.perf_counter() - start
+            return self._models[name]
+
+    def model(self, name):
+        return self.get(name)[1]
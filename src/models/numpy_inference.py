@@ -0,0 +1,358 @@
+import numpy as np
+import argparse
+import json
+import os
+import sys
+import time
+
+# Inferência em NumPy puro para os modelos Random Forest, Regressão Logística e
+# para a rede neural (pesos quantizados em int8). O exportador lê apenas os
+# atributos dos modelos ajustados (tree_, coef_, pesos das camadas Dense), e os
+# preditores não importam o sklearn nem o TensorFlow: basta o arquivo .npz.
+
+def _scaler_arrays(scaler):
+    if scaler is None:
+        return {}
+    return {'scaler_mean': np.asarray(scaler.mean_, dtype=np.float64), 'scaler_scale': np.asarray(scaler.scale_, dtype=np.float64)}
+
+def _tree_nodes(tree, max_depth=None):
+    # Nós mantidos (em ordem, raiz primeiro) e filhos reindexados. Com max_depth,
+    # os nós nessa profundidade viram folhas com a distribuição de classes do
+    # próprio nó, e os nós abaixo deles são descartados.
+    left, right = tree.children_left, tree.children_right
+    depth = np.zeros(tree.node_count, dtype=np.int64)
+    frontier, level = np.array([0]), 0
+    while frontier.size:
+        depth[frontier] = level
+        frontier = frontier[left[frontier] != -1]
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        level += 1
+    nodes = np.flatnonzero(depth <= max_depth) if max_depth is not None else np.arange(tree.node_count)
+    new_id = np.full(tree.node_count, -1, dtype=np.int64)
+    new_id[nodes] = np.arange(len(nodes))
+    is_leaf = left[nodes] == -1
+    if max_depth is not None:
+        is_leaf |= depth[nodes] == max_depth
+    local = np.arange(len(nodes))
+    node_left = np.where(is_leaf, local, new_id[np.maximum(left[nodes], 0)])
+    node_right = np.where(is_leaf, local, new_id[np.maximum(right[nodes], 0)])
+    return nodes, node_left, node_right, is_leaf, int(depth[nodes].max())
+
+def _float32_thresholds(threshold):
+    # Maior float32 <= limiar: para x em float32, x <= t equivale a x <= t32
+    t32 = threshold.astype(np.float32)
+    above = t32.astype(np.float64) > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+def forest_arrays(model, max_depth=None, trees=None, compact=False):
+    # Achata todas as árvores em arrays contíguos de nós. As folhas apontam para
+    # si mesmas, de modo que a travessia pode rodar um número fixo de passos.
+    # max_depth limita a profundidade e trees escolhe (e ordena) as árvores
+    # mantidas; compact grava índices int32 e limiares/valores em float32.
+    lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+    offset = 0
+    forest_depth = 0
+    estimators = model.estimators_ if trees is None else [model.estimators_[t] for t in trees]
+    for estimator in estimators:
+        tree = estimator.tree_
+        nodes, node_left, node_right, is_leaf, depth = _tree_nodes(tree, max_depth)
+        lefts.append(node_left + offset)
+        rights.append(node_right + offset)
+        features.append(np.where(is_leaf, 0, tree.feature[nodes]))
+        thresholds.append(tree.threshold[nodes])
+
+        # Mesma normalização de DecisionTreeClassifier.predict_proba
+        value = tree.value[nodes, 0, :model.n_classes_].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value = value / normalizer
+        if compact:
+            # Só os valores das folhas são lidos na predição
+            value[~is_leaf] = 0.0
+        values.append(value)
+
+        roots.append(offset)
+        offset += len(nodes)
+        forest_depth = max(forest_depth, depth)
+
+    index_dtype = np.int32 if compact else np.int64
+    threshold = np.concatenate(thresholds).astype(np.float64)
+    value = np.concatenate(values)
+    return {
+        'kind': np.array('random_forest'),
+        'children_left': np.concatenate(lefts).astype(index_dtype),
+        'children_right': np.concatenate(rights).astype(index_dtype),
+        'feature': np.concatenate(features).astype(index_dtype),
+        'threshold': _float32_thresholds(threshold) if compact else threshold,
+        'value': value.astype(np.float32) if compact else value,
+        'roots': np.array(roots, dtype=index_dtype),
+        'max_depth': np.array(forest_depth),
+        'classes': np.asarray(model.classes_),
+        'n_features': np.array(model.n_features_in_),
+    }
+
+def export_random_forest(model, path, scaler=None, max_depth=None, trees=None, compact=False):
+    arrays = forest_arrays(model, max_depth, trees, compact)
+    arrays.update(_scaler_arrays(scaler))
+    if compact:
+        np.savez_compressed(path, **arrays)
+    else:
+        np.savez(path, **arrays)
+
+def export_logistic_regression(model, path, scaler=None):
+    arrays = {
+        'kind': np.array('logistic_regression'),
+        'coef': np.asarray(model.coef_, dtype=np.float64),
+        'intercept': np.asarray(model.intercept_, dtype=np.float64),
+        'classes': np.asarray(model.classes_),
+        'n_features': np.array(model.n_features_in_),
+    }
+    arrays.update(_scaler_arrays(scaler))
+    np.savez(path, **arrays)
+
+def export_model(model, path, scaler=None):
+    if hasattr(model, 'estimators_'):
+        export_random_forest(model, path, scaler)
+    elif hasattr(model, 'coef_'):
+        export_logistic_regression(model, path, scaler)
+    else:
+        raise ValueError(f"Modelo do tipo {type(model).__name__} não suportado pela exportação para NumPy.")
+
+def quantize_int8(kernel):
+    # Quantização simétrica por neurônio de saída: kernel ~= q * scale, q em [-127, 127]
+    scale = np.abs(kernel).max(axis=0) / 127.0
+    scale[scale == 0.0] = 1.0
+    q = np.clip(np.rint(kernel / scale), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+ACTIVATIONS = ('linear', 'relu', 'sigmoid', 'tanh', 'softmax')
+
+def export_quantized_nn(model, path, scaler=None):
+    # Camadas com pesos de um modelo Keras sequencial; camadas sem pesos
+    # (Dropout, por exemplo) não atuam na inferência e são ignoradas
+    layers = [layer for layer in model.layers if layer.get_weights()]
+    arrays = {'kind': np.array('quantized_mlp')}
+    activations = []
+    for i, layer in enumerate(layers):
+        weights = layer.get_weights()
+        activation = layer.get_config().get('activation')
+        if len(weights) != 2 or activation not in ACTIVATIONS:
+            raise ValueError(f"Camada {layer.name} ({type(layer).__name__}) não suportada pela exportação quantizada.")
+        kernel, bias = weights
+        arrays[f'kernel_{i}'], arrays[f'scale_{i}'] = quantize_int8(kernel)
+        arrays[f'bias_{i}'] = bias.astype(np.float32)
+        activations.append(activation)
+    arrays['activations'] = np.array(activations)
+    # Na rede neural o índice da saída é a própria porta
+    arrays['classes'] = np.arange(layers[-1].get_weights()[1].shape[0])
+    arrays['n_features'] = np.array(layers[0].get_weights()[0].shape[0])
+    arrays.update(_scaler_arrays(scaler))
+    np.savez(path, **arrays)
+
+class _Predictor:
+    # Com a média/escala do StandardScaler gravadas no arquivo, o preditor recebe
+    # as features sem normalização; scaled_input=True desliga essa etapa para
+    # quem já tem as matrizes normalizadas pelo sklearn (cache de features)
+    def __init__(self, arrays, scaled_input=False):
+        self.classes = arrays['classes']
+        self.n_features = int(arrays['n_features'])
+        self.scaler_mean = None if scaled_input else arrays.get('scaler_mean')
+        self.scaler_scale = None if scaled_input else arrays.get('scaler_scale')
+
+    @property
+    def normalizes(self):
+        return self.scaler_mean is not None
+
+    def _prepare(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Esperadas {self.n_features} features, recebidas {X.shape[1]}.")
+        if self.scaler_mean is not None:
+            # Mesmas operações de StandardScaler.transform
+            X = X.astype(np.float64, copy=True)
+            X -= self.scaler_mean
+            X /= self.scaler_scale
+        return X
+
+class ForestPredictor(_Predictor):
+    def __init__(self, arrays, batch_size=8192, scaled_input=False):
+        super().__init__(arrays, scaled_input)
+        self.children_left = arrays['children_left']
+        self.children_right = arrays['children_right']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.batch_size = batch_size
+
+    def _leaves(self, X):
+        # Travessia de todas as árvores para todas as linhas do bloco ao mesmo tempo
+        n = X.shape[0]
+        rows = np.arange(n)[np.newaxis, :]
+        node = np.repeat(self.roots[:, np.newaxis], n, axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.children_left[node], self.children_right[node])
+        return node
+
+    def tree_proba(self, X):
+        # Distribuição de classes da folha de cada árvore: (árvores, linhas, classes)
+        X = self._prepare(X).astype(np.float32)
+        return self.value[self._leaves(X)]
+
+    def predict_proba(self, X):
+        # Como no sklearn, as árvores comparam as features em float32
+        X = self._prepare(X).astype(np.float32)
+        n_trees = len(self.roots)
+        proba = np.zeros((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        for start in range(0, X.shape[0], self.batch_size):
+            block = slice(start, start + self.batch_size)
+            leaves = self._leaves(X[block])
+            # Soma na mesma ordem de RandomForestClassifier.predict_proba
+            for t in range(n_trees):
+                proba[block] += self.value[leaves[t]]
+        proba /= n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+class LinearPredictor(_Predictor):
+    def __init__(self, arrays, scaled_input=False):
+        super().__init__(arrays, scaled_input)
+        self.coef = arrays['coef']
+        self.intercept = arrays['intercept']
+
+    def decision_function(self, X):
+        X = self._prepare(X)
+        if X.dtype not in (np.float32, np.float64):
+            X = X.astype(np.float64)
+        scores = X @ self.coef.T + self.intercept
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            indices = (scores > 0).astype(int)
+        else:
+            indices = scores.argmax(axis=1)
+        return self.classes[indices]
+
+class QuantizedMLPPredictor(_Predictor):
+    def __init__(self, arrays, scaled_input=False):
+        super().__init__(arrays, scaled_input)
+        # Pesos int8 no arquivo, convertidos uma vez para float32: o NumPy não tem
+        # multiplicação de matrizes int8, e o produto em float32 usa o BLAS
+        self.activations = [str(a) for a in arrays['activations']]
+        self.kernels = [arrays[f'kernel_{i}'].astype(np.float32) * arrays[f'scale_{i}'] for i in range(len(self.activations))]
+        self.biases = [arrays[f'bias_{i}'] for i in range(len(self.activations))]
+
+    def _logits(self, X):
+        H = self._prepare(X).astype(np.float32)
+        last = len(self.kernels) - 1
+        for i, (kernel, bias, activation) in enumerate(zip(self.kernels, self.biases, self.activations)):
+            H = H @ kernel
+            H += bias
+            if i < last:
+                H = _activate(H, activation)
+        return H
+
+    def predict_proba(self, X):
+        return _activate(self._logits(X), self.activations[-1])
+
+    def predict(self, X):
+        # Softmax e sigmoid são monótonas: o argmax dos logits basta
+        return self.classes.take(np.argmax(self._logits(X), axis=1), axis=0)
+
+def _activate(H, activation):
+    if activation == 'relu':
+        return np.maximum(H, 0, out=H)
+    if activation == 'sigmoid':
+        return 1.0 / (1.0 + np.exp(-H))
+    if activation == 'tanh':
+        return np.tanh(H)
+    if activation == 'softmax':
+        H = np.exp(H - H.max(axis=1, keepdims=True))
+        return H / H.sum(axis=1, keepdims=True)
+    return H
+
+def load_predictor(path, scaled_input=False):
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    kind = str(arrays['kind'])
+    if kind == 'random_forest':
+        return ForestPredictor(arrays, scaled_input=scaled_input)
+    if kind == 'logistic_regression':
+        return LinearPredictor(arrays, scaled_input=scaled_input)
+    if kind == 'quantized_mlp':
+        return QuantizedMLPPredictor(arrays, scaled_input=scaled_input)
+    raise ValueError(f"Tipo de modelo exportado desconhecido: {kind}")
+
+def _time_calls(predict, X, batch_size, min_time=0.2, max_calls=10000):
+    # Latência por chamada (em segundos) para lotes de batch_size linhas
+    n = X.shape[0]
+    latencies = []
+    start_total = time.perf_counter()
+    i = 0
+    while len(latencies) < max_calls and (time.perf_counter() - start_total < min_time or len(latencies) < 3):
+        start = (i * batch_size) % n
+        batch = X[start:start + batch_size]
+        if batch.shape[0] < batch_size:
+            batch = X[:batch_size]
+        t0 = time.perf_counter()
+        predict(batch)
+        latencies.append(time.perf_counter() - t0)
+        i += 1
+    return np.array(latencies)
+
+def benchmark_predictors(predictors, X, batch_sizes=(1, 64, 4096)):
+    # predictors: {nome: função predict}; retorna latências e throughput por tamanho de lote
+    results = {}
+    for batch_size in batch_sizes:
+        batch_size = min(batch_size, X.shape[0])
+        for name, predict in predictors.items():
+            latencies = _time_calls(predict, X, batch_size)
+            results.setdefault(name, {})[str(batch_size)] = {
+                'p50_latency_us': float(np.percentile(latencies, 50) * 1e6),
+                'p99_latency_us': float(np.percentile(latencies, 99) * 1e6),
+                'rows_per_second': float(batch_size / np.median(latencies)),
+            }
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exporta modelos RF/LR para inferência em NumPy e compara com o sklearn.')
+    parser.add_argument('--model', type=str, required=True, help='Modelo .pkl treinado (Random Forest ou Regressão Logística).')
+    parser.add_argument('--output', type=str, default=None, help='Arquivo .npz exportado (padrão: mesmo nome do modelo).')
+    parser.add_argument('--data', type=str, default=None, help='Tabela usada para verificar e medir a inferência.')
+    parser.add_argument('--address_bits', action='store_true', help='Features com bits de dst_mac/dst_ip (como no treinamento).')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 64, 4096], help='Tamanhos de lote do benchmark.')
+    args = parser.parse_args()
+
+    import joblib
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from data_collection.features import build_features
+
+    model = joblib.load(args.model)
+    output_path = args.output or os.path.splitext(args.model)[0] + '.npz'
+    export_model(model, output_path)
+    print(f"Modelo exportado para {output_path}")
+
+    if args.data:
+        features = build_features(args.data, address_bits=args.address_bits)
+        X = np.ascontiguousarray(np.concatenate([features.X_train, features.X_test]))
+        predictor = load_predictor(output_path)
+
+        identical = np.array_equal(predictor.predict(X), model.predict(X))
+        print(f"Predições idênticas às do sklearn: {identical}")
+
+        results = benchmark_predictors({'sklearn': model.predict, 'numpy': predictor.predict}, X, args.batch_sizes)
+        for name, by_batch in results.items():
+            for batch_size, metrics in by_batch.items():
+                print(f"{name:8s} lote={batch_size:>6s} p50={metrics['p50_latency_us']:10.1f}us "
+                      f"p99={metrics['p99_latency_us']:10.1f}us linhas/s={metrics['rows_per_second']:12.0f}")
+        with open(os.path.splitext(output_path)[0] + '_benchmark.json', 'w') as f:
+            json.dump({'identical': bool(identical), 'results': results}, f, indent=4)
@@ -0,0 +1,298 @@
+import numpy as np
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.columnar import find_table, load_table
+from data_collection.features import build_features, encode_frame, transform_features
+from models.model_registry import ModelRegistry
+
+# Serviço local de predição da porta de saída. Protocolo: uma mensagem JSON por
+# linha via TCP em 127.0.0.1, por exemplo
+#   {"id": 1, "model": "rf", "dst_ip": "10.0.1.1", "prefix_len": 24}
+# e a resposta {"id": 1, "model": "rf", "egress_port": 1}. A mensagem
+# {"cmd": "stats"} retorna as estatísticas de latência e vazão do serviço.
+MODEL_NAMES = {'nn': 'Neural Network', 'rf': 'Random Forest', 'lr': 'Logistic Regression'}
+
+class LatencyStats:
+    # Latência e vazão das últimas `window` requisições. A vazão é medida da
+    # chegada da primeira à resposta da última requisição da janela, sem contar
+    # o tempo de carga dos modelos nem os intervalos antes do primeiro pedido.
+    def __init__(self, window=100000):
+        self.requests = collections.deque(maxlen=window)
+        self.count = 0
+        self.batches = 0
+
+    def record(self, enqueued, completed):
+        self.requests.append((enqueued, completed))
+        self.count += 1
+
+    def summary(self):
+        times = np.array(self.requests) if self.requests else np.zeros((1, 2))
+        latencies = times[:, 1] - times[:, 0]
+        elapsed = times[:, 1].max() - times[:, 0].min()
+        return {
+            'requests': self.count,
+            'batches': self.batches,
+            'mean_batch_size': self.count / self.batches if self.batches else 0.0,
+            'p50_latency_ms': float(np.percentile(latencies, 50) * 1e3),
+            'p99_latency_ms': float(np.percentile(latencies, 99) * 1e3),
+            'requests_per_second': len(self.requests) / elapsed if elapsed > 0 else 0.0,
+        }
+
+class MicroBatcher:
+    # Agrupa requisições concorrentes em lotes de até max_batch_size linhas,
+    # esperando no máximo max_wait_ms pelo preenchimento do lote
+    def __init__(self, predict_fn, max_batch_size=256, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.stats = LatencyStats()
+        self._worker = None
+
+    def start(self):
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            rows = [row for row, _, _ in batch]
+            try:
+                # A predição roda fora do event loop para não bloquear as conexões
+                predictions = await loop.run_in_executor(None, self.predict_fn, rows)
+            except Exception as exc:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            self.stats.batches += 1
+            now = time.perf_counter()
+            for (_, future, enqueued), prediction in zip(batch, predictions):
+                self.stats.record(enqueued, now)
+                if not future.done():
+                    future.set_result(prediction)
+
+def load_models(model_paths, scaled_input=False):
+    # Carrega cada modelo uma única vez na inicialização do serviço (o primeiro
+    # pedido não paga o custo da carga); o TensorFlow só é importado se houver .h5
+    registry = ModelRegistry(model_paths, scaled_input)
+    models = {}
+    for key, path in model_paths.items():
+        if key not in registry.available():
+            print(f"Modelo {MODEL_NAMES[key]} não encontrado em {path}. Ignorando.")
+            continue
+        models[key] = registry.get(key)
+        print(f"Modelo {MODEL_NAMES[key]} carregado de {path} em {registry.load_seconds[key]:.2f}s")
+    return models
+
+def make_predict_fn(kind, model, preprocessors):
+    import pandas as pd
+
+    # Modelos .npz com a média/escala gravadas normalizam as features sozinhos,
+    # sem o StandardScaler do sklearn
+    encode = encode_frame if kind == 'numpy' and model.normalizes else transform_features
+
+    def predict(rows):
+        X = encode(pd.DataFrame(rows), preprocessors)
+        if kind == 'keras':
+            # Chamada direta ao modelo: menos overhead que model.predict para lotes pequenos
+            return np.argmax(np.asarray(model(X.astype(np.float32), training=False)), axis=1).tolist()
+        return np.asarray(model.predict(X)).tolist()
+
+    return predict
+
+class PredictionService:
+    def __init__(self, models, preprocessors, max_batch_size=256, max_wait_ms=2.0):
+        self.batchers = {key: MicroBatcher(make_predict_fn(kind, model, preprocessors), max_batch_size, max_wait_ms)
+                         for key, (kind, model) in models.items()}
+        self.default_model = next(iter(self.batchers), None)
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8765):
+        for batcher in self.batchers.values():
+            batcher.start()
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for batcher in self.batchers.values():
+            await batcher.stop()
+
+    def stats(self):
+        return {MODEL_NAMES[key]: batcher.stats.summary() for key, batcher in self.batchers.items()}
+
+    async def _answer(self, request):
+        if request.get('cmd') == 'stats':
+            return {'id': request.get('id'), 'stats': self.stats()}
+        key = request.pop('model', self.default_model)
+        request_id = request.pop('id', None)
+        if key not in self.batchers:
+            return {'id': request_id, 'error': f"Modelo '{key}' não disponível."}
+        if 'dst_mac' not in request and 'dst_ip' not in request:
+            return {'id': request_id, 'error': "A requisição precisa de dst_mac ou dst_ip."}
+        try:
+            prediction = await self.batchers[key].submit(request)
+        except Exception as exc:
+            return {'id': request_id, 'error': str(exc)}
+        return {'id': request_id, 'model': key, 'egress_port': prediction}
+
+    async def _handle(self, reader, writer):
+        pending = set()
+        lock = asyncio.Lock()
+
+        async def reply(response):
+            # Respostas das tarefas concorrentes da conexão não podem se intercalar
+            async with lock:
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+
+        async def respond(request):
+            await reply(await self._answer(request))
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    await reply({'error': 'JSON inválido'})
+                    continue
+                # Requisições da mesma conexão podem ser atendidas fora de ordem (use o campo id)
+                task = asyncio.ensure_future(respond(request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            writer.close()
+
+async def run_load_test(port, sample_rows, model_key, total_requests=10000, concurrency=64, host='127.0.0.1'):
+    # Gerador de carga embutido: `concurrency` clientes, cada um com sua conexão,
+    # enviando uma requisição por vez e medindo a latência fim a fim
+    latencies = []
+    per_client = [total_requests // concurrency + (1 if i < total_requests % concurrency else 0) for i in range(concurrency)]
+
+    async def client(n_requests, seed):
+        rng = random.Random(seed)
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in range(n_requests):
+            request = dict(rng.choice(sample_rows))
+            request.update({'id': i, 'model': model_key})
+            start = time.perf_counter()
+            writer.write((json.dumps(request) + '\n').encode())
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if 'error' in response:
+                raise RuntimeError(response['error'])
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n, seed) for seed, n in enumerate(per_client) if n))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies)
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'p50_latency_ms': float(np.percentile(latencies, 50) * 1e3),
+        'p99_latency_ms': float(np.percentile(latencies, 99) * 1e3),
+        'requests_per_second': len(latencies) / elapsed,
+    }
+
+def request_rows(df, limit=10000):
+    # Linhas de exemplo (apenas os campos de consulta) para o gerador de carga
+    columns = [col for col in ['dst_mac', 'dst_ip', 'prefix_len', 'action_name'] if col in df.columns]
+    return json.loads(df[columns].head(limit).to_json(orient='records'))
+
+async def main(args):
+    data_path = args.data or find_table('processed_data', f'processed_{args.table}_data')
+    preprocessors = build_features(data_path, address_bits=args.address_bits).preprocessors
+    model_paths = {
+        'nn': args.nn_model or os.path.join('models', f'neural_network_{args.table}.h5'),
+        'rf': args.rf_model or os.path.join('models', f'random_forest_{args.table}.pkl'),
+        'lr': args.lr_model or os.path.join('models', f'logistic_regression_{args.table}.pkl'),
+    }
+    models = load_models(model_paths)
+    if not models:
+        print("Nenhum modelo disponível. Encerrando.")
+        return
+
+    service = PredictionService(models, preprocessors, args.max_batch_size, args.max_wait_ms)
+    port = await service.start(args.host, args.port)
+    print(f"Serviço de predição ouvindo em {args.host}:{port} (modelos: {', '.join(service.batchers)})")
+
+    try:
+        if args.load_test:
+            sample_rows = request_rows(load_table(data_path))
+            for key in service.batchers:
+                result = await run_load_test(port, sample_rows, key, args.load_test, args.concurrency, args.host)
+                print(f"\n--- Teste de carga: {MODEL_NAMES[key]} ---")
+                print(f"Requisições: {result['requests']} (concorrência {result['concurrency']})")
+                print(f"Latência p50: {result['p50_latency_ms']:.2f} ms | p99: {result['p99_latency_ms']:.2f} ms")
+                print(f"Requisições/s: {result['requests_per_second']:.0f}")
+            print("\n--- Estatísticas do serviço ---")
+            print(json.dumps(service.stats(), indent=4))
+        else:
+            while True:
+                await asyncio.sleep(args.stats_interval)
+                for name, summary in service.stats().items():
+                    print(f"{name}: {summary['requests']} req, p50={summary['p50_latency_ms']:.2f} ms, "
+                          f"p99={summary['p99_latency_ms']:.2f} ms, {summary['requests_per_second']:.0f} req/s")
+    finally:
+        await service.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serviço local de predição de egress_port com micro-batching.')
+    parser.add_argument('--table', type=str, default='ipv4', choices=['ethernet', 'ipv4'], help='Tabela cujos modelos serão servidos.')
+    parser.add_argument('--data', type=str, default=None, help='Tabela usada no treinamento (localiza o encoder e o scaler em cache).')
+    parser.add_argument('--address_bits', action='store_true', help='Modelos treinados com --address_bits.')
+    parser.add_argument('--nn_model', type=str, default=None, help='Modelo .h5 da Rede Neural.')
+    parser.add_argument('--rf_model', type=str, default=None, help='Modelo .pkl (ou .npz exportado) do Random Forest.')
+    parser.add_argument('--lr_model', type=str, default=None, help='Modelo .pkl (ou .npz exportado) da Regressão Logística.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Endereço local do serviço.')
+    parser.add_argument('--port', type=int, default=8765, help='Porta TCP do serviço (0 escolhe uma porta livre).')
+    parser.add_argument('--max_batch_size', type=int, default=256, help='Tamanho máximo do micro-lote.')
+    parser.add_argument('--max_wait_ms', type=float, default=2.0, help='Espera máxima para completar um micro-lote.')
+    parser.add_argument('--stats_interval', type=float, default=10.0, help='Intervalo (s) entre relatórios de estatísticas.')
+    parser.add_argument('--load_test', type=int, default=0, help='Executa o gerador de carga com N requisições por modelo e encerra.')
+    parser.add_argument('--concurrency', type=int, default=64, help='Clientes simultâneos do gerador de carga.')
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
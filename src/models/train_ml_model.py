@@ -1,63 +1,106 @@
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import accuracy_score
-import joblib
+import argparse
 import os
+import sys
 
-def train_lr_model(data_path, model_save_path):
-    # Carregar dados pré-processados
-    df = pd.read_csv(data_path)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.columnar import data_table_path
+from data_collection.features import DEFAULT_CACHE_DIR, build_features, build_streaming_features, iter_feature_chunks, save_feature_info, streaming_accuracy
+from models.hyperparameter_search import tune_params
+from instrumentation import add_rows, phase, stage
 
-    # Exemplo de pré-processamento para o modelo
-    if 'action_name' in df.columns:
-        le = LabelEncoder()
-        df['action_name_encoded'] = le.fit_transform(df['action_name'])
+# Hiperparâmetros padrão (sobrescritos pelos encontrados com --tune)
+LR_PARAMS = {'C': 1.0, 'max_iter': 1000}
 
-    features = [col for col in df.columns if col not in ["egress_port", "action_name", "dst_mac", "dst_ip"]]
-    if 'action_name_encoded' in df.columns:
-        features.append('action_name_encoded')
+def build_lr_model(params=None):
+    from sklearn.linear_model import LogisticRegression
+    return LogisticRegression(random_state=42, **dict(LR_PARAMS, **(params or {})))
 
-    X = df[features].fillna(0)
-    y = df["egress_port"]
+@stage('train_lr', target='data_path')
+def train_lr_model(data_path, model_save_path, address_bits=False, chunk_size=None, epochs=5, params=None, cache_dir=DEFAULT_CACHE_DIR):
+    if chunk_size:
+        # O modo em blocos usa SGD, que não tem os hiperparâmetros da busca
+        return train_lr_model_chunked(data_path, model_save_path, address_bits, chunk_size, epochs, cache_dir)
 
-    # Dividir dados em treino e teste
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    from sklearn.metrics import accuracy_score
+    import joblib
 
-    # Normalizar features
-    scaler = StandardScaler()
-    X_train = scaler.fit_transform(X_train)
-    X_test = scaler.transform(X_test)
+    # Features compartilhadas (divisão treino/teste e normalização em cache)
+    features = build_features(data_path, address_bits=address_bits, cache_dir=cache_dir)
 
     # Construir e treinar o modelo de Regressão Logística
-    model = LogisticRegression(max_iter=1000, random_state=42)
-    model.fit(X_train, y_train)
+    add_rows(len(features.y_train))
+    with phase('fit'):
+        model = build_lr_model(params)
+        model.fit(features.X_train, features.y_train)
 
     # Avaliar o modelo
-    y_pred = model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
+    with phase('evaluate'):
+        y_pred = model.predict(features.X_test)
+        accuracy = accuracy_score(features.y_test, y_pred)
     print(f"Acurácia do modelo de Regressão Logística: {accuracy:.4f}")
 
     # Salvar o modelo
-    joblib.dump(model, model_save_path)
+    with phase('save'):
+        joblib.dump(model, model_save_path)
+        save_feature_info(model_save_path, features)
+    print(f"Modelo de Regressão Logística salvo em {model_save_path}")
+
+def train_lr_model_chunked(data_path, model_save_path, address_bits=False, chunk_size=100000, epochs=5, cache_dir=DEFAULT_CACHE_DIR):
+    # Fora da memória: regressão logística por SGD (log_loss), um partial_fit por bloco
+    from sklearn.linear_model import SGDClassifier
+    import joblib
+    features = build_streaming_features(data_path, address_bits=address_bits, chunk_size=chunk_size, cache_dir=cache_dir)
+    classes = features.preprocessors['classes']
+
+    model = SGDClassifier(loss='log_loss', random_state=42)
+    with phase('fit'):
+        for epoch in range(epochs):
+            # Ordem dos blocos diferente a cada época (formato colunar)
+            for X, y in iter_feature_chunks(features, 'train', shuffle_seed=epoch):
+                model.partial_fit(X, y, classes=classes)
+                if epoch == 0:
+                    add_rows(len(y))
+
+    # Avaliar o modelo
+    with phase('evaluate'):
+        accuracy = streaming_accuracy(model.predict, features)
+    print(f"Acurácia do modelo de Regressão Logística (SGD, em blocos de {chunk_size}): {accuracy:.4f}")
+
+    # Salvar o modelo
+    with phase('save'):
+        joblib.dump(model, model_save_path)
+        save_feature_info(model_save_path, features)
     print(f"Modelo de Regressão Logística salvo em {model_save_path}")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Treina o modelo de Regressão Logística para as tabelas do BMv2.')
+    parser.add_argument('--address_bits', action='store_true', help='Usa os bits de dst_mac/dst_ip (e prefixos mascarados) como features.')
+    parser.add_argument('--chunk_size', type=int, default=None, help='Treina fora da memória (SGD) lendo a tabela em blocos deste tamanho.')
+    parser.add_argument('--epochs', type=int, default=5, help='Épocas do treinamento em blocos.')
+    parser.add_argument('--tune', action='store_true', help='Busca os hiperparâmetros (validação cruzada em paralelo) antes de treinar.')
+    parser.add_argument('--time_budget', type=float, default=None, help='Tempo máximo (s) da busca por tabela.')
+    parser.add_argument('--workers', type=int, default=None, help='Processos da busca (padrão: todos os núcleos).')
+    parser.add_argument('--folds', type=int, default=3, help='Número de folds da validação cruzada.')
+    parser.add_argument('--data_path', type=str, default=None,
+                        help='Tabela de cada modelo, com {table} no lugar de ethernet/ipv4 (padrão: processed_data/processed_{table}_data; ex.: processed_data/packet_{table}_data).')
+    args = parser.parse_args()
+
     # Exemplo de uso para a tabela ethernet
-    ethernet_data_path = os.path.join("processed_data", "processed_ethernet_data.csv")
+    ethernet_data_path = data_table_path(args.data_path, 'ethernet')
     ethernet_model_path = os.path.join("models", "logistic_regression_ethernet.pkl")
     if os.path.exists(ethernet_data_path):
-        train_lr_model(ethernet_data_path, ethernet_model_path)
+        params = tune_params('lr', ethernet_data_path, args) if args.tune else None
+        train_lr_model(ethernet_data_path, ethernet_model_path, address_bits=args.address_bits, chunk_size=args.chunk_size, epochs=args.epochs, params=params)
     else:
         print(f"Dados para ethernet_table não encontrados em {ethernet_data_path}. Pulando treinamento da LR para Ethernet.")
 
     # Exemplo de uso para a tabela ipv4
-    ipv4_data_path = os.path.join("processed_data", "processed_ipv4_data.csv")
+    ipv4_data_path = data_table_path(args.data_path, 'ipv4')
     ipv4_model_path = os.path.join("models", "logistic_regression_ipv4.pkl")
     if os.path.exists(ipv4_data_path):
-        train_lr_model(ipv4_data_path, ipv4_model_path)
+        params = tune_params('lr', ipv4_data_path, args) if args.tune else None
+        train_lr_model(ipv4_data_path, ipv4_model_path, address_bits=args.address_bits, chunk_size=args.chunk_size, epochs=args.epochs, params=params)
     else:
         print(f"Dados para ipv4_table não encontrados em {ipv4_data_path}. Pulando treinamento da LR para IPv4.")
 
@@ -1,85 +1,146 @@
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense
-from tensorflow.keras.utils import to_categorical
+import argparse
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.columnar import data_table_path
+from data_collection.features import DEFAULT_CACHE_DIR, build_features, build_streaming_features, feature_names, iter_feature_chunks, save_feature_info
+from models.hyperparameter_search import tune_params
+from instrumentation import add_rows, phase, stage
+
+# Hiperparâmetros padrão (sobrescritos pelos encontrados com --tune); 'epochs'
+# nos parâmetros substitui o argumento epochs
+NN_PARAMS = {'units': [64, 32], 'learning_rate': 0.001, 'batch_size': 32}
+
+def build_nn_model(n_features, n_classes, params=None):
+    # TensorFlow importado apenas ao treinar (vários segundos e centenas de MB)
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense
+    from tensorflow.keras.optimizers import Adam
+    params = dict(NN_PARAMS, **(params or {}))
+    units = list(params['units'])
+    model = Sequential(
+        [Dense(units[0], activation='relu', input_shape=(n_features,))]
+        + [Dense(n, activation='relu') for n in units[1:]]
+        + [Dense(n_classes, activation='softmax')]  # Saída para classificação multi-classe
+    )
+    model.compile(optimizer=Adam(learning_rate=params['learning_rate']), loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+@stage('train_nn', target='data_path')
+def train_nn_model(data_path, model_save_path, address_bits=False, chunk_size=None, epochs=50, params=None, cache_dir=DEFAULT_CACHE_DIR):
+    params = dict(NN_PARAMS, **(params or {}))
+    epochs = params.pop('epochs', epochs)
+    if chunk_size:
+        return train_nn_model_chunked(data_path, model_save_path, address_bits, chunk_size, epochs, params, cache_dir)
+
+    from tensorflow.keras.utils import to_categorical
+
+    # Features compartilhadas (divisão treino/teste e normalização em cache)
+    # Assumindo que a coluna 'egress_port' é o target e as outras são features
+    features = build_features(data_path, address_bits=address_bits, cache_dir=cache_dir)
+    X_train, X_test = features.X_train, features.X_test
 
-def train_nn_model(data_path, model_save_path):
-    # Carregar dados pré-processados
-    df = pd.read_csv(data_path)
+    # Converter 'egress_port' para categórico (problema de classificação multi-classe)
+    # Assumindo que egress_port são inteiros sequenciais a partir de 0
+    n_classes = features.preprocessors['n_classes']
+    y_train = to_categorical(features.y_train, num_classes=n_classes)
+    y_test = to_categorical(features.y_test, num_classes=n_classes)
 
-    # Exemplo de pré-processamento para o modelo
-    # Assumindo que a coluna 'egress_port' é o target e as outras são features
-    # Você precisará adaptar isso à sua estrutura de dados real
-    
-    # Codificar a coluna 'action_name' se for categórica
-    if 'action_name' in df.columns:
-        le = LabelEncoder()
-        df['action_name_encoded'] = le.fit_transform(df['action_name'])
-        # Salvar o LabelEncoder para uso posterior na inferência
-        # import joblib
-        # joblib.dump(le, 'label_encoder_action_name.pkl')
-
-    # Selecionar features e target
-    # Remova colunas que não são numéricas ou que não devem ser usadas como features
-    # Exemplo: 'dst_mac' e 'dst_ip' podem precisar de codificação ou hashing
-    features = [col for col in df.columns if col not in ["egress_port", "action_name", "dst_mac", "dst_ip"]]
-    if 'action_name_encoded' in df.columns:
-        features.append('action_name_encoded')
-
-    X = df[features].fillna(0) # Preencher NaNs com 0 ou outra estratégia
-    y = df["egress_port"]
-
-    # Converter 'egress_port' para categórico se for um problema de classificação multi-classe
-    # Se for regressão, mantenha como está
-    y = to_categorical(y) # Assumindo que egress_port são inteiros sequenciais a partir de 0
-
-    # Dividir dados em treino e teste
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # Normalizar features
-    scaler = StandardScaler()
-    X_train = scaler.fit_transform(X_train)
-    X_test = scaler.transform(X_test)
-
-    # Construir o modelo da Rede Neural Artificial
-    model = Sequential([
-        Dense(64, activation=\'relu\', input_shape=(X_train.shape[1],)),
-        Dense(32, activation=\'relu\'),
-        Dense(y.shape[1], activation=\'softmax\') # Saída para classificação multi-classe
-    ])
-
-    # Compilar o modelo
-    model.compile(optimizer=\'adam\', loss=\'categorical_crossentropy\', metrics=[\'accuracy\'])
+    # Construir e compilar o modelo da Rede Neural Artificial
+    add_rows(len(y_train))
+    with phase('build'):
+        model = build_nn_model(X_train.shape[1], n_classes, params)
 
     # Treinar o modelo
-    model.fit(X_train, y_train, epochs=50, batch_size=32, validation_split=0.1, verbose=0)
+    with phase('fit'):
+        model.fit(X_train, y_train, epochs=epochs, batch_size=params['batch_size'], validation_split=0.1, verbose=0)
 
     # Avaliar o modelo
-    loss, accuracy = model.evaluate(X_test, y_test, verbose=0)
+    with phase('evaluate'):
+        loss, accuracy = model.evaluate(X_test, y_test, verbose=0)
     print(f"Acurácia do modelo de Rede Neural Artificial: {accuracy:.4f}")
 
     # Salvar o modelo
-    model.save(model_save_path)
+    with phase('save'):
+        model.save(model_save_path)
+        save_feature_info(model_save_path, features)
     print(f"Modelo de Rede Neural Artificial salvo em {model_save_path}")
 
-if __name__ == \'__main__\':
+def batch_dataset(features, split, batch_size=32, shuffle=True):
+    # tf.data a partir dos blocos da tabela: cada bloco é embaralhado e dividido em lotes,
+    # e o gerador é reiniciado (com outra ordem de blocos) a cada época
+    import tensorflow as tf
+    from tensorflow.keras.utils import to_categorical
+    n_classes = features.preprocessors['n_classes']
+    n_features = len(feature_names(features.preprocessors))
+    epoch = [0]
+
+    def batches():
+        rng = np.random.default_rng(epoch[0])
+        for X, y in iter_feature_chunks(features, split, shuffle_seed=epoch[0] if shuffle else None):
+            order = rng.permutation(len(y)) if shuffle else np.arange(len(y))
+            for start in range(0, len(order), batch_size):
+                rows = order[start:start + batch_size]
+                yield X[rows].astype(np.float32), to_categorical(y[rows], num_classes=n_classes)
+        epoch[0] += 1
+
+    signature = (tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+                 tf.TensorSpec(shape=(None, n_classes), dtype=tf.float32))
+    return tf.data.Dataset.from_generator(batches, output_signature=signature).prefetch(tf.data.AUTOTUNE)
+
+def train_nn_model_chunked(data_path, model_save_path, address_bits=False, chunk_size=100000, epochs=50, params=None, cache_dir=DEFAULT_CACHE_DIR):
+    # Fora da memória: os lotes vêm de um gerador sobre os blocos da tabela
+    params = dict(NN_PARAMS, **(params or {}))
+    features = build_streaming_features(data_path, address_bits=address_bits, chunk_size=chunk_size, cache_dir=cache_dir)
+    n_classes = features.preprocessors['n_classes']
+    n_features = len(feature_names(features.preprocessors))
+
+    with phase('build'):
+        model = build_nn_model(n_features, n_classes, params)
+    with phase('fit'):
+        model.fit(batch_dataset(features, 'train', batch_size=params['batch_size']), epochs=epochs, verbose=0)
+
+    # Avaliar o modelo
+    with phase('evaluate'):
+        loss, accuracy = model.evaluate(batch_dataset(features, 'test', batch_size=1024, shuffle=False), verbose=0)
+    print(f"Acurácia do modelo de Rede Neural Artificial (em blocos de {chunk_size}): {accuracy:.4f}")
+
+    # Salvar o modelo
+    with phase('save'):
+        model.save(model_save_path)
+        save_feature_info(model_save_path, features)
+    print(f"Modelo de Rede Neural Artificial salvo em {model_save_path}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Treina a Rede Neural Artificial para as tabelas do BMv2.')
+    parser.add_argument('--address_bits', action='store_true', help='Usa os bits de dst_mac/dst_ip (e prefixos mascarados) como features.')
+    parser.add_argument('--chunk_size', type=int, default=None, help='Treina fora da memória lendo a tabela em blocos deste tamanho.')
+    parser.add_argument('--epochs', type=int, default=50, help='Épocas de treinamento (máximo por configuração na busca).')
+    parser.add_argument('--tune', action='store_true', help='Busca os hiperparâmetros (validação cruzada em paralelo, com EarlyStopping) antes de treinar.')
+    parser.add_argument('--time_budget', type=float, default=None, help='Tempo máximo (s) da busca por tabela.')
+    parser.add_argument('--workers', type=int, default=None, help='Processos da busca (padrão: todos os núcleos).')
+    parser.add_argument('--folds', type=int, default=3, help='Número de folds da validação cruzada.')
+    parser.add_argument('--data_path', type=str, default=None,
+                        help='Tabela de cada modelo, com {table} no lugar de ethernet/ipv4 (padrão: processed_data/processed_{table}_data; ex.: processed_data/packet_{table}_data).')
+    args = parser.parse_args()
+
     # Exemplo de uso para a tabela ethernet
-    ethernet_data_path = os.path.join("processed_data", "processed_ethernet_data.csv")
+    ethernet_data_path = data_table_path(args.data_path, 'ethernet')
     ethernet_model_path = os.path.join("models", "neural_network_ethernet.h5")
     if os.path.exists(ethernet_data_path):
-        train_nn_model(ethernet_data_path, ethernet_model_path)
+        params = tune_params('nn', ethernet_data_path, args) if args.tune else None
+        train_nn_model(ethernet_data_path, ethernet_model_path, address_bits=args.address_bits, chunk_size=args.chunk_size, epochs=args.epochs, params=params)
     else:
         print(f"Dados para ethernet_table não encontrados em {ethernet_data_path}. Pulando treinamento da NN para Ethernet.")
 
     # Exemplo de uso para a tabela ipv4
-    ipv4_data_path = os.path.join("processed_data", "processed_ipv4_data.csv")
+    ipv4_data_path = data_table_path(args.data_path, 'ipv4')
     ipv4_model_path = os.path.join("models", "neural_network_ipv4.h5")
     if os.path.exists(ipv4_data_path):
-        train_nn_model(ipv4_data_path, ipv4_model_path)
+        params = tune_params('nn', ipv4_data_path, args) if args.tune else None
+        train_nn_model(ipv4_data_path, ipv4_model_path, address_bits=args.address_bits, chunk_size=args.chunk_size, epochs=args.epochs, params=params)
     else:
         print(f"Dados para ipv4_table não encontrados em {ipv4_data_path}. Pulando treinamento da NN para IPv4.")
 
@@ -1,61 +1,132 @@
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-import joblib
+import argparse
 import os
+import sys
 
-def train_rf_model(data_path, model_save_path):
-    # Carregar dados pré-processados
-    df = pd.read_csv(data_path)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_collection.columnar import data_table_path
+from data_collection.features import DEFAULT_CACHE_DIR, build_features, build_streaming_features, iter_feature_chunks, save_feature_info, streaming_accuracy
+from models.hyperparameter_search import tune_params
+from instrumentation import add_rows, phase, stage
 
-    # Exemplo de pré-processamento para o modelo
-    if 'action_name' in df.columns:
-        le = LabelEncoder()
-        df['action_name_encoded'] = le.fit_transform(df['action_name'])
+# Hiperparâmetros padrão (sobrescritos pelos encontrados com --tune)
+RF_PARAMS = {'n_estimators': 100, 'max_depth': None, 'min_samples_leaf': 1}
 
-    features = [col for col in df.columns if col not in ["egress_port", "action_name", "dst_mac", "dst_ip"]]
-    if 'action_name_encoded' in df.columns:
-        features.append('action_name_encoded')
+def build_rf_model(params=None):
+    from sklearn.ensemble import RandomForestClassifier
+    return RandomForestClassifier(random_state=42, **dict(RF_PARAMS, **(params or {})))
 
-    X = df[features].fillna(0)
-    y = df["egress_port"]
+@stage('train_rf', target='data_path')
+def train_rf_model(data_path, model_save_path, address_bits=False, chunk_size=None, max_rows=1000000, params=None, cache_dir=DEFAULT_CACHE_DIR):
+    if chunk_size:
+        return train_rf_model_chunked(data_path, model_save_path, address_bits, chunk_size, max_rows, params, cache_dir)
 
-    # Dividir dados em treino e teste
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    import joblib
 
-    # Normalizar features
-    scaler = StandardScaler()
-    X_train = scaler.fit_transform(X_train)
-    X_test = scaler.transform(X_test)
+    # Features compartilhadas (divisão treino/teste e normalização em cache)
+    features = build_features(data_path, address_bits=address_bits, cache_dir=cache_dir)
 
     # Construir e treinar o modelo Random Forest
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+    add_rows(len(features.y_train))
+    with phase('fit'):
+        model = build_rf_model(params)
+        model.fit(features.X_train, features.y_train)
 
     # Avaliar o modelo
-    accuracy = model.score(X_test, y_test)
+    with phase('evaluate'):
+        accuracy = model.score(features.X_test, features.y_test)
     print(f"Acurácia do modelo Random Forest: {accuracy:.4f}")
 
     # Salvar o modelo
-    joblib.dump(model, model_save_path)
+    with phase('save'):
+        joblib.dump(model, model_save_path)
+        save_feature_info(model_save_path, features)
+    print(f"Modelo Random Forest salvo em {model_save_path}")
+
+def reservoir_sample(chunks, max_rows, seed=42):
+    # Amostra uniforme de até max_rows linhas de um fluxo de blocos (X, y) (algoritmo R, vetorizado):
+    # a memória fica limitada ao reservatório, qualquer que seja o tamanho da tabela
+    rng = np.random.default_rng(seed)
+    X_parts, y_parts = [], []
+    X_sample = y_sample = None
+    seen = 0
+    for X, y in chunks:
+        if X_sample is None:
+            # Enquanto o reservatório não enche, os blocos são apenas guardados
+            fill = min(max_rows - seen, len(y))
+            X_parts.append(X[:fill])
+            y_parts.append(y[:fill])
+            seen += fill
+            X, y = X[fill:], y[fill:]
+            if seen < max_rows:
+                continue
+            X_sample, y_sample = np.concatenate(X_parts), np.concatenate(y_parts)
+            X_parts = y_parts = None
+        # Cada nova linha substitui uma posição aleatória com probabilidade max_rows / (linhas vistas)
+        positions = rng.integers(0, np.arange(seen, seen + len(y)) + 1)
+        replace = positions < max_rows
+        X_sample[positions[replace]] = X[replace]
+        y_sample[positions[replace]] = y[replace]
+        seen += len(y)
+    if X_sample is None:
+        if not y_parts:
+            raise ValueError("Nenhuma linha de treino disponível.")
+        X_sample, y_sample = np.concatenate(X_parts), np.concatenate(y_parts)
+    return X_sample, y_sample, seen
+
+def train_rf_model_chunked(data_path, model_save_path, address_bits=False, chunk_size=100000, max_rows=1000000, params=None, cache_dir=DEFAULT_CACHE_DIR):
+    # Fora da memória: as árvores são treinadas em uma amostra uniforme de até max_rows
+    # linhas de treino, coletada em uma única passada pelos blocos da tabela
+    import joblib
+    features = build_streaming_features(data_path, address_bits=address_bits, chunk_size=chunk_size, cache_dir=cache_dir)
+    with phase('sample'):
+        X_train, y_train, seen = reservoir_sample(iter_feature_chunks(features, 'train'), max_rows)
+    add_rows(seen)
+    print(f"Random Forest treinado com {len(y_train)} de {seen} linhas de treino (amostragem por reservatório).")
+
+    with phase('fit'):
+        model = build_rf_model(params)
+        model.fit(X_train, y_train)
+
+    # Avaliar o modelo
+    with phase('evaluate'):
+        accuracy = streaming_accuracy(model.predict, features)
+    print(f"Acurácia do modelo Random Forest (em blocos de {chunk_size}): {accuracy:.4f}")
+
+    # Salvar o modelo
+    with phase('save'):
+        joblib.dump(model, model_save_path)
+        save_feature_info(model_save_path, features)
     print(f"Modelo Random Forest salvo em {model_save_path}")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Treina o modelo Random Forest para as tabelas do BMv2.')
+    parser.add_argument('--address_bits', action='store_true', help='Usa os bits de dst_mac/dst_ip (e prefixos mascarados) como features.')
+    parser.add_argument('--chunk_size', type=int, default=None, help='Treina fora da memória lendo a tabela em blocos deste tamanho.')
+    parser.add_argument('--max_rows', type=int, default=1000000, help='Tamanho da amostra de treino no modo em blocos.')
+    parser.add_argument('--tune', action='store_true', help='Busca os hiperparâmetros (validação cruzada em paralelo) antes de treinar.')
+    parser.add_argument('--time_budget', type=float, default=None, help='Tempo máximo (s) da busca por tabela.')
+    parser.add_argument('--workers', type=int, default=None, help='Processos da busca (padrão: todos os núcleos).')
+    parser.add_argument('--folds', type=int, default=3, help='Número de folds da validação cruzada.')
+    parser.add_argument('--data_path', type=str, default=None,
+                        help='Tabela de cada modelo, com {table} no lugar de ethernet/ipv4 (padrão: processed_data/processed_{table}_data; ex.: processed_data/packet_{table}_data).')
+    args = parser.parse_args()
+
     # Exemplo de uso para a tabela ethernet
-    ethernet_data_path = os.path.join("processed_data", "processed_ethernet_data.csv")
+    ethernet_data_path = data_table_path(args.data_path, 'ethernet')
     ethernet_model_path = os.path.join("models", "random_forest_ethernet.pkl")
     if os.path.exists(ethernet_data_path):
-        train_rf_model(ethernet_data_path, ethernet_model_path)
+        params = tune_params('rf', ethernet_data_path, args) if args.tune else None
+        train_rf_model(ethernet_data_path, ethernet_model_path, address_bits=args.address_bits, chunk_size=args.chunk_size, max_rows=args.max_rows, params=params)
     else:
         print(f"Dados para ethernet_table não encontrados em {ethernet_data_path}. Pulando treinamento do RF para Ethernet.")
 
     # Exemplo de uso para a tabela ipv4
-    ipv4_data_path = os.path.join("processed_data", "processed_ipv4_data.csv")
+    ipv4_data_path = data_table_path(args.data_path, 'ipv4')
     ipv4_model_path = os.path.join("models", "random_forest_ipv4.pkl")
     if os.path.exists(ipv4_data_path):
-        train_rf_model(ipv4_data_path, ipv4_model_path)
+        params = tune_params('rf', ipv4_data_path, args) if args.tune else None
+        train_rf_model(ipv4_data_path, ipv4_model_path, address_bits=args.address_bits, chunk_size=args.chunk_size, max_rows=args.max_rows, params=params)
     else:
         print(f"Dados para ipv4_table não encontrados em {ipv4_data_path}. Pulando treinamento do RF para IPv4.")
 
@@ -0,0 +1,328 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import instrumentation
+
+# Executor do pipeline como um grafo de dependências (DAG). Cada estágio é uma
+# função chamada no próprio processo (ou em um processo do pool, reaproveitado
+# entre estágios), em vez de um novo "python script.py" por etapa. Estágios
+# independentes rodam em paralelo e estágios cujas entradas, código e
+# parâmetros não mudaram desde a última execução são pulados.
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = '.pipeline_state.json'
+TABLES = ['ethernet', 'ipv4']
+
+class Stage:
+    def __init__(self, name, func, kwargs, inputs, outputs, deps=(), code=()):
+        self.name = name
+        self.func = func
+        self.kwargs = kwargs
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        # Módulos (relativos a src/) que o estágio executa; o fingerprint inclui
+        # também todos os módulos de src/ que eles importam (code_closure)
+        self.code = list(code)
+
+# Funções dos estágios (nível de módulo para poderem ser enviadas ao pool)
+
+def run_preprocess(table, input_path, output_path):
+    from data_collection.preprocess_data import ETHERNET_COLUMNS, IPV4_COLUMNS, ethernet_row, ipv4_row, preprocess_entries_streaming
+    row_builder, columns = (ethernet_row, ETHERNET_COLUMNS) if table == 'ethernet' else (ipv4_row, IPV4_COLUMNS)
+    rows = preprocess_entries_streaming(input_path, [output_path], row_builder, columns)
+    print(f"Dados da {table}_table pré-processados e salvos em {output_path} ({rows} linhas)")
+
+def run_clean(input_path, output_path):
+    from data_collection.clean_data import clean_data
+    clean_data(input_path, output_path)
+
+def run_features(data_path, cache_dir, manifest_path, address_bits=False):
+    from data_collection.features import build_features
+    features = build_features(data_path, address_bits=address_bits, cache_dir=cache_dir)
+    # Saída do estágio (entrada dos treinamentos): a entrada do cache usada. Reescrita
+    # só quando muda, para não invalidar os treinamentos sem necessidade
+    manifest = json.dumps({'data_path': data_path, 'cache_path': features.cache_path}, indent=4)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            if f.read() == manifest:
+                return
+    with open(manifest_path, 'w') as f:
+        f.write(manifest)
+
+def run_train(trainer, data_path, model_path, cache_dir, address_bits=False):
+    if trainer == 'nn':
+        from models.train_neural_network import train_nn_model as train
+    elif trainer == 'rf':
+        from models.train_random_forest import train_rf_model as train
+    else:
+        from models.train_ml_model import train_lr_model as train
+    train(data_path, model_path, address_bits=address_bits, cache_dir=cache_dir)
+
+def run_compare(data_path, nn_model_path, rf_model_path, ml_model_path, results_path, cache_dir, address_bits=False):
+    from data_collection.compare_models import compare_models
+    results = compare_models(data_path, nn_model_path, rf_model_path, ml_model_path, address_bits=address_bits, cache_dir=cache_dir)
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=4)
+
+def run_report(results_paths, report_paths, labels, history_path, threshold=0.1):
+    from generate_report import publish_report
+    for results_path, report_path, label in zip(results_paths, report_paths, labels):
+        with open(results_path, 'r') as f:
+            results = json.load(f)
+        # Linha de base fixada com generate_report.py --pin_baseline, se existir
+        baseline_path = os.path.join(os.path.dirname(report_path), f'baseline_{label}.json')
+        publish_report(results, report_path, label, history_path, baseline_path, threshold)
+
+def build_stages(work_dir='.', address_bits=False, tables=TABLES):
+    # Grafo padrão: pré-processamento -> limpeza / features -> NN, RF, LR -> comparação -> relatório
+    from data_collection.columnar import table_path
+    d = lambda *parts: os.path.join(work_dir, *parts)
+    stages = []
+    results_paths, report_paths = [], []
+    # Cache de features dentro de work_dir (e não no diretório corrente)
+    cache_dir = d('feature_cache')
+    for t in tables:
+        raw = d('collected_data', f'{t}_table_entries.json')
+        processed = table_path(d('processed_data'), f'processed_{t}_data')
+        cleaned = table_path(d('cleaned_data'), f'cleaned_{t}_data')
+        models = {
+            'nn': d('models', f'neural_network_{t}.h5'),
+            'rf': d('models', f'random_forest_{t}.pkl'),
+            'lr': d('models', f'logistic_regression_{t}.pkl'),
+        }
+        results = d('evaluation', f'results_{t}.json')
+        feature_manifest = os.path.join(cache_dir, f'features_{t}.json')
+
+        stages.append(Stage(f'preprocess_{t}', run_preprocess, {'table': t, 'input_path': raw, 'output_path': processed},
+                            [raw], [processed], code=['data_collection/preprocess_data.py', 'data_collection/columnar.py']))
+        stages.append(Stage(f'clean_{t}', run_clean, {'input_path': processed, 'output_path': cleaned},
+                            [processed], [cleaned], [f'preprocess_{t}'], code=['data_collection/clean_data.py', 'data_collection/columnar.py']))
+        # O cache de features é criado uma vez antes dos três treinamentos paralelos
+        stages.append(Stage(f'features_{t}', run_features,
+                            {'data_path': processed, 'cache_dir': cache_dir, 'manifest_path': feature_manifest, 'address_bits': address_bits},
+                            [processed], [feature_manifest], [f'preprocess_{t}'], code=['data_collection/features.py']))
+        trainer_files = {'nn': 'models/train_neural_network.py', 'rf': 'models/train_random_forest.py', 'lr': 'models/train_ml_model.py'}
+        for key, model_path in models.items():
+            stages.append(Stage(f'train_{key}_{t}', run_train,
+                                {'trainer': key, 'data_path': processed, 'model_path': model_path, 'cache_dir': cache_dir, 'address_bits': address_bits},
+                                [processed, feature_manifest], [model_path], [f'features_{t}'], code=[trainer_files[key]]))
+        stages.append(Stage(f'compare_{t}', run_compare,
+                            {'data_path': processed, 'nn_model_path': models['nn'], 'rf_model_path': models['rf'],
+                             'ml_model_path': models['lr'], 'results_path': results, 'cache_dir': cache_dir, 'address_bits': address_bits},
+                            [processed, feature_manifest] + list(models.values()), [results], [f'train_{key}_{t}' for key in models],
+                            code=['data_collection/compare_models.py']))
+        results_paths.append(results)
+        report_paths.append(d('evaluation', f'model_evaluation_report_{t}.txt'))
+
+    stages.append(Stage('report', run_report, {'results_paths': results_paths, 'report_paths': report_paths,
+                                               'labels': list(tables), 'history_path': d('evaluation', 'history.jsonl')},
+                        results_paths, report_paths, [f'compare_{t}' for t in tables], code=['generate_report.py']))
+    return stages
+
+def _path_fingerprint(path):
+    # Tamanho e data de modificação (como o make); diretórios colunares incluem todos os arquivos
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        return sorted((name, _path_fingerprint(os.path.join(path, name))) for name in os.listdir(path))
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def _imported_modules(path):
+    # Módulos de src/ importados por um arquivo, inclusive os imports dentro de
+    # funções (os pesados são adiados para o primeiro uso)
+    import ast
+    with open(os.path.join(SRC_DIR, path), 'r') as f:
+        tree = ast.parse(f.read(), path)
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names += [node.module] + [f'{node.module}.{alias.name}' for alias in node.names]
+    modules = []
+    for name in names:
+        candidate = name.replace('.', '/') + '.py'
+        if os.path.isfile(os.path.join(SRC_DIR, candidate)):
+            modules.append(candidate)
+    return modules
+
+def code_closure(paths):
+    # Fecho transitivo dos imports: todos os arquivos de src/ que o estágio pode executar
+    seen = set()
+    pending = list(paths)
+    while pending:
+        path = pending.pop()
+        if path not in seen:
+            seen.add(path)
+            pending.extend(_imported_modules(path))
+    return sorted(seen)
+
+def stage_fingerprint(stage):
+    digest = hashlib.sha256()
+    digest.update(json.dumps(stage.kwargs, sort_keys=True, default=str).encode())
+    for path in stage.inputs:
+        digest.update(json.dumps([path, _path_fingerprint(path)]).encode())
+    for path in code_closure(stage.code):
+        digest.update(path.encode())
+        with open(os.path.join(SRC_DIR, path), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _run_stage(name, func, kwargs):
+    start = time.perf_counter()
+    instrumentation.run_stage(name, func, kwargs=kwargs)
+    return time.perf_counter() - start
+
+def _ordered(stages):
+    # Ordem topológica (Kahn); falha se houver ciclo ou dependência desconhecida
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Estágio {stage.name} depende de {dep}, que não existe.")
+    order, done = [], set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(dep in done for dep in stage.deps)]
+        if not ready:
+            raise ValueError(f"Ciclo de dependências entre {[stage.name for stage in remaining]}")
+        for stage in ready:
+            order.append(stage)
+            done.add(stage.name)
+        remaining = [stage for stage in remaining if stage.name not in done]
+    return order
+
+def run_pipeline(stages, workers=None, force=False, state_path=STATE_FILE, only=None):
+    stages = _ordered(stages)
+    if only:
+        # Executa apenas os estágios pedidos e as suas dependências
+        by_name = {stage.name: stage for stage in stages}
+        wanted = set()
+        pending = list(only)
+        while pending:
+            name = pending.pop()
+            if name not in wanted:
+                wanted.add(name)
+                pending.extend(by_name[name].deps)
+        stages = [stage for stage in stages if stage.name in wanted]
+
+    state = {}
+    if os.path.exists(state_path) and not force:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+
+    status = {}
+    wall_times = {}
+    fingerprints = {}
+    workers = workers if workers is not None else min(os.cpu_count() or 1, 4)
+    # fork: os processos do pool herdam os módulos já importados e são reaproveitados
+    pool = concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) if workers > 1 else None
+    running = {}
+    pipeline_start = time.perf_counter()
+
+    def ready_stages():
+        return [stage for stage in stages if stage.name not in status and
+                all(status.get(dep) in ('ok', 'skipped') for dep in stage.deps)]
+
+    try:
+        while True:
+            # Estágios cujas dependências falharam não são executados
+            for stage in stages:
+                if stage.name not in status and any(status.get(dep) in ('failed', 'blocked') for dep in stage.deps):
+                    status[stage.name] = 'blocked'
+
+            for stage in ready_stages():
+                missing = [path for path in stage.inputs if not os.path.exists(path)]
+                if missing:
+                    print(f"[{stage.name}] entradas não encontradas: {', '.join(missing)}. Pulando.")
+                    status[stage.name] = 'blocked'
+                    continue
+                fingerprint = stage_fingerprint(stage)
+                fingerprints[stage.name] = fingerprint
+                if state.get(stage.name) == fingerprint and all(os.path.exists(path) for path in stage.outputs):
+                    print(f"[{stage.name}] atualizado, pulando.")
+                    status[stage.name] = 'skipped'
+                    wall_times[stage.name] = 0.0
+                    continue
+                for path in stage.outputs:
+                    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                print(f"[{stage.name}] iniciando.")
+                status[stage.name] = 'running'
+                if pool is None:
+                    future = concurrent.futures.Future()
+                    try:
+                        future.set_result(_run_stage(stage.name, stage.func, stage.kwargs))
+                    except Exception as exc:
+                        future.set_exception(exc)
+                else:
+                    future = pool.submit(_run_stage, stage.name, stage.func, stage.kwargs)
+                running[future] = stage
+
+            if not running:
+                if not ready_stages():
+                    break
+                continue
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    wall_times[stage.name] = future.result()
+                    status[stage.name] = 'ok'
+                    state[stage.name] = fingerprints[stage.name]
+                    print(f"[{stage.name}] concluído em {wall_times[stage.name]:.2f}s.")
+                except Exception as exc:
+                    status[stage.name] = 'failed'
+                    state.pop(stage.name, None)
+                    print(f"[{stage.name}] falhou: {exc!r}")
+            with open(state_path, 'w') as f:
+                json.dump(state, f, indent=4)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    total = time.perf_counter() - pipeline_start
+    print("\n--- Tempo por estágio ---")
+    for stage in stages:
+        elapsed = wall_times.get(stage.name)
+        elapsed_text = f"{elapsed:8.2f}s" if elapsed is not None else '       -'
+        print(f"{stage.name:20s} {status.get(stage.name, 'blocked'):8s} {elapsed_text}")
+    print(f"{'total':20s} {'':8s} {total:8.2f}s")
+    return {'status': status, 'wall_times': wall_times, 'total_seconds': total}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Executa o pipeline completo como um grafo de estágios.')
+    parser.add_argument('--work_dir', type=str, default='.', help='Diretório com collected_data/ e onde as saídas são gravadas.')
+    parser.add_argument('--workers', type=int, default=None, help='Processos paralelos (1 executa tudo no processo atual).')
+    parser.add_argument('--force', action='store_true', help='Executa todos os estágios, mesmo os atualizados.')
+    parser.add_argument('--address_bits', action='store_true', help='Treina e avalia com os bits de dst_mac/dst_ip.')
+    parser.add_argument('--only', type=str, nargs='*', default=None, help='Estágios a executar (com suas dependências).')
+    parser.add_argument('--list', action='store_true', help='Lista os estágios e suas dependências.')
+    parser.add_argument('--trace', type=str, default=None, help='Instrumenta os estágios e grava o trace JSON neste arquivo.')
+    parser.add_argument('--metrics', type=str, default=None, help='Textfile do Prometheus (padrão: <trace>.prom).')
+    parser.add_argument('--profile', type=str, nargs='*', default=[], help="Estágios executados com cProfile (ex.: clean train_rf_ipv4, ou 'all').")
+    parser.add_argument('--tracemalloc', action='store_true', help='Mede o pico de memória alocada pelo Python (mais lento).')
+    args = parser.parse_args()
+    if args.trace:
+        instrumentation.configure(args.trace, args.metrics, args.profile, args.tracemalloc)
+
+    stages = build_stages(args.work_dir, address_bits=args.address_bits)
+    if args.list:
+        for stage in _ordered(stages):
+            print(f"{stage.name:20s} <- {', '.join(stage.deps) or '-'}")
+    else:
+        result = run_pipeline(stages, workers=args.workers, force=args.force,
+                              state_path=os.path.join(args.work_dir, STATE_FILE), only=args.only)
+        if instrumentation.enabled():
+            metrics_path = instrumentation.write_metrics()
+            print(f"Trace salvo em {args.trace} e métricas em {metrics_path}")
+        if any(value in ('failed', 'blocked') for value in result['status'].values()):
+            sys.exit(1)
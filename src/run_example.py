@@ -1,10 +1,16 @@
+import argparse
 import os
 import subprocess
-import time
+
+import instrumentation
+from pipeline import build_stages, run_pipeline
 
 def run_command(command, message):
     print(f"\n--- {message} ---")
-    process = subprocess.run(command, shell=True, capture_output=True, text=True)
+    # Com --trace, o tempo do comando (CPU dos filhos incluída) entra no trace e os
+    # scripts Python executados herdam a configuração pelas variáveis de ambiente
+    name = os.path.splitext(os.path.basename(command.split()[1]))[0] if command.startswith('python ') else command.split()[0]
+    process = instrumentation.run_stage(name, subprocess.run, (command,), {'shell': True, 'capture_output': True, 'text': True}, message)
     if process.returncode != 0:
         print(f"Erro ao executar: {command}")
         print(process.stderr)
@@ -13,6 +19,15 @@ def run_command(command, message):
         print(process.stdout)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exemplo de execução do projeto completo.')
+    parser.add_argument('--trace', type=str, default=None, help='Instrumenta os estágios e grava o trace JSON neste arquivo.')
+    parser.add_argument('--metrics', type=str, default=None, help='Textfile do Prometheus (padrão: <trace>.prom).')
+    parser.add_argument('--profile', type=str, nargs='*', default=[], help="Estágios executados com cProfile (ex.: clean train_rf, ou 'all').")
+    parser.add_argument('--tracemalloc', action='store_true', help='Mede o pico de memória alocada pelo Python (mais lento).')
+    args = parser.parse_args()
+    if args.trace:
+        instrumentation.configure(args.trace, args.metrics, args.profile, args.tracemalloc)
+
     # 1. Compilar o código P4 (assumindo que p4c está no PATH)
     run_command("p4c --target bmv2 --arch v1model p4_code/basic_forwarding.p4 -o p4_code/basic_forwarding.json", "Compilando código P4")
 
@@ -25,7 +40,6 @@ if __name__ == '__main__':
     print("sudo simple_switch_grpc --thrift-port 9090 --log-file /tmp/bmv2.log --no-p4 -- --grpc-server-addr 0.0.0.0:50051 -i 0@veth0 -i 1@veth1")
     print("Após iniciar o BMv2, carregue o programa P4 com: simple_switch_CLI --thrift-port 9090 < p4_code/commands.txt")
     print("Aguarde alguns segundos para o BMv2 iniciar antes de prosseguir com a coleta de dados.")
-    time.sleep(5) # Simula espera pelo BMv2
 
     # Criar diretórios de saída se não existirem
     os.makedirs("collected_data", exist_ok=True)
@@ -51,26 +65,40 @@ if __name__ == '__main__':
         {"match_fields": {"hdr.ipv4.dstAddr": "10.0.2.2", "hdr.ipv4.dstAddr_prefix_len": 24}, "action_name": "ipv4_forward", "action_params": {"port": 2, "dst_mac": "00:00:00:00:00:02"}},
     ]
     import json
-    with open("collected_data/ethernet_table_entries.json", "w") as f: json.dump(dummy_ethernet_data, f, indent=4)
-    with open("collected_data/ipv4_table_entries.json", "w") as f: json.dump(dummy_ipv4_data, f, indent=4)
+    # Só reescreve se o conteúdo mudou, para que o pipeline possa pular os estágios atualizados
+    for path, data in [("collected_data/ethernet_table_entries.json", dummy_ethernet_data), ("collected_data/ipv4_table_entries.json", dummy_ipv4_data)]:
+        content = json.dumps(data, indent=4)
+        if not os.path.exists(path) or open(path).read() != content:
+            with open(path, "w") as f: f.write(content)
     print("\n--- Arquivos dummy de dados coletados criados para simulação. ---")
 
     # 3. Coleta de Dados (neste exemplo, simulada pelos arquivos dummy)
     # run_command("python data_collection/collect_data.py --p4_name basic_forwarding --thrift_port 9090 --output_dir collected_data", "Coletando dados das tabelas")
+    # Para testes de carga e escalabilidade, gere tabelas sintéticas grandes no mesmo formato:
+    # run_command("python data_collection/generate_synthetic_data.py --ethernet_entries 1000000 --ipv4_entries 1000000 --output_dir collected_data", "Gerando dados sintéticos")
+    # Para treinar e avaliar com tráfego real, extraia e rotule os cabeçalhos de uma captura (gera processed_data/packet_*_data.cols):
+    # run_command("python data_collection/pcap_reader.py --pcap trafego.pcap --source collected_data --output_dir processed_data", "Lendo captura de pacotes")
+    # run_command("python models/train_random_forest.py --data_path processed_data/packet_{table}_data", "Treinando com o tráfego capturado")
+    # run_command("python data_collection/compare_models.py --data_path processed_data/packet_{table}_data", "Avaliando com o tráfego capturado")
 
-    # 4. Pré-processamento de Dados
-    run_command("python data_collection/preprocess_data.py", "Pré-processando dados")
-
-    # 5. Limpeza de Dados
-    run_command("python data_collection/clean_data.py", "Limpando dados")
-
-    # 6. Treinamento dos Modelos
-    run_command("python models/train_neural_network.py", "Treinando Rede Neural Artificial")
-    run_command("python models/train_random_forest.py", "Treinando Random Forest")
-    run_command("python models/train_ml_model.py", "Treinando Modelo ML Tradicional (Regressão Logística)")
+    # 4-7. Pré-processamento, limpeza, treinamento e avaliação como um grafo de estágios:
+    #      as funções rodam no próprio processo (ou em um pool de processos), as tabelas
+    #      e os três treinamentos rodam em paralelo e estágios atualizados são pulados.
+    print("\n--- Executando o pipeline (pré-processamento, limpeza, treinamento, avaliação e relatório) ---")
+    run_pipeline(build_stages('.'))
+    # Versões compactas para servir sem TensorFlow/sklearn (NN int8 e RF podada, em models/*.npz):
+    # run_command("python models/compact_export.py", "Exportando modelos compactos")
+    # Compilação das tabelas no menor conjunto equivalente de regras (comandos e chamadas ThriftAPI em compiled_tables):
+    # run_command("python data_collection/table_compiler.py --source collected_data", "Compilando as tabelas")
+    # Coletas periódicas como snapshots versionados, atualizando os modelos só com as entradas alteradas:
+    # run_command("python data_collection/collect_data.py --p4_name basic_forwarding --thrift_port 9090 --output_dir collected_data --snapshot_dir snapshots", "Coletando um novo snapshot")
+    # run_command("python models/delta_training.py --snapshot_dir snapshots", "Atualizando os modelos com o diff do snapshot")
 
-    # 7. Avaliação de Eficiência
-    run_command("python evaluation/compare_models.py", "Comparando Modelos")
+    # Resumo da execução instrumentada (também disponível com: python instrumentation.py --trace <arquivo>)
+    if instrumentation.enabled():
+        print("\n--- Tempo e memória por estágio ---")
+        instrumentation.print_summary(instrumentation.load_trace(args.trace))
+        print(f"Trace em {args.trace}, métricas do Prometheus em {instrumentation.write_metrics()}")
 
     print("\n--- Exemplo de execução do projeto concluído. ---")
     print("Verifique os diretórios 'collected_data', 'processed_data', 'cleaned_data', 'models' e 'evaluation' para os resultados.")
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+import threading
+
+# Informações da execução usadas por benchmark.py, generate_report.py,
+# compare_models.py e pela instrumentação: commit do código e memória (RSS) do
+# processo. O pico de RSS do kernel (VmHWM/ru_maxrss) vale para a vida inteira
+# do processo; PeakRss mede o pico de um trecho zerando o VmHWM no início
+# (/proc/self/clear_refs, Linux) e guarda o pico anterior para quem pedir o do processo.
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+_lock = threading.Lock()
+_windows = []
+_peak_before_reset = 0
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SRC_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=SRC_DIR, capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def current_rss_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _kernel_peak_rss_bytes():
+    # Pico desde o início do processo ou desde o último reset (ru_maxrss: KB no Linux, bytes no macOS)
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def process_peak_rss_bytes():
+    # Pico de RSS da vida inteira do processo, inclusive antes de resets feitos por PeakRss
+    peak = _kernel_peak_rss_bytes()
+    return None if peak is None else max(peak, _peak_before_reset)
+
+def peak_rss_mb():
+    peak = process_peak_rss_bytes()
+    return None if peak is None else peak / 2 ** 20
+
+def _reset_peak_rss():
+    # Zera o VmHWM (passa a ser o RSS atual); retorna o pico anterior ou None se não for possível
+    global _peak_before_reset
+    peak = _kernel_peak_rss_bytes()
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return None
+    _peak_before_reset = max(_peak_before_reset, peak or 0)
+    return peak
+
+class PeakRss:
+    # Pico de RSS do processo durante o bloco "with" (peak_bytes, None se o
+    # sistema não permite zerar o pico) e quanto ele passou do RSS do início do
+    # bloco (increase_bytes: a memória que o próprio bloco acrescentou). Blocos
+    # aninhados ou simultâneos (threads) funcionam: o pico anterior a cada reset
+    # é repassado aos blocos abertos.
+    def __init__(self):
+        self.peak_bytes = None
+        self.start_bytes = None
+        self._peak = 0
+        self._exact = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def start(self):
+        with _lock:
+            before = _reset_peak_rss()
+            self._exact = before is not None
+            if self._exact:
+                for window in _windows:
+                    window._peak = max(window._peak, before)
+            self._peak = 0
+            self.start_bytes = current_rss_bytes()
+            _windows.append(self)
+        return self
+
+    def stop(self):
+        with _lock:
+            _windows.remove(self)
+            if self._exact:
+                self.peak_bytes = max(self._peak, _kernel_peak_rss_bytes() or 0)
+        return self
+
+    @property
+    def increase_bytes(self):
+        if self.peak_bytes is None or self.start_bytes is None:
+            return None
+        return max(self.peak_bytes - self.start_bytes, 0)
+
+    @property
+    def peak_mb(self):
+        return None if self.peak_bytes is None else self.peak_bytes / 2 ** 20
+
+    @property
+    def increase_mb(self):
+        increase = self.increase_bytes
+        return None if increase is None else increase / 2 ** 20
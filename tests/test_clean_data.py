@@ -0,0 +1,25 @@
+import numpy as np
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from data_collection.clean_data import RowHashSet, _mix
+
+def test_row_hash_set_count_after_grow():
+    # count deve ser o número de chaves distintas mesmo depois de várias expansões
+    keys = _mix(np.arange(200000, dtype=np.uint64))
+    seen = RowHashSet(capacity=16)
+    for start in range(0, len(keys), 10000):
+        assert seen.add(keys[start:start + 10000]).all()
+    assert seen.count == len(keys)
+    assert seen.count == int((seen.slots != 0).sum())
+    # Tabela dimensionada pelo número real de chaves (11 a 23 bytes por linha)
+    assert seen.nbytes / len(keys) <= 23
+
+def test_row_hash_set_repeated_keys():
+    keys = _mix(np.arange(50000, dtype=np.uint64))
+    seen = RowHashSet(capacity=16)
+    seen.add(keys[:30000])
+    new = seen.add(keys[20000:])
+    assert not new[:10000].any() and new[10000:].all()
+    assert seen.count == len(keys)
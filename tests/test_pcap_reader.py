@@ -0,0 +1,78 @@
+import numpy as np
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from data_collection.pcap_reader import _pcap_blocks, read_packets
+
+def ethernet(dst, src, ether_type):
+    return dst.to_bytes(6, 'big') + src.to_bytes(6, 'big') + struct.pack('>H', ether_type)
+
+def ipv4(diffserv, total_len, identification, flags, frag_offset, ttl, protocol, checksum, src, dst):
+    return struct.pack('>BBHHHBBHII', 0x45, diffserv, total_len, identification, (flags << 13) | frag_offset,
+                       ttl, protocol, checksum, src, dst)
+
+PACKETS = [
+    # (segundos, microssegundos, bytes capturados, tamanho no fio)
+    (1, 250000, ethernet(0x0A0B0C0D0E0F, 0x111213141516, 0x0800) + ipv4(0x2E, 60, 0xBEEF, 2, 0x123, 64, 6, 0xCAFE, 0xC0A80001, 0x0A010203) + b'x' * 26, 74),
+    (2, 500000, ethernet(0xFFFFFFFFFFFF, 0x020000000001, 0x0806) + b'\x00' * 28, 42),
+    # IPv4 sem os 20 bytes do cabeçalho capturados: só ethernet_t é válido
+    (3, 0, ethernet(0x020000000002, 0x020000000003, 0x0800) + b'\x45\x00', 1500),
+    # Registro curto no fim do arquivo: os campos terminam depois do fim
+    (4, 1, ethernet(0x020000000004, 0x020000000005, 0x0800), 14),
+]
+
+def write_pcap(path, endian, truncated_tail=True):
+    with open(path, 'wb') as f:
+        f.write(struct.pack(endian + 'IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for seconds, micros, data, wire_len in PACKETS:
+            f.write(struct.pack(endian + 'IIII', seconds, micros, len(data), wire_len) + data)
+        if truncated_tail:
+            # Captura interrompida: o registro anuncia 60 bytes, mas só 10 foram gravados
+            f.write(struct.pack(endian + 'IIII', 5, 0, 60, 60) + b'\x01' * 10)
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_pcap_fields_in_both_byte_orders(tmp_path, endian):
+    path = str(tmp_path / 'capture.pcap')
+    write_pcap(path, endian)
+    packets = read_packets(path)
+    # O registro truncado do fim é descartado
+    assert len(packets) == len(PACKETS)
+    assert packets['timestamp'].tolist() == pytest.approx([1.25, 2.5, 3.0, 4.000001])
+    assert packets['wire_len'].tolist() == [74, 42, 1500, 14]
+    assert packets['cap_len'].tolist() == [len(data) for _, _, data, _ in PACKETS]
+    assert packets['ethernet_valid'].all()
+    assert packets['ethernet_dstAddr'].tolist() == [0x0A0B0C0D0E0F, 0xFFFFFFFFFFFF, 0x020000000002, 0x020000000004]
+    assert packets['ethernet_srcAddr'].tolist() == [0x111213141516, 0x020000000001, 0x020000000003, 0x020000000005]
+    assert packets['ethernet_etherType'].tolist() == [0x0800, 0x0806, 0x0800, 0x0800]
+    assert packets['ipv4_valid'].tolist() == [True, False, False, False]
+
+    first = packets[0]
+    assert (first['ipv4_version'], first['ipv4_ihl'], first['ipv4_diffserv']) == (4, 5, 0x2E)
+    assert (first['ipv4_totalLen'], first['ipv4_identification']) == (60, 0xBEEF)
+    assert (first['ipv4_flags'], first['ipv4_fragOffset']) == (2, 0x123)
+    assert (first['ipv4_ttl'], first['ipv4_protocol'], first['ipv4_hdrChecksum']) == (64, 6, 0xCAFE)
+    assert (first['ipv4_srcAddr'], first['ipv4_dstAddr']) == (0xC0A80001, 0x0A010203)
+    # Campos IPv4 dos pacotes sem ipv4_t ficam zerados
+    assert not packets['ipv4_dstAddr'][1:].any() and not packets['ipv4_ttl'][1:].any()
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_pcap_blocks_split_records(tmp_path, endian):
+    # Blocos pequenos: o resultado é o mesmo da leitura em um bloco só
+    path = str(tmp_path / 'capture.pcap')
+    write_pcap(path, endian)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    blocks = list(_pcap_blocks(raw, 2))
+    assert [len(block) for block in blocks if len(block)] == [2, 2]
+    assert np.array_equal(np.concatenate(blocks), read_packets(path))
+
+def test_pcap_without_truncated_tail(tmp_path):
+    path = str(tmp_path / 'capture.pcap')
+    write_pcap(path, '<', truncated_tail=False)
+    packets = read_packets(path)
+    assert len(packets) == len(PACKETS)
+    assert packets['ethernet_dstAddr'][-1] == 0x020000000004
@@ -0,0 +1,28 @@
+import numpy as np
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from runtime_info import PeakRss, process_peak_rss_bytes
+
+def _touch(n_bytes):
+    # Aloca e escreve n_bytes (páginas residentes) e libera em seguida
+    block = np.ones(n_bytes // 8)
+    del block
+
+def test_peak_rss_windows_are_independent():
+    _touch(200 * 2 ** 20)
+    with PeakRss() as outer:
+        _touch(80 * 2 ** 20)
+        with PeakRss() as inner:
+            _touch(20 * 2 ** 20)
+    if outer.peak_bytes is None:
+        pytest.skip('Pico de RSS não pode ser zerado neste sistema.')
+    # O bloco interno não vê os 200 MB de antes nem os 80 MB do externo
+    assert 15 * 2 ** 20 <= inner.increase_bytes < 60 * 2 ** 20
+    # O externo inclui o pico anterior ao reset feito pelo interno
+    assert outer.increase_bytes >= 75 * 2 ** 20
+    # E o pico do processo continua sendo o da vida inteira
+    assert process_peak_rss_bytes() >= outer.start_bytes + 195 * 2 ** 20
@@ -0,0 +1,63 @@
+import numpy as np
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from data_collection.snapshots import create_snapshot, diff_counts, diff_index, diff_snapshots, load_index, snapshot_rows
+
+def index(pairs):
+    # Índice (chaves ordenadas, hashes das linhas) a partir de {chave: conteúdo}
+    keys = np.array(sorted(pairs), dtype=np.uint64)
+    return keys, np.array([pairs[key] for key in keys.tolist()], dtype=np.uint64)
+
+def test_diff_index_counts():
+    old = index({10: 1, 20: 2, 30: 3, 40: 4, 50: 5})
+    # 20 removida, 40 alterada, 5 e 60 incluídas (antes da primeira e depois da última chave)
+    new = index({5: 9, 10: 1, 30: 3, 40: 7, 50: 5, 60: 6})
+    diff = diff_index(*old, *new)
+    assert diff_counts(diff) == {'added': 2, 'removed': 1, 'modified': 1}
+    assert new[0][diff['added']].tolist() == [5, 60]
+    assert old[0][diff['removed']].tolist() == [20]
+    assert new[0][diff['modified_new']].tolist() == [40]
+    assert old[0][diff['modified_old']].tolist() == [40]
+
+def test_diff_index_empty_versions():
+    empty = (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64))
+    table = index({1: 1, 2: 2, 3: 3})
+    assert diff_counts(diff_index(*empty, *table)) == {'added': 3, 'removed': 0, 'modified': 0}
+    assert diff_counts(diff_index(*table, *empty)) == {'added': 0, 'removed': 3, 'modified': 0}
+    assert diff_counts(diff_index(*table, *table)) == {'added': 0, 'removed': 0, 'modified': 0}
+
+def write_entries(path, ports):
+    # JSON no formato de collect_data.py: {MAC: porta}
+    entries = [{'match_fields': {'hdr.ethernet.dstAddr': mac}, 'action_name': 'set_egress_port', 'action_params': {'port': port}}
+               for mac, port in ports.items()]
+    with open(path, 'w') as f:
+        json.dump(entries, f)
+
+def test_snapshot_versions_diff(tmp_path):
+    source = str(tmp_path / 'ethernet_table_entries.json')
+    snapshot_dir = str(tmp_path / 'snapshots')
+    ports = {f'00:00:00:00:00:{i:02x}': i % 4 for i in range(1, 11)}
+    write_entries(source, ports)
+    first = create_snapshot('ethernet_table', source, snapshot_dir)
+    assert (first['rows'], first['added'], first['removed'], first['modified']) == (10, 10, 0, 0)
+    # Coleta sem alterações não cria versão nova
+    assert create_snapshot('ethernet_table', source, snapshot_dir) is None
+
+    del ports['00:00:00:00:00:01'], ports['00:00:00:00:00:02']
+    ports['00:00:00:00:00:05'] = 9
+    ports['00:00:00:00:00:20'] = 1
+    write_entries(source, ports)
+    second = create_snapshot('ethernet_table', source, snapshot_dir)
+    assert (second['rows'], second['added'], second['removed'], second['modified']) == (9, 1, 2, 1)
+
+    # O diff gravado na criação e o diff calculado a partir dos índices coincidem
+    diff = diff_snapshots(snapshot_dir, 'ethernet_table', 1, 2)
+    assert diff_counts(diff) == {'added': 1, 'removed': 2, 'modified': 1}
+    recomputed = diff_index(*load_index(snapshot_dir, 'ethernet_table', 1), *load_index(snapshot_dir, 'ethernet_table', 2))
+    assert all(np.array_equal(diff[name], recomputed[name]) for name in recomputed)
+    changed = snapshot_rows(snapshot_dir, 'ethernet_table', 2, diff['modified_new'])
+    assert changed['dst_mac'].tolist() == ['00:00:00:00:00:05']
+    assert sorted(snapshot_rows(snapshot_dir, 'ethernet_table', 1, diff['removed'])['dst_mac']) == ['00:00:00:00:00:01', '00:00:00:00:00:02']
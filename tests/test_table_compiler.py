@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+from functools import lru_cache
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from data_collection.table_compiler import compile_table, ortc
+
+BASE = 0x0A010200  # 10.1.2.0: as rotas de teste ficam em uma /24 e em alguns prefixos curtos acima dela
+
+def random_routes(seed, n_routes=12, n_labels=3):
+    # {(rede, comprimento): rótulo}, com rótulo 0 (_NoAction) permitido e prefixos aninhados
+    rng = np.random.default_rng(seed)
+    routes = {}
+    while len(routes) < n_routes:
+        length = int(rng.choice([0, 8, 16, 22, 24, 25, 26, 27, 28, 29, 30, 31, 32]))
+        address = BASE | int(rng.integers(0, 256))
+        network = address & (((1 << length) - 1) << (32 - length)) if length else 0
+        routes[(network, length)] = int(rng.integers(0, n_labels + 1))
+    return routes
+
+def lpm(routes, address):
+    # Consulta de referência: rótulo do prefixo mais longo que contém o endereço (0 se nenhum)
+    for length in range(32, -1, -1):
+        network = address & (((1 << length) - 1) << (32 - length)) if length else 0
+        if (network, length) in routes:
+            return routes[(network, length)]
+    return 0
+
+def minimal_size(routes):
+    # Menor tabela de prefixos equivalente, por programação dinâmica na árvore binária:
+    # em cada nó, ou a escolha de cima continua valendo, ou uma entrada com outro rótulo
+    labels = sorted(set(routes.values()) | {0})
+
+    @lru_cache(maxsize=None)
+    def cost(network, length, above, expected):
+        expected = routes.get((network, length), expected)
+        if not any(d > length and (n >> (32 - length) if length else 0) == (network >> (32 - length) if length else 0)
+                   for n, d in routes):
+            return 0 if above == expected else 1
+        half = 1 << (31 - length)
+        children = lambda choice: cost(network, length + 1, choice, expected) + cost(network | half, length + 1, choice, expected)
+        return min(children(above), min(1 + children(label) for label in labels if label != above))
+
+    return cost(0, 0, 0, 0)
+
+def addresses_to_check(routes):
+    # Início e fim de cada prefixo (e vizinhos): entre eles o resultado da consulta é constante
+    addresses = {0, (1 << 32) - 1}
+    for network, length in routes:
+        end = network + (1 << (32 - length))
+        addresses.update([network, max(network - 1, 0), end - 1, min(end, (1 << 32) - 1)])
+    return sorted(addresses)
+
+@pytest.mark.parametrize('seed', range(20))
+def test_ortc_is_equivalent_and_minimal(seed):
+    routes = random_routes(seed)
+    keys = list(routes)
+    networks = np.array([network for network, _ in keys], dtype=np.uint32)
+    lengths = np.array([length for _, length in keys], dtype=np.int64)
+    labels = np.array([routes[key] for key in keys], dtype=np.int64)
+    out_networks, out_lengths, out_labels = ortc(networks, lengths, labels)
+    compiled = {(int(n), int(d)): int(label) for n, d, label in zip(out_networks, out_lengths, out_labels)}
+    assert len(compiled) == len(out_networks)
+    check = addresses_to_check(list(routes) + list(compiled))
+    assert [lpm(compiled, a) for a in check] == [lpm(routes, a) for a in check]
+    assert len(compiled) == minimal_size(routes)
+
+def test_compile_ipv4_matches_reference_lookup():
+    routes = random_routes(7, n_routes=40)
+    macs = ['00:00:00:00:00:01', '00:00:00:00:00:02']
+    entries = pd.DataFrame({
+        'dst_ip': [f'{n >> 24}.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}' for n, _ in routes],
+        'prefix_len': [d for _, d in routes],
+        'action_name': ['_NoAction' if label == 0 else 'ipv4_forward' for label in routes.values()],
+        'egress_port': pd.array([None if label == 0 else label for label in routes.values()], dtype='Int64'),
+        'dst_mac': [None if label == 0 else macs[label % 2] for label in routes.values()],
+    })
+    compiled, calls, report = compile_table('ipv4_table', entries, entries)
+    assert report['verification']['mismatches'] == 0
+    assert report['compiled_entries'] <= report['installable_entries']
+
+    # Ação (porta, MAC) de cada entrada compilada, comparada com a consulta de referência
+    actions = {(n, d): 0 if label == 0 else (label, macs[label % 2]) for (n, d), label in routes.items()}
+    result = {}
+    for row in compiled.itertuples():
+        a, b, c, e = (int(part) for part in row.dst_ip.split('.'))
+        key = ((a << 24) | (b << 16) | (c << 8) | e, int(row.prefix_len))
+        result[key] = 0 if row.action_name == '_NoAction' else (int(row.egress_port), row.dst_mac)
+    check = addresses_to_check(list(routes) + list(result))
+    assert [lpm(result, a) for a in check] == [lpm(actions, a) for a in check]
+    # Chamadas para levar a tabela instalada à compilada: uma por entrada incluída/alterada/removida
+    assert len(calls) == sum(report['api_calls'].values())